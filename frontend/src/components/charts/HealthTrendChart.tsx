@@ -15,8 +15,14 @@ import { GlassCard } from '@/components/ui/GlassCard'
 import { cn } from '@/lib/utils'
 import type { HealthHistory } from '@/types/database'
 
+// Accepts raw health_history rows or get_health_trend() points
+type HealthTrendData = Pick<
+  HealthHistory,
+  'snapshot_date' | 'overall_health' | 'health_score' | 'sentiment_score' | 'blocker_count'
+>
+
 interface HealthTrendChartProps {
-  data: HealthHistory[]
+  data: HealthTrendData[]
   height?: number
   showBlockers?: boolean
   showSentiment?: boolean
@@ -185,7 +191,7 @@ export function HealthSparkline({
   width = 80,
   height = 30,
 }: {
-  data: HealthHistory[]
+  data: HealthTrendData[]
   width?: number
   height?: number
 }) {
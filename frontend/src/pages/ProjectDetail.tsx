@@ -1,6 +1,6 @@
 import { useState } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
-import { useQuery } from '@tanstack/react-query'
+import { useQuery, keepPreviousData } from '@tanstack/react-query'
 import {
   ArrowLeft,
   Calendar,
@@ -34,13 +34,23 @@ import { SOWDocumentPanel } from '@/components/sow/SOWDocumentPanel'
 import { CreateActionModal } from '@/components/actions/CreateActionModal'
 import { generateProjectReport, downloadCSV, messagesToCSV } from '@/lib/export'
 import { EvidenceLink } from '@/components/evidence/EvidenceLink'
-import type { SowContract, DeliveryIntelligence, ActionQueue, HealthStatus, ProjectHealthMetrics, HealthHistory, PortfolioOverview, ActionQueueFull } from '@/types/database'
+import type { SowContract, DeliveryIntelligence, ActionQueue, HealthStatus, ProjectHealthMetrics, HealthTrendPoint, PortfolioOverview, ActionQueueFull } from '@/types/database'
+
+const TREND_RANGES = {
+  '30d': 30,
+  '90d': 90,
+  '1y': 365,
+  all: null,
+} as const
+
+type TrendRange = keyof typeof TREND_RANGES
 
 export function ProjectDetail() {
   const { id } = useParams<{ id: string }>()
   const navigate = useNavigate()
   const [showAllMessages, setShowAllMessages] = useState(false)
   const [showCreateAction, setShowCreateAction] = useState(false)
+  const [trendRange, setTrendRange] = useState<TrendRange>('90d')
 
   // Fetch SOW details
   const { data: sow, isLoading: sowLoading } = useQuery({
@@ -110,21 +120,22 @@ export function ProjectDetail() {
     enabled: !!id,
   })
 
-  // Fetch health history for trend chart
+  // Fetch health trend; the RPC picks daily/weekly/monthly points for the range
   const { data: healthHistory } = useQuery({
-    queryKey: ['health_history', id],
+    queryKey: ['health_trend', id, trendRange],
     queryFn: async () => {
       if (!id) return []
-      const { data, error } = await supabase
-        .from('health_history')
-        .select('*')
-        .eq('project_id', id)
-        .order('snapshot_date', { ascending: true })
-        .limit(30)
+      const days = TREND_RANGES[trendRange]
+      const start = days === null ? null : new Date(Date.now() - days * 86400000).toISOString().slice(0, 10)
+      const { data, error } = await supabase.rpc('get_health_trend', {
+        p_project_id: id,
+        p_start: start,
+      })
       if (error) return []
-      return data as HealthHistory[]
+      return data as HealthTrendPoint[]
     },
     enabled: !!id,
+    placeholderData: keepPreviousData,
   })
 
   if (sowLoading) {
@@ -431,12 +442,24 @@ export function ProjectDetail() {
         {/* Right Column - Sidebar */}
         <div className="space-y-6">
           {/* Health Trend Chart */}
-          {healthHistory && healthHistory.length > 0 && (
+          {healthHistory && (healthHistory.length > 0 || trendRange !== 'all') && (
             <GlassCard className="p-6" intensity="strong" elevated>
-              <h2 className="text-lg font-semibold text-foreground mb-4 flex items-center gap-2">
-                <BarChart3 className="w-5 h-5 text-primary-600 dark:text-primary-400" />
-                Health Trend
-              </h2>
+              <div className="flex items-center justify-between mb-4">
+                <h2 className="text-lg font-semibold text-foreground flex items-center gap-2">
+                  <BarChart3 className="w-5 h-5 text-primary-600 dark:text-primary-400" />
+                  Health Trend
+                </h2>
+                <select
+                  value={trendRange}
+                  onChange={(e) => setTrendRange(e.target.value as TrendRange)}
+                  className="bg-transparent text-sm font-medium text-foreground focus:outline-none cursor-pointer"
+                >
+                  <option value="30d">30 days</option>
+                  <option value="90d">90 days</option>
+                  <option value="1y">1 year</option>
+                  <option value="all">All time</option>
+                </select>
+              </div>
               <HealthTrendChart data={healthHistory} height={180} showBlockers />
             </GlassCard>
           )}
@@ -747,6 +770,14 @@ function ActionCard({ action }: { action: ActionQueue }) {
           {action.owner && (
             <span className="text-xs text-muted-foreground font-medium">{action.owner}</span>
           )}
+          {action.occurrences > 1 && (
+            <span
+              className="text-xs text-muted-foreground font-medium"
+              title={`Raised ${action.occurrences} times; ${action.evidence_links.length} evidence links`}
+            >
+              ×{action.occurrences}
+            </span>
+          )}
           {action.evidence_link && (
             <EvidenceLink
               link={action.evidence_link}
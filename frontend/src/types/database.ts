@@ -68,6 +68,10 @@ export interface ActionQueue {
   status: ActionStatus
   due_date: string | null
   evidence_link: string | null
+  evidence_links: string[]
+  occurrences: number
+  last_seen_at: string | null
+  title_normalized: string | null
   source_type: string | null
   aging_days: number
   completed_at: string | null
@@ -127,6 +131,21 @@ export interface HealthHistory {
   created_at: string
 }
 
+// Row of get_health_trend(): raw snapshots for short ranges,
+// weekly/monthly rollups (worst status, average score) for long ones
+export type HealthTrendGrain = 'day' | 'week' | 'month'
+
+export interface HealthTrendPoint {
+  snapshot_date: string
+  grain: HealthTrendGrain
+  overall_health: HealthStatus
+  health_score: number
+  min_health_score: number
+  sentiment_score: number | null
+  blocker_count: number
+  snapshot_count: number
+}
+
 export type AlertSeverity = 'Critical' | 'High' | 'Medium' | 'Low'
 export type AlertStatus = 'unread' | 'read' | 'dismissed' | 'actioned'
 export type AlertRuleType = 'health_change' | 'blocker_threshold' | 'sentiment_drop' | 'overdue_actions' | 'no_activity' | 'renewal_approaching'
@@ -188,8 +207,9 @@ export interface Database {
       }
       action_queue: {
         Row: ActionQueue
-        Insert: Omit<ActionQueue, 'id' | 'aging_days' | 'created_at' | 'updated_at'>
-        Update: Partial<Omit<ActionQueue, 'id' | 'aging_days'>>
+        Insert: Omit<ActionQueue, 'id' | 'aging_days' | 'created_at' | 'updated_at' | 'title_normalized' | 'evidence_links' | 'occurrences' | 'last_seen_at'>
+          & Partial<Pick<ActionQueue, 'evidence_links' | 'occurrences' | 'last_seen_at'>>
+        Update: Partial<Omit<ActionQueue, 'id' | 'aging_days' | 'title_normalized'>>
       }
       user_allowlist: {
         Row: UserAllowlist
@@ -205,5 +225,16 @@ export interface Database {
         Row: ActionQueueFull
       }
     }
+    Functions: {
+      get_health_trend: {
+        Args: {
+          p_project_id: string
+          p_start?: string | null
+          p_end?: string
+          p_max_points?: number
+        }
+        Returns: HealthTrendPoint[]
+      }
+    }
   }
 }
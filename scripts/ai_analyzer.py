@@ -10,93 +10,247 @@ import time
 from datetime import datetime
 from typing import Optional
 import urllib.request
-import ssl
-
-# Load environment variables
-from pathlib import Path
-env_file = Path(__file__).parent.parent / '.env'
-if env_file.exists():
-    with open(env_file) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, value = line.split('=', 1)
-                os.environ[key] = value
+
+import http_replay
+import instrumentation
+import metrics
+from audit_log import AuditBuffer
+from instrumentation import project_scope, span
+from json_extract import build_repair_prompt, compile_schema, extract_json, parse_response
+from resilience import CircuitOpenError, call_with_retry, get_breaker, is_unavailable
+from supabase_client import sql_literal, ssl_context, supabase_query
 
 # Configuration
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_SERVICE_ROLE = os.environ.get('SUPABASE_SERVICE_ROLE')
-SUPABASE_ACCESS_TOKEN = os.environ.get('SUPABASE_ACCESS_TOKEN')
-
-# SSL context for macOS
-ssl_context = ssl.create_default_context()
+ANTHROPIC_API_URL = os.environ.get('ANTHROPIC_API_URL', 'https://api.anthropic.com')
+CLAUDE_MODEL = 'claude-sonnet-4-20250514'
+# 'tool' forces a record_analysis tool call; 'text' asks for JSON in prose
+ANALYSIS_OUTPUT_MODE = os.environ.get('ANALYSIS_OUTPUT_MODE', 'tool')
+ANALYSIS_TOOL = 'record_analysis'
+# Mark the tools + system prompt prefix cacheable so a project's batches reuse it
+PROMPT_CACHING = os.environ.get('PROMPT_CACHING', '1') != '0'
+# Messages per analysis request
+BATCH_SIZE = 10
+# Pack projects with fewer than BATCH_SIZE pending messages into shared requests
+MICRO_BATCHING = os.environ.get('MICRO_BATCHING', '1') != '0'
+MAX_PROJECTS_PER_REQUEST = int(os.environ.get('MAX_PROJECTS_PER_REQUEST', BATCH_SIZE))
+MULTI_ANALYSIS_TOOL = 'record_project_analyses'
+
+# Static half of the system prompt, identical for every project and call
+ANALYST_INSTRUCTIONS = """You are analyzing project communication for the OneValue Delivery Intelligence Console.
+
+Unless told otherwise below, each request contains a batch of recent messages from
+one project. The project's Statement of Work follows these instructions; use it as
+the reference for scope.
+
+Focus on:
+1. Identifying blockers, risks, and issues
+2. Detecting scope creep (work outside the defined scope anchors)
+3. Assessing overall project health
+4. Extracting action items with owners
+5. Sentiment from the communication tone
+
+Keep blockers and action items concrete and attributable to the messages. Do not
+repeat the SOW back; only report what the messages say about delivery."""
+
+# Replaces the SOW block when one request packs several small projects
+MULTI_PROJECT_INSTRUCTIONS = """This request packs messages from several projects. Each project is a
+<project id="..."> section holding its own Statement of Work and messages.
+Analyze every project separately, never carry evidence from one project into
+another, and return exactly one analysis per project, keyed by its id."""
+
+# Expected shape of a batch analysis; validated field by field
+ANALYSIS_SCHEMA = compile_schema({
+    'overall_sentiment': {'type': 'enum', 'values': ['positive', 'neutral', 'negative'], 'required': True},
+    'sentiment_score': {'type': 'number', 'min': 0.0, 'max': 1.0, 'required': True,
+                        'description': '0=very negative, 0.5=neutral, 1=very positive'},
+    'blockers': {'type': 'list', 'items': 'string', 'default': []},
+    'action_items': {'type': 'list', 'default': [], 'items': {'type': 'object', 'fields': {
+        'task': {'type': 'string', 'required': True},
+        'owner': {'type': 'string', 'nullable': True, 'default': None},
+        'priority': {'type': 'enum', 'values': ['high', 'medium', 'low'], 'default': 'medium'},
+        'source_message': {'type': 'number', 'nullable': True, 'default': None,
+                           'description': 'Number (#) of the message the task comes from'},
+    }}},
+    'key_topics': {'type': 'list', 'items': 'string', 'default': []},
+    'project_health_indicators': {'type': 'object', 'default': {}, 'fields': {
+        'positive_signals': {'type': 'list', 'items': 'string', 'default': []},
+        'warning_signs': {'type': 'list', 'items': 'string', 'default': []},
+        'recommended_actions': {'type': 'list', 'items': 'string', 'default': []},
+    }},
+    'summary': {'type': 'string', 'required': True},
+})
+
+# One ANALYSIS_SCHEMA object per packed project; items are validated one by one
+# (see split_multi_analysis) so a bad project does not discard the others
+MULTI_ANALYSIS_SCHEMA = compile_schema({
+    'projects': {'type': 'list', 'required': True, 'items': {'type': 'object', 'fields': {
+        'project_id': {'type': 'string', 'required': True,
+                       'description': 'The id attribute of the <project> section'},
+        **ANALYSIS_SCHEMA.spec,
+    }}},
+})
+
+
+def _claude_request(body: dict) -> Optional[dict]:
+    """POST a Messages API request; returns the parsed response or None on failure"""
+    payload = json.dumps({'model': CLAUDE_MODEL, **body})
 
-def supabase_query(sql: str):
-    """Execute SQL query via Supabase Management API"""
-    payload = json.dumps({'query': sql})
     req = urllib.request.Request(
-        f'https://api.supabase.com/v1/projects/osmdiezkqgfrhhsgtomo/database/query',
+        f'{ANTHROPIC_API_URL}/v1/messages',
         data=payload.encode('utf-8'),
         headers={
-            'Authorization': f'Bearer {SUPABASE_ACCESS_TOKEN}',
+            'x-api-key': ANTHROPIC_API_KEY,
+            'anthropic-version': '2023-06-01',
             'Content-Type': 'application/json'
         },
         method='POST'
     )
-    with urllib.request.urlopen(req, context=ssl_context) as response:
-        return json.loads(response.read().decode('utf-8'))
 
+    def send():
+        with http_replay.urlopen(req, context=ssl_context, timeout=120) as response:
+            return json.loads(response.read().decode('utf-8'))
 
-def call_claude(prompt: str, max_tokens: int = 2000) -> Optional[str]:
+    try:
+        with span('claude_call') as attrs:
+            result = call_with_retry('anthropic', send)
+            usage = result.get('usage') or {}
+            attrs['input_tokens'] = usage.get('input_tokens', 0)
+            attrs['output_tokens'] = usage.get('output_tokens', 0)
+        instrumentation.count('api_calls')
+        instrumentation.record_usage(usage)
+        return result
+    except CircuitOpenError as e:
+        print(f"Claude API unavailable: {e}")
+        return None
+    except Exception as e:
+        print(f"Claude API error: {e}")
+        return None
+
+
+def call_claude(prompt: str, max_tokens: int = 2000, system: Optional[list] = None) -> Optional[str]:
     """Call Claude API for message analysis"""
-    payload = json.dumps({
-        'model': 'claude-sonnet-4-20250514',
+    body = {
         'max_tokens': max_tokens,
         'messages': [{'role': 'user', 'content': prompt}]
-    })
+    }
+    if system:
+        body['system'] = system
+    result = _claude_request(body)
+    if not result:
+        return None
+    for block in result.get('content', []):
+        if block.get('type') == 'text':
+            return block['text']
+    return None
 
-    req = urllib.request.Request(
-        'https://api.anthropic.com/v1/messages',
-        data=payload.encode('utf-8'),
-        headers={
-            'x-api-key': ANTHROPIC_API_KEY,
-            'anthropic-version': '2023-06-01',
-            'Content-Type': 'application/json'
-        },
-        method='POST'
-    )
 
-    try:
-        with urllib.request.urlopen(req, context=ssl_context) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result['content'][0]['text']
-    except Exception as e:
-        print(f"Claude API error: {e}")
+def call_claude_tool(prompt, tool_name: str, input_schema: dict, description: str = '',
+                     max_tokens: int = 2000, system: Optional[list] = None) -> Optional[dict]:
+    """Call Claude with a single forced tool; returns the tool_use input dict.
+
+    tool_choice pins the model to the tool, so the reply is already-parsed
+    JSON matching input_schema instead of free text. `prompt` is a string or
+    a list of content blocks (e.g. a document block plus instructions).
+    """
+    body = {
+        'max_tokens': max_tokens,
+        'tools': [{'name': tool_name, 'description': description, 'input_schema': input_schema}],
+        'tool_choice': {'type': 'tool', 'name': tool_name},
+        'messages': [{'role': 'user', 'content': prompt}]
+    }
+    if system:
+        body['system'] = system
+    result = _claude_request(body)
+    if not result:
         return None
+    for block in result.get('content', []):
+        if block.get('type') == 'tool_use' and block.get('name') == tool_name:
+            return block.get('input')
+    return None
 
 
-def analyze_messages_batch(messages: list) -> dict:
-    """Analyze a batch of messages with Claude"""
+def build_sow_context(project: dict) -> str:
+    """SOW context block for a project (scope anchors, timeline, owner)"""
+    anchors = project.get('scope_anchors') or []
+    anchor_lines = "\n".join(f"{i + 1}. {a}" for i, a in enumerate(anchors)) or "Not specified"
+    return f"""## Statement of Work (SOW) Context
+**Project:** {project.get('name') or project.get('project_name')}
+**Client:** {project.get('client_name') or 'Not specified'}
+**Timeline:** {project.get('start_date')} to {project.get('end_date')}
+**Owner:** {project.get('inferred_owner') or 'Not specified'}
 
-    # Format messages for analysis
-    messages_text = "\n\n".join([
-        f"[{m.get('created_at', 'Unknown date')}] {m.get('title', 'No title')}\n{json.dumps(m.get('content_raw', {}))}"
-        for m in messages[:10]  # Limit to 10 messages per batch
+**Scope Anchors (Deliverables):**
+{anchor_lines}"""
+
+
+def build_system_blocks(project: dict, cache: bool = PROMPT_CACHING) -> list:
+    """System prompt for a project: shared instructions, then the SOW context.
+
+    One breakpoint after the SOW block makes tools + instructions + SOW a
+    single cacheable prefix for every batch of the project. The API ignores
+    prefixes under 1024 tokens, and a typical one (~900 tokens with ten scope
+    anchors) falls short, so the saving in practice comes from grouping a
+    project's messages into BATCH_SIZE requests; caching only pays off for
+    projects with long SOWs.
+    """
+    blocks = [
+        {'type': 'text', 'text': ANALYST_INSTRUCTIONS},
+        {'type': 'text', 'text': build_sow_context(project)},
+    ]
+    if cache:
+        blocks[-1]['cache_control'] = {'type': 'ephemeral'}
+    return blocks
+
+
+def build_multi_system_blocks() -> list:
+    """System prompt for a packed request; the SOWs travel in the user prompt.
+
+    No cache breakpoint: the only stable part is the tool definition plus the
+    instructions, well under the minimum cacheable prefix.
+    """
+    return [
+        {'type': 'text', 'text': ANALYST_INSTRUCTIONS},
+        {'type': 'text', 'text': MULTI_PROJECT_INSTRUCTIONS},
+    ]
+
+
+def format_messages(messages: list) -> str:
+    return "\n\n".join([
+        f"#{i} [{m.get('created_at', 'Unknown date')}] {m.get('title', 'No title')}\n{json.dumps(m.get('content_raw', {}))}"
+        for i, m in enumerate(messages[:BATCH_SIZE], 1)  # Limit to 10 messages per batch
     ])
 
+
+def build_analysis_prompt(messages: list, structured: bool = False) -> str:
+    """Build the batch analysis prompt for up to 10 messages.
+
+    With structured=True the output format comes from the tool schema, so
+    the JSON template is left out of the prompt.
+    """
+
+    # Format messages for analysis
+    messages_text = format_messages(messages)
+
     prompt = f"""Analyze these project delivery chat messages and extract structured insights.
 
 MESSAGES:
 {messages_text}
+"""
+    if structured:
+        return prompt + f"""
+Record your analysis by calling the {ANALYSIS_TOOL} tool. Use sentiment_score
+0.0-1.0 (0=very negative, 0.5=neutral, 1=very positive) and a 2-3 sentence summary."""
 
+    prompt += f"""
 Provide analysis in this exact JSON format:
 {{
   "overall_sentiment": "positive" | "neutral" | "negative",
   "sentiment_score": 0.0 to 1.0 (0=very negative, 0.5=neutral, 1=very positive),
   "blockers": ["list of identified blockers or risks"],
   "action_items": [
-    {{"task": "description", "owner": "person name or null", "priority": "high" | "medium" | "low"}}
+    {{"task": "description", "owner": "person name or null", "priority": "high" | "medium" | "low",
+     "source_message": message number (#) or null}}
   ],
   "key_topics": ["main topics discussed"],
   "project_health_indicators": {{
@@ -109,19 +263,178 @@ Provide analysis in this exact JSON format:
 
 Return ONLY valid JSON, no other text."""
 
-    result = call_claude(prompt)
+    return prompt
 
-    if result:
-        try:
-            # Extract JSON from response
-            json_start = result.find('{')
-            json_end = result.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                return json.loads(result[json_start:json_end])
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
 
-    return None
+def build_multi_project_prompt(group: list, structured: bool = False) -> str:
+    """Prompt for a packed request: one tagged section per (project, messages) pair"""
+    sections = "\n\n".join(
+        f'<project id="{project["id"]}">\n{build_sow_context(project)}\n\n'
+        f'## Messages\n{format_messages(messages)}\n</project>'
+        for project, messages in group
+    )
+    prompt = f"""Analyze the delivery chat messages of each project below and extract structured
+insights per project.
+
+{sections}
+"""
+    if structured:
+        return prompt + f"""
+Record your analyses by calling the {MULTI_ANALYSIS_TOOL} tool with one entry per
+project ({len(group)} in total), each carrying the project's id. Use sentiment_score
+0.0-1.0 (0=very negative, 0.5=neutral, 1=very positive) and a 2-3 sentence summary."""
+
+    return prompt + f"""
+Provide one analysis per project ({len(group)} in total) in this exact JSON format:
+{{
+  "projects": [
+    {{
+      "project_id": "id attribute of the <project> section",
+      "overall_sentiment": "positive" | "neutral" | "negative",
+      "sentiment_score": 0.0 to 1.0 (0=very negative, 0.5=neutral, 1=very positive),
+      "blockers": ["list of identified blockers or risks"],
+      "action_items": [
+        {{"task": "description", "owner": "person name or null", "priority": "high" | "medium" | "low",
+         "source_message": message number (#) or null}}
+      ],
+      "key_topics": ["main topics discussed"],
+      "project_health_indicators": {{
+        "positive_signals": ["list of positive indicators"],
+        "warning_signs": ["list of concerns or issues"],
+        "recommended_actions": ["suggested next steps"]
+      }},
+      "summary": "2-3 sentence summary of the project's conversation"
+    }}
+  ]
+}}
+
+Return ONLY valid JSON, no other text."""
+
+
+def analyze_messages_batch(messages: list, system: Optional[list] = None) -> dict:
+    """Analyze a batch of messages with Claude.
+
+    `system` is the project's system prompt from build_system_blocks; the
+    per-batch prompt then only carries the messages.
+    """
+
+    structured = ANALYSIS_OUTPUT_MODE == 'tool'
+    with span('prompt_build', messages=len(messages[:10])):
+        prompt = build_analysis_prompt(messages, structured=structured)
+
+    response = request_analysis(prompt, ANALYSIS_SCHEMA, system=system)
+    if response is None:
+        return None
+    analysis, bad_fields = response
+
+    if bad_fields:
+        # Re-request only the fields that could not be parsed or derived
+        print(f"  Re-requesting invalid fields: {', '.join(bad_fields)}")
+        instrumentation.count('parse_failures')
+        subset = ANALYSIS_SCHEMA.subset(bad_fields)
+        repair = request_analysis(build_repair_prompt(ANALYSIS_SCHEMA, bad_fields, prompt),
+                                  subset, max_tokens=800, system=system)
+        if repair:
+            analysis.update(repair[0])
+        bad_fields = repair_analysis_locally(analysis, [f for f in bad_fields if f not in analysis])
+
+    if bad_fields:
+        print(f"  Analysis incomplete, missing: {', '.join(bad_fields)}")
+        return None
+    return analysis
+
+
+def request_analysis(prompt: str, schema, max_tokens: int = 2000,
+                     system: Optional[list] = None) -> Optional[tuple]:
+    """Ask Claude for fields in schema; returns (analysis, bad_fields) or None if the call failed.
+
+    In tool mode the tool_use input is validated directly; in text mode the
+    reply is run through the tolerant JSON extractor first.
+    """
+    if ANALYSIS_OUTPUT_MODE == 'tool':
+        tool_input = call_claude_tool(prompt, ANALYSIS_TOOL, schema.json_schema(),
+                                      description='Record structured delivery analysis',
+                                      max_tokens=max_tokens, system=system)
+        if tool_input is None:
+            return None
+        with span('json_parse', mode='tool'):
+            analysis, bad_fields = schema.validate(tool_input)
+    else:
+        text = call_claude(prompt, max_tokens=max_tokens, system=system)
+        if not text:
+            return None
+        with span('json_parse', mode='text'):
+            analysis, bad_fields = parse_response(text, schema)
+            analysis = analysis or {}
+    return analysis, repair_analysis_locally(analysis, bad_fields)
+
+
+def repair_analysis_locally(analysis: dict, bad_fields: list) -> list:
+    """Derive sentiment fields from each other; return fields still missing"""
+    remaining = []
+    for field in bad_fields:
+        if field == 'overall_sentiment' and 'sentiment_score' in analysis:
+            score = analysis['sentiment_score']
+            analysis[field] = 'positive' if score >= 0.6 else 'negative' if score < 0.4 else 'neutral'
+        elif field == 'sentiment_score' and 'overall_sentiment' in analysis:
+            analysis[field] = {'positive': 0.75, 'neutral': 0.5, 'negative': 0.25}[analysis['overall_sentiment']]
+        else:
+            remaining.append(field)
+    return remaining
+
+
+def analyze_project_group(group: list) -> Optional[dict]:
+    """Analyze several small projects in one request.
+
+    `group` is a list of (project, messages) pairs. Returns {project_id:
+    analysis} for the projects the reply covered, or None if the call failed.
+    """
+    structured = ANALYSIS_OUTPUT_MODE == 'tool'
+    with span('prompt_build', messages=sum(len(m) for _, m in group), projects=len(group)):
+        prompt = build_multi_project_prompt(group, structured=structured)
+    system = build_multi_system_blocks()
+    max_tokens = min(1000 + 1000 * len(group), 16000)
+
+    if structured:
+        response = call_claude_tool(prompt, MULTI_ANALYSIS_TOOL, MULTI_ANALYSIS_SCHEMA.json_schema(),
+                                    description='Record structured delivery analysis for each project',
+                                    max_tokens=max_tokens, system=system)
+        if response is None:
+            return None
+    else:
+        text = call_claude(prompt, max_tokens=max_tokens, system=system)
+        if not text:
+            return None
+        response = extract_json(text) or {}
+    with span('json_parse', mode='tool' if structured else 'text', projects=len(group)):
+        return split_multi_analysis(response, [project['id'] for project, _ in group])
+
+
+def split_multi_analysis(response: dict, project_ids: list) -> dict:
+    """Per-project analyses from a packed reply, keyed by project_id.
+
+    Each entry is validated against ANALYSIS_SCHEMA on its own. Entries for
+    unknown or repeated ids, and entries still invalid after local repair,
+    are dropped; the caller re-analyzes those projects separately.
+    """
+    wanted = {str(project_id) for project_id in project_ids}
+    items = response.get('projects')
+    if isinstance(items, dict):
+        # {"<project_id>": {...}} instead of a list of entries
+        items = [dict(v, project_id=k) for k, v in items.items() if isinstance(v, dict)]
+    analyses = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        project_id = str(item.get('project_id') or '').strip()
+        if project_id not in wanted or project_id in analyses:
+            continue
+        analysis, bad_fields = ANALYSIS_SCHEMA.validate(item)
+        if repair_analysis_locally(analysis, bad_fields):
+            instrumentation.count('parse_failures')
+            continue
+        analyses[project_id] = analysis
+    return analyses
 
 
 def update_message_insights(message_id: str, insights: dict, sentiment: float):
@@ -140,6 +453,7 @@ def update_message_insights(message_id: str, insights: dict, sentiment: float):
         return True
     except Exception as e:
         print(f"Update error: {e}")
+        instrumentation.count('write_failures')
         return False
 
 
@@ -167,7 +481,6 @@ def update_project_health(project_id: str, analysis: dict):
     UPDATE project_health_metrics
     SET overall_health = '{health_status}',
         ai_summary = '{summary_escaped}',
-        blocker_count = {len(blockers)},
         metric_date = NOW()
     WHERE project_id = '{project_id}'
     """
@@ -181,16 +494,17 @@ def update_project_health(project_id: str, analysis: dict):
         return False
 
 
-def process_project(project_id: str, project_name: str):
+def process_project(project: dict):
     """Process all unprocessed messages for a project"""
 
+    project_id = project['id']
     print(f"\n{'='*50}")
-    print(f"Processing: {project_name}")
+    print(f"Processing: {project['name']}")
     print(f"{'='*50}")
 
     # Get unprocessed messages
     sql = f"""
-    SELECT id, title, content_raw, created_at, event_type
+    SELECT id, title, content_raw, created_at, event_type, evidence_link
     FROM delivery_intelligence
     WHERE project_id = '{project_id}'
     AND (ai_processed IS NULL OR ai_processed = false)
@@ -198,7 +512,9 @@ def process_project(project_id: str, project_name: str):
     LIMIT 20
     """
 
-    messages = supabase_query(sql)
+    with span('db_fetch', query='unprocessed_messages') as attrs:
+        messages = supabase_query(sql)
+        attrs['rows'] = len(messages or [])
 
     if not messages:
         print("  No unprocessed messages")
@@ -206,54 +522,321 @@ def process_project(project_id: str, project_name: str):
 
     print(f"  Found {len(messages)} unprocessed messages")
 
+    # One system prompt per project so every batch shares the same (cacheable) prefix
+    system = build_system_blocks(project)
+
     # Analyze in batches
-    batch_size = 10
     all_blockers = []
     all_sentiment_scores = []
 
-    for i in range(0, len(messages), batch_size):
-        batch = messages[i:i+batch_size]
-        print(f"  Analyzing batch {i//batch_size + 1}...")
+    for i in range(0, len(messages), BATCH_SIZE):
+        batch = messages[i:i+BATCH_SIZE]
+        print(f"  Analyzing batch {i//BATCH_SIZE + 1}...")
 
-        analysis = analyze_messages_batch(batch)
+        analysis = analyze_messages_batch(batch, system=system)
 
         if analysis:
-            sentiment = analysis.get('sentiment_score', 0.5)
-            all_sentiment_scores.append(sentiment)
+            all_sentiment_scores.append(write_batch_insights(project_id, batch, analysis))
             all_blockers.extend(analysis.get('blockers', []))
 
-            # Update each message in batch
-            for msg in batch:
-                update_message_insights(
-                    msg['id'],
-                    {
-                        'summary': analysis.get('summary'),
-                        'key_topics': analysis.get('key_topics', []),
-                        'sentiment': analysis.get('overall_sentiment')
-                    },
-                    sentiment
-                )
-
-            print(f"    Sentiment: {analysis.get('overall_sentiment')} ({sentiment:.2f})")
-            print(f"    Blockers found: {len(analysis.get('blockers', []))}")
-
             # Rate limiting
             time.sleep(1)
+        else:
+            instrumentation.count('messages_failed', len(batch))
+
+    record_project_health(project_id, all_sentiment_scores, all_blockers, len(messages))
+    print_cache_usage(instrumentation.project_counters(project_id), len(messages))
+
+
+def write_batch_insights(project_id: str, batch: list, analysis: dict) -> float:
+    """Queue a batch's action items, then store the analysis on each of its messages.
+
+    Action items go first: if Supabase is unavailable the error propagates
+    before any message is marked processed, so the batch is re-analyzed next
+    run instead of losing its action items. Returns the batch sentiment.
+    """
+    sentiment = analysis.get('sentiment_score', 0.5)
+    if analysis.get('action_items'):
+        with span('write_back', table='action_queue') as attrs:
+            created, merged = upsert_action_items(project_id, batch, analysis['action_items'])
+            attrs['rows'] = created + merged
+        print(f"    Action items: {created} new, {merged} merged into open actions")
+
+    with span('write_back', rows=len(batch)):
+        for msg in batch:
+            update_message_insights(
+                msg['id'],
+                {
+                    'summary': analysis.get('summary'),
+                    'key_topics': analysis.get('key_topics', []),
+                    'sentiment': analysis.get('overall_sentiment')
+                },
+                sentiment
+            )
+    instrumentation.count('messages_processed', len(batch))
+
+    print(f"    Sentiment: {analysis.get('overall_sentiment')} ({sentiment:.2f})")
+    print(f"    Blockers found: {len(analysis.get('blockers', []))}")
+    return sentiment
+
+
+def upsert_action_items(project_id: str, batch: list, action_items: list) -> tuple:
+    """Send a batch's action items through upsert_action_items() (schema v9).
+
+    Items repeating an open action of the project (normalized title, else
+    trigram similarity) are merged into it, with their evidence links
+    appended, instead of adding another row. An item's evidence is its
+    source message when the model named one, otherwise the whole batch.
+    Returns (created, merged); raises if Supabase is unavailable.
+    """
+    items = []
+    for item in action_items:
+        source = item.get('source_message')
+        if isinstance(source, (int, float)) and 1 <= source <= len(batch):
+            sources = [batch[int(source) - 1]]
+        else:
+            sources = batch
+        items.append({
+            'project_id': project_id,
+            'title': item['task'],
+            'owner': item.get('owner'),
+            'priority': item.get('priority'),
+            'delivery_intelligence_id': sources[0]['id'] if len(sources) == 1 else None,
+            'evidence_links': [m['evidence_link'] for m in sources if m.get('evidence_link')],
+            'source_type': 'AI_Extracted',
+        })
 
-    # Update project health with aggregated analysis
-    if all_sentiment_scores:
-        avg_sentiment = sum(all_sentiment_scores) / len(all_sentiment_scores)
-        aggregated_analysis = {
-            'sentiment_score': avg_sentiment,
-            'blockers': list(set(all_blockers)),  # Dedupe
-            'project_health_indicators': {
-                'warning_signs': all_blockers[:5]  # Top 5 concerns
-            },
-            'summary': f"Analyzed {len(messages)} recent messages. Average sentiment: {avg_sentiment:.2f}"
-        }
+    try:
+        rows = supabase_query(f"SELECT * FROM upsert_action_items({sql_literal(items)})") or []
+    except Exception as e:
+        print(f"Action upsert error: {e}")
+        instrumentation.count('write_failures')
+        if is_unavailable(e):
+            raise
+        return 0, 0
+    merged = sum(1 for row in rows if row.get('merged'))
+    instrumentation.count('actions_created', len(rows) - merged)
+    instrumentation.count('actions_merged', merged)
+    return len(rows) - merged, merged
+
+
+def record_project_health(project_id: str, sentiment_scores: list, blockers: list, message_count: int):
+    """Update project health with the analysis aggregated over a run's batches"""
+    if not sentiment_scores:
+        return
+    avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
+    aggregated_analysis = {
+        'sentiment_score': avg_sentiment,
+        'blockers': list(set(blockers)),  # Dedupe
+        'project_health_indicators': {
+            'warning_signs': blockers[:5]  # Top 5 concerns
+        },
+        'summary': f"Analyzed {message_count} recent messages. Average sentiment: {avg_sentiment:.2f}"
+    }
+    with span('write_back', table='project_health_metrics'):
         update_project_health(project_id, aggregated_analysis)
 
 
+def pack_projects(work: list, capacity: int = BATCH_SIZE,
+                  max_projects: int = MAX_PROJECTS_PER_REQUEST) -> list:
+    """Group (project, messages) pairs into requests of at most `capacity` messages.
+
+    First-fit decreasing: the largest projects are placed first, each into
+    the first request with room, so requests end up close to full.
+    """
+    groups = []
+    sizes = []
+    for item in sorted(work, key=lambda pair: len(pair[1]), reverse=True):
+        size = len(item[1])
+        for i, group in enumerate(groups):
+            if len(group) < max_projects and sizes[i] + size <= capacity:
+                group.append(item)
+                sizes[i] += size
+                break
+        else:
+            groups.append([item])
+            sizes.append(size)
+    return groups
+
+
+def open_circuit() -> Optional[str]:
+    """Name of the first dependency whose breaker is open, if any"""
+    for endpoint, name in (('anthropic', 'Claude API'), ('supabase', 'Supabase')):
+        if get_breaker(endpoint).is_open:
+            return name
+    return None
+
+
+def process_project_group(group: list) -> dict:
+    """Analyze packed (project, messages) pairs and split the reply per project.
+
+    Projects missing from the reply are re-analyzed on their own. Returns
+    {project id: error} for projects whose results could not be stored
+    because Supabase was unavailable; their messages stay unprocessed, as do
+    all of the group's if the shared request failed.
+    """
+    print(f"\n{'='*50}")
+    print(f"Processing {len(group)} projects in one request")
+    print(f"{'='*50}")
+
+    analyses = analyze_project_group(group) if len(group) > 1 else {}
+    if analyses is None:
+        for project, messages in group:
+            with project_scope(project['id']):
+                instrumentation.count('messages_failed', len(messages))
+        return {}
+
+    unstored = {}
+    for project, messages in group:
+        with project_scope(project['id']):
+            print(f"  {project['name']}: {len(messages)} messages")
+            analysis = analyses.get(str(project['id']))
+            if analysis is None:
+                if len(group) > 1:
+                    print("    Missing from packed reply, analyzing separately")
+                analysis = analyze_messages_batch(messages, system=build_system_blocks(project))
+            if not analysis:
+                instrumentation.count('messages_failed', len(messages))
+                continue
+            try:
+                sentiment = write_batch_insights(project['id'], messages, analysis)
+            except Exception as e:
+                if not is_unavailable(e):
+                    raise
+                print(f"    Supabase unavailable, leaving messages for next run: {e}")
+                unstored[project['id']] = str(e)
+                continue
+            record_project_health(project['id'], [sentiment], analysis.get('blockers', []), len(messages))
+
+    # Rate limiting, once per request rather than per project
+    time.sleep(1)
+    return unstored
+
+
+def process_small_projects(projects: list, audit: AuditBuffer) -> int:
+    """Analyze projects with fewer than BATCH_SIZE pending messages in packed requests.
+
+    All their messages are fetched in one query and packed so the number of
+    Claude calls tracks messages / BATCH_SIZE rather than the project count.
+    Returns the number of projects deferred because the Claude or Supabase
+    circuit opened (or Supabase was otherwise unavailable).
+    """
+    ids = ", ".join(sql_literal(project['id']) for project in projects)
+    sql = f"""
+    SELECT id, project_id, title, content_raw, created_at, event_type, evidence_link
+    FROM delivery_intelligence
+    WHERE project_id IN ({ids})
+    AND (ai_processed IS NULL OR ai_processed = false)
+    ORDER BY created_at DESC
+    """
+
+    try:
+        with span('db_fetch', query='unprocessed_messages', projects=len(projects)) as attrs:
+            rows = supabase_query(sql) or []
+            attrs['rows'] = len(rows)
+    except Exception as e:
+        if not is_unavailable(e):
+            raise
+        print(f"\nSupabase unavailable - deferring {len(projects)} small projects to next run: {e}")
+        for project in projects:
+            record_project_audit(audit, project, 0, deferred=True, error=str(e))
+        return len(projects)
+
+    pending = {}
+    for row in rows:
+        pending.setdefault(str(row['project_id']), []).append(row)
+    # Messages that arrived since the project count are left for the next run
+    work = [(project, pending[str(project['id'])][:BATCH_SIZE])
+            for project in projects if pending.get(str(project['id']))]
+    groups = pack_projects(work)
+    print(f"\nPacking {len(work)} small projects ({sum(len(m) for _, m in work)} messages) "
+          f"into {len(groups)} requests")
+
+    deferred = 0
+    for i, group in enumerate(groups):
+        circuit = open_circuit()
+        if circuit:
+            print(f"\n{circuit} circuit open - deferring remaining projects to next run")
+            return deferred + sum(len(g) for g in groups[i:])
+        group_started = time.perf_counter()
+        unstored = process_project_group(group)
+        share_ms = (time.perf_counter() - group_started) * 1000 / len(group)
+        for project, _ in group:
+            error = unstored.get(project['id'])
+            if error:
+                record_project_audit(audit, project, share_ms, packed_with=len(group), deferred=True, error=error)
+            else:
+                record_project_audit(audit, project, share_ms, packed_with=len(group))
+        deferred += len(unstored)
+    return deferred
+
+
+def print_cache_usage(counters: dict, message_count: int):
+    """Report prompt-cache effectiveness from recorded token usage"""
+    uncached = counters.get('input_tokens', 0)
+    written = counters.get('cache_creation_input_tokens', 0)
+    read = counters.get('cache_read_input_tokens', 0)
+    total = uncached + written + read
+    if not total:
+        return
+    print(f"  Tokens: {total} prompt ({read} cache read, {written} cache write, {uncached} uncached), "
+          f"{total / max(message_count, 1):.0f}/message, {read / total:.0%} served from cache")
+
+
+def _audit_counts(counters: dict) -> dict:
+    return {
+        'messages_processed': counters.get('messages_processed', 0),
+        'messages_failed': counters.get('messages_failed', 0),
+        'write_failures': counters.get('write_failures', 0),
+        'parse_failures': counters.get('parse_failures', 0),
+        'actions_created': counters.get('actions_created', 0),
+        'actions_merged': counters.get('actions_merged', 0),
+        'api_calls': counters.get('api_calls', 0),
+        'input_tokens': counters.get('input_tokens', 0),
+        'output_tokens': counters.get('output_tokens', 0),
+        'cache_creation_input_tokens': counters.get('cache_creation_input_tokens', 0),
+        'cache_read_input_tokens': counters.get('cache_read_input_tokens', 0),
+    }
+
+
+def record_project_audit(audit: AuditBuffer, project: dict, duration_ms: float, **meta):
+    """Queue the per-project audit record"""
+    counts = _audit_counts(instrumentation.project_counters(project['id']))
+    stages = {stage: round(total_ms) for stage, (total_ms, _) in
+              instrumentation.stage_totals(project['id']).items()}
+    audit.add(
+        'project', duration_ms,
+        processed=counts['messages_processed'],
+        failed=counts['messages_failed'] + counts['write_failures'],
+        key=project['id'],
+        project_id=project['id'],
+        project_name=project['name'],
+        stage_ms=stages,
+        **meta,
+        **counts
+    )
+
+
+def record_run_audit(audit: AuditBuffer, project_count: int, deferred: int, duration_ms: float):
+    """Queue the run-level audit record, totalled across projects"""
+    totals = {}
+    for counters in instrumentation.project_counters().values():
+        for k, v in _audit_counts(counters).items():
+            totals[k] = totals.get(k, 0) + v
+    totals = totals or _audit_counts({})
+    stages = {stage: round(total_ms) for stage, (total_ms, _) in
+              instrumentation.stage_totals().items()}
+    audit.add(
+        'run', duration_ms,
+        processed=totals['messages_processed'],
+        failed=totals['messages_failed'] + totals['write_failures'],
+        projects=project_count,
+        projects_deferred=deferred,
+        stage_ms=stages,
+        **totals
+    )
+
+
 def main():
     """Main entry point"""
     print("\n" + "="*60)
@@ -264,16 +847,25 @@ def main():
         print("ERROR: ANTHROPIC_API_KEY not found in .env")
         return
 
-    # Get all projects with messages
+    # Projects with unprocessed messages, with the SOW fields for the cached context
+    # and the pending count that decides whether a project is packed with others
     sql = """
-    SELECT DISTINCT p.id, p.name
-    FROM projects p
-    JOIN delivery_intelligence d ON d.project_id = p.id
-    WHERE d.ai_processed IS NULL OR d.ai_processed = false
-    ORDER BY p.name
+    SELECT s.id, s.project_name AS name, s.client_name, s.start_date, s.end_date,
+           s.scope_anchors, s.inferred_owner, p.pending
+    FROM sow_contracts s
+    JOIN (
+        SELECT d.project_id, COUNT(*) AS pending
+        FROM delivery_intelligence d
+        WHERE (d.ai_processed IS NULL OR d.ai_processed = false)
+        GROUP BY d.project_id
+    ) p ON p.project_id = s.id
+    ORDER BY s.project_name
     """
 
-    projects = supabase_query(sql)
+    instrumentation.start_exporters()
+
+    with span('db_fetch', query='projects'):
+        projects = supabase_query(sql)
 
     if not projects:
         print("\nNo projects with unprocessed messages found.")
@@ -281,8 +873,49 @@ def main():
 
     print(f"\nFound {len(projects)} projects with unprocessed messages")
 
-    for project in projects:
-        process_project(project['id'], project['name'])
+    # Projects that fill a batch on their own keep per-project requests (with
+    # the SOW in the system prompt); the rest share packed requests
+    small = [p for p in projects if MICRO_BATCHING and int(p.get('pending') or 0) < BATCH_SIZE]
+    large = [p for p in projects if p not in small]
+
+    audit = AuditBuffer('ai_analyzer', instrumentation.RUN_ID)
+    run_started = time.perf_counter()
+    deferred = 0
+    try:
+        for i, project in enumerate(large):
+            circuit = open_circuit()
+            if circuit:
+                # Leave remaining messages unprocessed; the next run picks them up
+                print(f"\n{circuit} circuit open - deferring remaining projects to next run")
+                deferred += len(large) - i + len(small)
+                break
+            project_started = time.perf_counter()
+            with project_scope(project['id']):
+                try:
+                    process_project(project)
+                    error = None
+                except Exception as e:
+                    if not is_unavailable(e):
+                        raise
+                    print(f"  Supabase unavailable - deferring {project['name']} to next run: {e}")
+                    error = str(e)
+            duration_ms = (time.perf_counter() - project_started) * 1000
+            if error:
+                record_project_audit(audit, project, duration_ms, deferred=True, error=error)
+                deferred += 1
+            else:
+                record_project_audit(audit, project, duration_ms)
+        else:
+            if small:
+                deferred += process_small_projects(small, audit)
+        audit.flush()
+    finally:
+        record_run_audit(audit, len(projects), deferred, (time.perf_counter() - run_started) * 1000)
+        audit.flush()
+
+    instrumentation.print_summary()
+    instrumentation.flush()
+    metrics.write_textfile()
 
     print("\n" + "="*60)
     print("  Analysis Complete!")
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Coalescing alert dispatcher for alert_notifications (schema v8).
+
+LISTENs on the alert_notifications channel. The first insert after a quiet
+period opens a coalescing window; when it closes, every undelivered alert is
+claimed by stamping claimed_at in a short transaction (SKIP LOCKED, so a second
+dispatcher never double-posts), grouped by project and severity, and posted as
+one chat message per group through a token-bucket rate limiter. No locks are
+held while posting. Posted rows get delivered_at in a single UPDATE; rows whose
+post failed are released for the next flush, and claims left behind by a
+dispatcher that died mid-post are taken over after CLAIM_TIMEOUT. A burst that
+spans more than DIGEST_THRESHOLD groups is sent as one digest post.
+
+Usage: python3 scripts/alert_dispatcher.py [--window 30] [--rate 0.8] [--once]
+       python3 scripts/alert_dispatcher.py --simulate 200
+"""
+
+import argparse
+import json
+import os
+import random
+import select
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import OrderedDict
+
+import metrics
+from audit_log import AuditBuffer
+from resilience import CircuitOpenError, call_with_retry
+from supabase_client import ssl_context
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+CONSOLE_URL = os.environ.get('CONSOLE_URL', 'https://console.onevalue.ai')
+
+CHANNEL = 'alert_notifications'
+COALESCE_WINDOW = 30.0
+# Catch-up sweep in case a NOTIFY was missed (e.g. across a reconnect)
+SWEEP_INTERVAL = 300.0
+# Google Chat webhooks accept about one post per second per space; stay under it
+POST_RATE = 0.8
+POST_BURST = 1
+CLAIM_LIMIT = 500
+# A flush posts at most DIGEST_THRESHOLD messages per claim, so a live claim is
+# never this old; an older one belongs to a dispatcher that died mid-post
+CLAIM_TIMEOUT = 600
+DIGEST_THRESHOLD = 10
+MAX_LINES = 8
+
+SEVERITY_ORDER = ('Critical', 'High', 'Medium', 'Low')
+SEVERITY_ICONS = {'Critical': '🚨', 'High': '⚠️', 'Medium': '🔔', 'Low': 'ℹ️'}
+
+CLAIM_SQL = """
+WITH claimed AS (
+    UPDATE alert_notifications a SET claimed_at = NOW()
+    FROM (
+        SELECT id FROM alert_notifications
+        WHERE delivered_at IS NULL
+          AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => %s))
+        ORDER BY triggered_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ) c
+    WHERE a.id = c.id
+    RETURNING a.id, a.project_id, a.severity, a.title, a.message, a.triggered_at, a.claimed_at
+)
+SELECT c.id::text, c.project_id::text, s.project_name, c.severity, c.title, c.message, c.triggered_at, c.claimed_at
+FROM claimed c
+LEFT JOIN sow_contracts s ON s.id = c.project_id
+ORDER BY c.triggered_at
+"""
+
+metrics.describe('onevalue_alerts_delivered_total', 'Alert rows marked delivered by the dispatcher')
+metrics.describe('onevalue_alert_posts_total', 'Chat posts made by the dispatcher, by outcome')
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """Block until a token is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def group_alerts(rows: list) -> list:
+    """Group alert rows by (project, severity), most severe first"""
+    groups = OrderedDict()
+    for r in sorted(rows, key=lambda r: (SEVERITY_ORDER.index(r['severity']), r['project_name'] or '')):
+        key = (r['project_id'], r['severity'])
+        groups.setdefault(key, {
+            'project_name': r['project_name'] or 'Portfolio',
+            'severity': r['severity'],
+            'alerts': [],
+        })['alerts'].append(r)
+    return list(groups.values())
+
+
+def _alert_lines(alerts: list) -> list:
+    lines = [f"• *{a['title']}* - {(a['message'] or '')[:200]}" for a in alerts[:MAX_LINES]]
+    if len(alerts) > MAX_LINES:
+        lines.append(f"…and {len(alerts) - MAX_LINES} more")
+    return lines
+
+
+def format_group(group: dict) -> str:
+    n = len(group['alerts'])
+    header = (f"{SEVERITY_ICONS.get(group['severity'], '')} *{n} {group['severity']} "
+              f"alert{'s' if n != 1 else ''}* - {group['project_name']}")
+    return '\n'.join([header, ''] + _alert_lines(group['alerts']) + ['', f"Review in {CONSOLE_URL}/alerts"])
+
+
+def format_digest(groups: list) -> str:
+    total = sum(len(g['alerts']) for g in groups)
+    lines = [f"🚨 *Alert digest: {total} alerts across {len(groups)} project/severity groups*", '']
+    for g in groups[:MAX_LINES * 2]:
+        lines.append(f"• {SEVERITY_ICONS.get(g['severity'], '')} {g['project_name']}: "
+                     f"{len(g['alerts'])} {g['severity']} - {g['alerts'][0]['title']}")
+    if len(groups) > MAX_LINES * 2:
+        lines.append(f"…and {len(groups) - MAX_LINES * 2} more groups")
+    lines += ['', f"Review in {CONSOLE_URL}/alerts"]
+    return '\n'.join(lines)
+
+
+def post_message(text: str, url: str = None):
+    req = urllib.request.Request(
+        url or ALERT_WEBHOOK_URL,
+        data=json.dumps({'text': text}).encode('utf-8'),
+        headers={'Content-Type': 'application/json; charset=UTF-8'},
+        method='POST',
+    )
+
+    def send():
+        with urllib.request.urlopen(req, context=ssl_context, timeout=30) as response:
+            return json.loads(response.read().decode('utf-8') or '{}')
+
+    # Not idempotent: only replayed when the server rejected the post outright
+    return call_with_retry('google_chat_webhook', send, idempotent=False)
+
+
+def dispatch(rows: list, bucket: TokenBucket, url: str = None) -> tuple:
+    """Post coalesced messages for rows; returns (delivered ids, posts made)"""
+    groups = group_alerts(rows)
+    if len(groups) > DIGEST_THRESHOLD:
+        batches = [(format_digest(groups), [a['id'] for g in groups for a in g['alerts']])]
+    else:
+        batches = [(format_group(g), [a['id'] for a in g['alerts']]) for g in groups]
+
+    delivered, posts = [], 0
+    for text, ids in batches:
+        bucket.acquire()
+        try:
+            post_message(text, url)
+        except CircuitOpenError as e:
+            print(f"  Webhook circuit open, leaving {len(rows) - len(delivered)} alerts for later: {e}")
+            metrics.inc('onevalue_alert_posts_total', outcome='circuit_open')
+            break
+        except Exception as e:
+            print(f"  Post failed for {len(ids)} alerts: {e}")
+            metrics.inc('onevalue_alert_posts_total', outcome='failed')
+            continue
+        metrics.inc('onevalue_alert_posts_total', outcome='ok')
+        delivered.extend(ids)
+        posts += 1
+    return delivered, posts
+
+
+def connect(autocommit: bool = False):
+    if psycopg2 is None:
+        raise SystemExit('psycopg2 is not installed (pip install psycopg2-binary); LISTEN needs a direct connection')
+    if not DATABASE_URL:
+        raise SystemExit('Set DATABASE_URL to the Postgres connection string')
+    conn = psycopg2.connect(DATABASE_URL)
+    if autocommit:
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    return conn
+
+
+def flush(conn, bucket: TokenBucket) -> tuple:
+    """Claim, post and mark undelivered alerts until none are left; returns (claimed, delivered, posts)"""
+    claimed = delivered_total = posts_total = 0
+    while True:
+        # Claim and commit first so no row locks are held during the webhook posts
+        with conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(CLAIM_SQL, (CLAIM_TIMEOUT, CLAIM_LIMIT))
+                rows = cur.fetchall()
+        if not rows:
+            break
+
+        delivered, posts = dispatch(rows, bucket)
+
+        posted = set(delivered)
+        failed = [r['id'] for r in rows if r['id'] not in posted]
+        with conn:
+            with conn.cursor() as cur:
+                if delivered:
+                    cur.execute("UPDATE alert_notifications SET delivered_at = NOW(), claimed_at = NULL "
+                                "WHERE id = ANY(%s::uuid[])", (delivered,))
+                if failed:
+                    # Only release our own claim; a stale one may since have been taken over
+                    cur.execute("UPDATE alert_notifications SET claimed_at = NULL "
+                                "WHERE id = ANY(%s::uuid[]) AND claimed_at = %s",
+                                (failed, rows[0]['claimed_at']))
+        claimed += len(rows)
+        delivered_total += len(delivered)
+        posts_total += posts
+        metrics.inc('onevalue_alerts_delivered_total', len(delivered))
+        # Stop on failures rather than re-claiming the same rows in a tight loop
+        if len(rows) < CLAIM_LIMIT or len(delivered) < len(rows):
+            break
+    return claimed, delivered_total, posts_total
+
+
+def run(window: float, sweep_interval: float, bucket: TokenBucket, once: bool = False):
+    listener = connect(autocommit=True)
+    with listener.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    worker = connect()
+    print(f"Listening on '{CHANNEL}' (window {window:.0f}s, {bucket.rate:g} posts/s)")
+
+    # Start with a flush to pick up anything inserted while the dispatcher was down
+    pending_since = time.monotonic() - window
+    last_sweep = time.monotonic()
+    signalled = 0
+    while True:
+        now = time.monotonic()
+        if pending_since is not None:
+            timeout = max(0.0, pending_since + window - now)
+        else:
+            timeout = max(0.0, last_sweep + sweep_interval - now)
+
+        if select.select([listener], [], [], timeout)[0]:
+            listener.poll()
+            for n in listener.notifies:
+                signalled += int(n.payload or 0)
+            listener.notifies.clear()
+            if pending_since is None:
+                pending_since = time.monotonic()
+            continue
+
+        start = time.perf_counter()
+        claimed, delivered, posts = flush(worker, bucket)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if claimed:
+            print(f"  {signalled} signalled, {claimed} claimed -> {posts} posts, "
+                  f"{delivered} delivered in {duration_ms / 1000:.1f}s")
+            audit = AuditBuffer('alert_dispatcher', str(uuid.uuid4()))
+            audit.add('flush', duration_ms, processed=delivered, failed=claimed - delivered,
+                      posts=posts, signalled=signalled)
+            audit.flush()
+        pending_since, signalled = None, 0
+        last_sweep = time.monotonic()
+        if once:
+            break
+
+
+def synthetic_alerts(n: int, projects: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    names = [f"Project {chr(65 + i)}" for i in range(projects)]
+    return [{
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'project_id': str(names.index(name)),
+        'project_name': name,
+        'severity': rng.choice(SEVERITY_ORDER),
+        'title': f"Critical issue detected ({i})",
+        'message': 'Analyzer flagged a blocker on the delivery timeline',
+        'triggered_at': None,
+    } for i, name in ((i, rng.choice(names)) for i in range(n))]
+
+
+def run_simulation(n: int, projects: int, rate: float, burst: int):
+    """Per-alert posting vs coalesced dispatch against a 1 post/s webhook stub, no database needed"""
+    from stub_servers import WebhookStubHandler, start_webhook_stub
+
+    server = start_webhook_stub(rate_limit=1)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    alerts = synthetic_alerts(n, projects)
+
+    start = time.perf_counter()
+    ok = 0
+    for a in alerts:
+        try:
+            urllib.request.urlopen(urllib.request.Request(
+                url, data=json.dumps({'text': a['title']}).encode(), method='POST',
+                headers={'Content-Type': 'application/json'}), timeout=10).close()
+            ok += 1
+        except urllib.error.HTTPError:
+            pass
+    per_alert_s = time.perf_counter() - start
+    print(f"\nPer-alert posting: {n} posts in {per_alert_s:.2f}s, "
+          f"{ok} accepted, {WebhookStubHandler.rejected} rejected with 429")
+
+    server.shutdown()
+    server = start_webhook_stub(rate_limit=1)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    start = time.perf_counter()
+    delivered, posts = dispatch(alerts, TokenBucket(rate, burst), url)
+    coalesced_s = time.perf_counter() - start
+    print(f"Coalesced dispatch: {posts} posts in {coalesced_s:.2f}s, "
+          f"{len(delivered)}/{n} alerts delivered, {WebhookStubHandler.rejected} rejected with 429")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coalesce and rate-limit alert_notifications chat posts')
+    parser.add_argument('--window', type=float, default=COALESCE_WINDOW, help='Seconds to coalesce after a wake-up')
+    parser.add_argument('--sweep', type=float, default=SWEEP_INTERVAL, help='Seconds between catch-up sweeps')
+    parser.add_argument('--rate', type=float, default=POST_RATE, help='Webhook posts per second')
+    parser.add_argument('--burst', type=int, default=POST_BURST)
+    parser.add_argument('--once', action='store_true', help='Flush pending alerts and exit')
+    parser.add_argument('--simulate', type=int, metavar='N', help='Compare per-alert vs coalesced posting of N alerts')
+    parser.add_argument('--projects', type=int, default=2, help='Projects spread across --simulate alerts')
+    args = parser.parse_args()
+
+    if args.simulate:
+        run_simulation(args.simulate, args.projects, args.rate, args.burst)
+        return
+    if not ALERT_WEBHOOK_URL:
+        raise SystemExit('Set ALERT_WEBHOOK_URL to the Google Chat incoming webhook for the alerts space')
+
+    print("=" * 50)
+    print("OneValue Alert Dispatcher")
+    print("=" * 50)
+    try:
+        run(args.window, args.sweep, TokenBucket(args.rate, args.burst), args.once)
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Buffered writer for system_audit_logs.
+Collects per-run and per-project records from the Python pipeline and
+inserts them with a single multi-row INSERT per flush.
+"""
+
+import uuid
+from typing import Optional
+
+from supabase_client import sql_literal, supabase_query
+
+AUDIT_COLUMNS = (
+    'id', 'workflow_name', 'execution_id', 'execution_status', 'error_message',
+    'execution_time_ms', 'records_processed', 'records_failed', 'metadata',
+)
+
+
+def execution_status(processed: int, failed: int) -> str:
+    """Map counts onto the system_audit_logs execution_status values"""
+    if failed and not processed:
+        return 'Failed'
+    if failed:
+        return 'Warning'
+    return 'Success'
+
+
+class AuditBuffer:
+    """Accumulates audit records and writes them in bulk"""
+
+    def __init__(self, workflow_name: str, execution_id: str):
+        self.workflow_name = workflow_name
+        self.execution_id = execution_id
+        self.records = []
+
+    def add(self, scope: str, duration_ms: float, processed: int = 0, failed: int = 0,
+            key: Optional[str] = None, error_message: Optional[str] = None, **metadata):
+        """Queue one record. `key` identifies it within the run (e.g. project id)."""
+        # Deterministic id so a replayed flush is a no-op rather than a duplicate
+        record_id = uuid.uuid5(uuid.NAMESPACE_URL,
+                               f"{self.workflow_name}/{self.execution_id}/{scope}/{key or ''}")
+        self.records.append({
+            'id': str(record_id),
+            'workflow_name': self.workflow_name,
+            'execution_id': self.execution_id,
+            'execution_status': execution_status(processed, failed),
+            'error_message': error_message,
+            'execution_time_ms': int(duration_ms),
+            'records_processed': processed,
+            'records_failed': failed,
+            'metadata': {'scope': scope, **metadata},
+        })
+
+    def flush(self) -> int:
+        """Insert all queued records in one statement; returns rows written"""
+        if not self.records:
+            return 0
+        rows = ",\n".join(
+            "(" + ", ".join(sql_literal(r[c]) for c in AUDIT_COLUMNS) + ")"
+            for r in self.records
+        )
+        sql = f"""
+        INSERT INTO system_audit_logs ({', '.join(AUDIT_COLUMNS)})
+        VALUES
+        {rows}
+        ON CONFLICT (id) DO NOTHING
+        """
+        try:
+            supabase_query(sql)
+        except Exception as e:
+            # Audit logging must never fail the run; keep records for the next flush
+            print(f"Audit log flush error: {e}")
+            return 0
+        written = len(self.records)
+        self.records.clear()
+        return written
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Throughput trends from system_audit_logs.
+Summarizes per-run audit records written by the Python pipeline by day.
+
+Usage: python3 scripts/audit_report.py [--days 14] [--workflow ai_analyzer]
+"""
+
+import argparse
+
+from supabase_client import sql_literal, supabase_query
+
+
+def fetch_daily_summary(workflow: str, days: int) -> list:
+    sql = f"""
+    SELECT
+        date_trunc('day', timestamp)::date AS day,
+        COUNT(*) AS runs,
+        COUNT(*) FILTER (WHERE execution_status = 'Failed') AS failed_runs,
+        SUM(records_processed) AS messages,
+        SUM(records_failed) AS failures,
+        SUM(COALESCE((metadata->>'api_calls')::int, 0)) AS api_calls,
+        SUM(COALESCE((metadata->>'input_tokens')::bigint, 0)) AS input_tokens,
+        SUM(COALESCE((metadata->>'output_tokens')::bigint, 0)) AS output_tokens,
+        ROUND(AVG(execution_time_ms)) AS avg_run_ms,
+        SUM(execution_time_ms) AS total_ms
+    FROM system_audit_logs
+    WHERE workflow_name = {sql_literal(workflow)}
+    AND metadata->>'scope' = 'run'
+    AND timestamp >= NOW() - INTERVAL '{int(days)} days'
+    GROUP BY 1
+    ORDER BY 1
+    """
+    return supabase_query(sql) or []
+
+
+def fetch_slowest_projects(workflow: str, days: int, limit: int = 5) -> list:
+    sql = f"""
+    SELECT
+        metadata->>'project_name' AS project_name,
+        COUNT(*) AS runs,
+        SUM(records_processed) AS messages,
+        ROUND(AVG(execution_time_ms)) AS avg_ms,
+        ROUND(SUM(execution_time_ms)::numeric / NULLIF(SUM(records_processed), 0)) AS ms_per_message
+    FROM system_audit_logs
+    WHERE workflow_name = {sql_literal(workflow)}
+    AND metadata->>'scope' = 'project'
+    AND timestamp >= NOW() - INTERVAL '{int(days)} days'
+    GROUP BY 1
+    ORDER BY avg_ms DESC NULLS LAST
+    LIMIT {int(limit)}
+    """
+    return supabase_query(sql) or []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize pipeline throughput from audit logs')
+    parser.add_argument('--days', type=int, default=14, help='Look-back window in days')
+    parser.add_argument('--workflow', default='ai_analyzer', help='workflow_name to report on')
+    args = parser.parse_args()
+
+    rows = fetch_daily_summary(args.workflow, args.days)
+    print(f"\n{args.workflow}: last {args.days} days")
+    if not rows:
+        print("  No audit records found")
+        return
+
+    print(f"{'day':<12}{'runs':>6}{'msgs':>8}{'fail%':>8}{'calls':>7}"
+          f"{'tok in':>10}{'tok out':>9}{'avg run':>10}{'msg/s':>8}")
+    for r in rows:
+        messages = int(r['messages'] or 0)
+        failures = int(r['failures'] or 0)
+        total_s = (r['total_ms'] or 0) / 1000
+        fail_pct = 100 * failures / (messages + failures) if messages + failures else 0
+        rate = messages / total_s if total_s else 0
+        print(f"{str(r['day']):<12}{r['runs']:>6}{messages:>8}{fail_pct:>7.1f}%"
+              f"{int(r['api_calls'] or 0):>7}{int(r['input_tokens'] or 0):>10}"
+              f"{int(r['output_tokens'] or 0):>9}{(r['avg_run_ms'] or 0) / 1000:>9.1f}s{rate:>8.2f}")
+
+    slowest = fetch_slowest_projects(args.workflow, args.days)
+    if slowest:
+        print("\nSlowest projects:")
+        for r in slowest:
+            print(f"  {r['project_name'] or 'Unknown':<40} {(r['avg_ms'] or 0) / 1000:6.1f}s avg, "
+                  f"{r['ms_per_message'] or '-'} ms/msg over {r['runs']} runs")
+
+
+if __name__ == '__main__':
+    main()
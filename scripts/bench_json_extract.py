@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON extraction over a corpus of model responses.
+Compares the legacy first-{/last-} slice against json_extract + schema
+validation: parse success, fields needing a re-request, and time per response.
+
+Usage: python3 scripts/bench_json_extract.py [corpus.jsonl] [--rounds 2000]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from json_extract import parse_response
+
+DEFAULT_CORPUS = Path(__file__).parent / 'bench_data' / 'analysis_responses.jsonl'
+
+
+def legacy_parse(text: str):
+    """The original analyze_messages_batch extraction"""
+    try:
+        json_start = text.find('{')
+        json_end = text.rfind('}') + 1
+        if json_start >= 0 and json_end > json_start:
+            return json.loads(text[json_start:json_end])
+    except json.JSONDecodeError:
+        pass
+    return None
+
+
+def time_per_call(fn, corpus: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for case in corpus:
+            fn(case['text'])
+    return (time.perf_counter() - start) / (rounds * len(corpus))
+
+
+def main():
+    # Imported here so .env loading does not run for --help
+    from ai_analyzer import ANALYSIS_SCHEMA, repair_analysis_locally
+
+    parser = argparse.ArgumentParser(description='Benchmark model-output JSON extraction')
+    parser.add_argument('corpus', nargs='?', default=str(DEFAULT_CORPUS))
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = [json.loads(line) for line in open(args.corpus) if line.strip()]
+
+    def new_parse(text):
+        clean, bad = parse_response(text, ANALYSIS_SCHEMA)
+        return clean, repair_analysis_locally(clean or {}, bad)
+
+    by_label = {}
+    for case in corpus:
+        stats = by_label.setdefault(case['label'], {'n': 0, 'legacy': 0, 'full': 0, 'partial': 0})
+        stats['n'] += 1
+        if legacy_parse(case['text']) is not None:
+            stats['legacy'] += 1
+        clean, bad = new_parse(case['text'])
+        if clean is not None and not bad:
+            stats['full'] += 1
+        elif clean is not None:
+            stats['partial'] += 1
+
+    print(f"\nCorpus: {len(corpus)} responses ({args.corpus})\n")
+    print(f"{'case':<28}{'n':>4}{'legacy ok':>11}{'new ok':>9}{'re-request':>12}")
+    totals = {'n': 0, 'legacy': 0, 'full': 0, 'partial': 0}
+    for label, stats in by_label.items():
+        print(f"{label:<28}{stats['n']:>4}{stats['legacy']:>11}{stats['full']:>9}{stats['partial']:>12}")
+        for k in totals:
+            totals[k] += stats[k]
+    print(f"{'TOTAL':<28}{totals['n']:>4}{totals['legacy']:>11}{totals['full']:>9}{totals['partial']:>12}")
+    print("\n're-request' = JSON recovered but some required fields must be re-asked;"
+          "\nthe legacy parser would have discarded (and later re-billed) the whole batch.")
+
+    legacy_s = time_per_call(legacy_parse, corpus, args.rounds)
+    new_s = time_per_call(new_parse, corpus, args.rounds)
+    print(f"\nlegacy: {legacy_s * 1e6:8.1f} us/response")
+    print(f"new:    {new_s * 1e6:8.1f} us/response (extract + validate)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compare one Claude request per small project with cross-project micro-batches
+(projects packed into shared requests up to BATCH_SIZE messages). Runs against
+the local Anthropic stub, which answers packed requests with one analysis per
+<project id="..."> section.
+
+Usage: python3 scripts/bench_micro_batch.py [--projects 40] [--max-messages 3]
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+
+from bench_prompt_cache import sample_messages, sample_project
+from stub_servers import start_anthropic_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cross-project micro-batching')
+    parser.add_argument('--projects', type=int, default=40)
+    parser.add_argument('--max-messages', type=int, default=3, help='Pending messages per project (1..N)')
+    parser.add_argument('--latency-ms', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_anthropic_stub(latency_ms=args.latency_ms)
+    os.environ['ANTHROPIC_API_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'stub')
+
+    import ai_analyzer
+    import instrumentation
+
+    ai_analyzer.ANALYSIS_OUTPUT_MODE = 'tool'
+    rng = random.Random(args.seed)
+    work = []
+    for i in range(args.projects):
+        project = sample_project(i)
+        work.append((project, sample_messages(project, rng.randint(1, args.max_messages))))
+    total_messages = sum(len(messages) for _, messages in work)
+    ideal = math.ceil(total_messages / ai_analyzer.BATCH_SIZE)
+
+    print(f"\n{args.projects} projects, {total_messages} messages "
+          f"(ideal {ideal} calls at {ai_analyzer.BATCH_SIZE} messages/call)\n")
+    print(f"{'mode':<13}{'calls':>7}{'analyzed':>10}{'prompt tok':>12}{'output tok':>12}{'wall s':>8}")
+    for mode in ('per-project', 'packed'):
+        analyzed = 0
+        start = time.perf_counter()
+        with instrumentation.project_scope(mode):
+            if mode == 'per-project':
+                for project, messages in work:
+                    system = ai_analyzer.build_system_blocks(project)
+                    if ai_analyzer.analyze_messages_batch(messages, system=system):
+                        analyzed += 1
+            else:
+                for group in ai_analyzer.pack_projects(work):
+                    analyses = ai_analyzer.analyze_project_group(group) or {}
+                    for project, messages in group:
+                        if project['id'] in analyses or ai_analyzer.analyze_messages_batch(
+                                messages, system=ai_analyzer.build_system_blocks(project)):
+                            analyzed += 1
+        elapsed = time.perf_counter() - start
+
+        counters = instrumentation.project_counters(mode)
+        prompt = (counters.get('input_tokens', 0) + counters.get('cache_creation_input_tokens', 0)
+                  + counters.get('cache_read_input_tokens', 0))
+        print(f"{mode:<13}{counters.get('api_calls', 0):>7}{analyzed:>10}{prompt:>12}"
+              f"{counters.get('output_tokens', 0):>12}{elapsed:>8.1f}")
+    print("\n(the analyzer also sleeps 1s per request, so each saved call saves a second more)")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Compare free-text JSON vs forced tool-use output for batch analysis.
+Runs analyze_messages_batch against the local Anthropic stub in both modes
+and reports API calls, field re-requests and lost batches per mode.
+
+Usage: python3 scripts/bench_output_modes.py [--batches 200] [--latency-ms 0]
+"""
+
+import argparse
+import os
+import time
+
+from stub_servers import start_anthropic_stub
+
+
+def sample_batch(i: int) -> list:
+    return [{
+        'id': f'msg-{i}-{j}',
+        'title': 'Meeting Notes',
+        'created_at': '2026-01-15T10:00:00Z',
+        'content_raw': {'text': f'MOM: sprint {i} review, UAT blocked on VPN access (item {j})'},
+    } for j in range(5)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark analysis output modes against the stub')
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    server = start_anthropic_stub(latency_ms=args.latency_ms, seed=args.seed)
+    os.environ['ANTHROPIC_API_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'stub')
+
+    import ai_analyzer
+    import instrumentation
+
+    print(f"\n{args.batches} batches per mode against {os.environ['ANTHROPIC_API_URL']}\n")
+    print(f"{'mode':<6}{'api calls':>11}{'re-requests':>13}{'lost':>6}{'calls/batch':>13}{'ms/batch':>10}")
+    for mode in ('text', 'tool'):
+        ai_analyzer.ANALYSIS_OUTPUT_MODE = mode
+        lost = 0
+        start = time.perf_counter()
+        with instrumentation.project_scope(f'bench-{mode}'):
+            for i in range(args.batches):
+                if ai_analyzer.analyze_messages_batch(sample_batch(i)) is None:
+                    lost += 1
+        elapsed = time.perf_counter() - start
+        counters = instrumentation.project_counters(f'bench-{mode}')
+        calls = counters.get('api_calls', 0)
+        print(f"{mode:<6}{calls:>11}{counters.get('parse_failures', 0):>13}{lost:>6}"
+              f"{calls / args.batches:>13.2f}{elapsed / args.batches * 1000:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
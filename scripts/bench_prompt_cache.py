@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare per-message analysis (workflow 04 style: SOW context rebuilt into
+every call) with project-grouped batches sharing a cacheable system prefix.
+Runs against the local Anthropic stub, which models prompt-cache reads (with
+the 1024-token minimum prefix) and charges prefill latency only for uncached
+input tokens. With the default ten scope anchors the prefix is too short to
+cache, so the grouped row shows the saving from grouping alone; raise
+--anchors to see caching on top.
+
+Usage: python3 scripts/bench_prompt_cache.py [--projects 5] [--messages 30] [--anchors 10]
+"""
+
+import argparse
+import os
+import time
+
+from stub_servers import start_anthropic_stub
+
+
+def sample_project(i: int, anchors: int = 10) -> dict:
+    return {
+        'id': f'bench-project-{i}',
+        'name': f'Bench Project {i}',
+        'client_name': f'Client University {i}',
+        'start_date': '2026-01-01',
+        'end_date': '2026-12-31',
+        'inferred_owner': 'Delivery Lead',
+        'scope_anchors': [
+            f'Deliverable {k}: migrate the {k}th student-services workflow to the new platform, '
+            f'including data mapping, SSO integration, UAT sign-off and hypercare support'
+            for k in range(1, anchors + 1)
+        ],
+    }
+
+
+def sample_messages(project: dict, n: int) -> list:
+    return [{
+        'id': f"{project['id']}-msg-{j}",
+        'title': 'Meeting Notes',
+        'created_at': '2026-01-15T10:00:00Z',
+        'content_raw': {'text': f'MOM: sprint review {j}, UAT blocked on VPN access, owner to follow up'},
+    } for j in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prompt caching of the SOW context')
+    parser.add_argument('--projects', type=int, default=5)
+    parser.add_argument('--messages', type=int, default=30, help='Messages per project')
+    parser.add_argument('--anchors', type=int, default=10, help='Scope anchors per SOW')
+    parser.add_argument('--latency-ms', type=int, default=20)
+    parser.add_argument('--prefill-ms-per-1k', type=float, default=40)
+    args = parser.parse_args()
+
+    server = start_anthropic_stub(latency_ms=args.latency_ms, prefill_ms_per_1k=args.prefill_ms_per_1k)
+    os.environ['ANTHROPIC_API_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'stub')
+
+    import ai_analyzer
+    import instrumentation
+
+    ai_analyzer.ANALYSIS_OUTPUT_MODE = 'tool'
+    projects = [sample_project(i, args.anchors) for i in range(args.projects)]
+    total_messages = args.projects * args.messages
+
+    print(f"\n{args.projects} projects x {args.messages} messages\n")
+    print(f"{'mode':<10}{'calls':>7}{'prompt tok/msg':>16}{'uncached/msg':>14}"
+          f"{'cache read':>12}{'ms/msg':>9}")
+    for mode, batch_size, cache in (('per-msg', 1, False), ('grouped', 10, True)):
+        start = time.perf_counter()
+        for project in projects:
+            system = ai_analyzer.build_system_blocks(project, cache=cache)
+            messages = sample_messages(project, args.messages)
+            with instrumentation.project_scope(f"{mode}/{project['id']}"):
+                for i in range(0, len(messages), batch_size):
+                    ai_analyzer.analyze_messages_batch(messages[i:i + batch_size], system=system)
+        elapsed = time.perf_counter() - start
+
+        totals = {}
+        for key, counters in instrumentation.project_counters().items():
+            if key and key.startswith(f'{mode}/'):
+                for name, value in counters.items():
+                    totals[name] = totals.get(name, 0) + value
+        uncached = totals.get('input_tokens', 0) + totals.get('cache_creation_input_tokens', 0)
+        read = totals.get('cache_read_input_tokens', 0)
+        print(f"{mode:<10}{totals.get('api_calls', 0):>7}{(uncached + read) / total_messages:>16.0f}"
+              f"{uncached / total_messages:>14.0f}{read:>12}{elapsed / total_messages * 1000:>9.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Watermark-driven Google Chat poller (Python replacement for the serial
+splitInBatches loop in 03_daily_delivery_poller).
+
+Each active space is fetched from its own last_polled_at watermark, spaces are
+polled concurrently by a bounded thread pool, MOMs are classified with one
+precompiled regex, and all rows go through ingest.ingest_messages in bulk.
+Watermarks advance in a single UPDATE, and only for spaces that succeeded.
+
+Usage: python3 scripts/chat_poller.py [--workers 16] [--dry-run]
+       python3 scripts/chat_poller.py --bench 300 [--latency-ms 150]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from audit_log import AuditBuffer
+from ingest import ingest_messages
+from resilience import call_with_retry
+from supabase_client import sql_literal, ssl_context, supabase_query
+
+CHAT_API_URL = os.environ.get('CHAT_API_URL', 'https://chat.googleapis.com').rstrip('/')
+GOOGLE_CHAT_TOKEN = os.environ.get('GOOGLE_CHAT_TOKEN')
+POLL_WORKERS = int(os.environ.get('POLL_WORKERS', '16'))
+PAGE_SIZE = 1000
+# First poll of a space looks back as far as the workflow always did
+DEFAULT_LOOKBACK = timedelta(hours=24)
+# Re-read a little before the watermark to cover clock skew; duplicates are
+# dropped by ON CONFLICT (source, message_id) during ingestion
+WATERMARK_OVERLAP = timedelta(minutes=5)
+LONG_MESSAGE_CHARS = 500
+
+# Same patterns as the workflow's momPatterns list, combined into one pass
+MOM_PATTERN = re.compile(
+    r'mom:|minutes of meeting|meeting notes|action items:|attendees:|agenda:|decisions:|blockers:',
+    re.IGNORECASE,
+)
+
+
+def is_mom(text: str) -> bool:
+    return MOM_PATTERN.search(text) is not None
+
+
+def _iso(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_ts(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+def get_active_spaces() -> list:
+    return supabase_query("""
+    SELECT space_id, space_name, project_id, last_polled_at
+    FROM chat_spaces
+    WHERE is_active = TRUE
+    ORDER BY space_id
+    """) or []
+
+
+def fetch_space_messages(space_id: str, since: datetime) -> list:
+    """List all messages in a space created after `since`, following pagination"""
+    messages = []
+    page_token = None
+    while True:
+        params = {
+            'filter': f'createTime > "{_iso(since)}"',
+            'pageSize': PAGE_SIZE,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        url = f"{CHAT_API_URL}/v1/{space_id}/messages?{urllib.parse.urlencode(params)}"
+        headers = {'Authorization': f'Bearer {GOOGLE_CHAT_TOKEN}'} if GOOGLE_CHAT_TOKEN else {}
+        req = urllib.request.Request(url, headers=headers)
+
+        def send():
+            with urllib.request.urlopen(req, context=ssl_context, timeout=30) as response:
+                return json.loads(response.read().decode('utf-8'))
+
+        page = call_with_retry('google_chat', send)
+        messages.extend(page.get('messages', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return messages
+
+
+def transform_message(msg: dict, space: dict):
+    """Shape a Chat message into an ingest row, or None if it is not worth keeping"""
+    text = msg.get('text') or ''
+    mom = is_mom(text)
+    if not mom and len(text) <= LONG_MESSAGE_CHARS:
+        return None
+    sender = msg.get('sender') or {}
+    return {
+        'project_id': space.get('project_id'),
+        'source': 'GoogleChat',
+        'event_type': 'MOM' if mom else 'Communication',
+        'title': 'Meeting Notes' if mom else 'Chat Update',
+        'content_raw': {
+            'text': text,
+            'sender': sender.get('displayName') or 'Unknown',
+            'sender_email': sender.get('email'),
+            'space_name': space.get('space_name'),
+            'space_id': (msg.get('space') or {}).get('name'),
+            'create_time': msg.get('createTime'),
+            'thread_id': (msg.get('thread') or {}).get('name'),
+            'is_mom': mom,
+        },
+        'evidence_link': f"https://chat.google.com/room/{space['space_id'].split('/')[-1]}",
+        'message_id': msg.get('name'),
+        'thread_id': (msg.get('thread') or {}).get('name'),
+        'space_id': (msg.get('space') or {}).get('name') or space['space_id'],
+        'ai_processed': False,
+    }
+
+
+def poll_space(space: dict, now: datetime) -> dict:
+    """Fetch and classify one space. Never raises; failures are reported in the result."""
+    if space.get('last_polled_at'):
+        since = _parse_ts(space['last_polled_at']) - WATERMARK_OVERLAP
+    else:
+        since = now - DEFAULT_LOOKBACK
+    start = time.perf_counter()
+    try:
+        messages = fetch_space_messages(space['space_id'], since)
+    except Exception as e:
+        return {'space': space, 'error': str(e), 'rows': [], 'fetched': 0,
+                'duration_ms': (time.perf_counter() - start) * 1000}
+    rows = [r for r in (transform_message(m, space) for m in messages) if r]
+    last = max(messages, key=lambda m: m.get('createTime', '')) if messages else None
+    return {
+        'space': space,
+        'error': None,
+        'rows': rows,
+        'fetched': len(messages),
+        'last_message_id': last.get('name') if last else space.get('last_message_id'),
+        'duration_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def poll_spaces(spaces: list, workers: int = POLL_WORKERS, now: datetime = None) -> list:
+    now = now or datetime.now(timezone.utc)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda s: poll_space(s, now), spaces))
+
+
+def update_watermarks(results: list, polled_at: datetime) -> int:
+    """Advance last_polled_at for every space that was fetched successfully, in one statement"""
+    ok = [r for r in results if not r['error']]
+    if not ok:
+        return 0
+    values = ",\n".join(
+        f"({sql_literal(r['space']['space_id'])}, {sql_literal(r['last_message_id'])})"
+        for r in ok
+    )
+    supabase_query(f"""
+    UPDATE chat_spaces s
+    SET last_polled_at = {sql_literal(polled_at.isoformat())}::timestamptz,
+        last_message_id = COALESCE(v.last_message_id, s.last_message_id)
+    FROM (VALUES
+    {values}
+    ) AS v(space_id, last_message_id)
+    WHERE s.space_id = v.space_id
+    """)
+    return len(ok)
+
+
+def run_poll(spaces: list, workers: int, dry_run: bool = False) -> dict:
+    # Watermark is the poll start, so messages posted mid-run are picked up next time
+    polled_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    results = poll_spaces(spaces, workers, polled_at)
+    fetch_s = time.perf_counter() - start
+
+    rows = [row for r in results for row in r['rows']]
+    failed = [r for r in results if r['error']]
+    ingested = {'received': len(rows), 'inserted': 0, 'duplicates': 0}
+    if not dry_run:
+        if rows:
+            ingested = ingest_messages(rows)
+        # Only after the rows are stored, so a failed ingest re-polls the same window
+        update_watermarks(results, polled_at)
+
+    return {
+        'spaces': len(spaces),
+        'failed_spaces': failed,
+        'fetched': sum(r['fetched'] for r in results),
+        'rows': len(rows),
+        'ingested': ingested,
+        'fetch_s': fetch_s,
+        'total_s': time.perf_counter() - start,
+    }
+
+
+def run_bench(n_spaces: int, latency_ms: int, messages_per_space: int):
+    """Serial vs pooled polling against the local Chat stub (no database writes)"""
+    global CHAT_API_URL
+    from stub_servers import start_chat_stub
+
+    server = start_chat_stub(latency_ms=latency_ms, messages_per_space=messages_per_space)
+    CHAT_API_URL = f'http://127.0.0.1:{server.server_port}'
+    now = datetime.now(timezone.utc)
+    spaces = [{
+        'space_id': f'spaces/bench{i:04d}',
+        'space_name': f'Bench Space {i}',
+        'project_id': None,
+        # Half the spaces were polled 6h ago, the rest have never been polled
+        'last_polled_at': (now - timedelta(hours=6)).isoformat() if i % 2 else None,
+    } for i in range(n_spaces)]
+
+    print(f"\nPolling {n_spaces} spaces against the Chat stub "
+          f"({latency_ms}ms per page, {messages_per_space} messages/space over 48h)\n")
+    print(f"{'workers':>8}{'seconds':>10}{'messages':>10}{'rows':>7}{'failed':>8}")
+    for workers in (1, POLL_WORKERS, 64):
+        result = run_poll(spaces, workers, dry_run=True)
+        print(f"{workers:>8}{result['fetch_s']:>10.2f}{result['fetched']:>10}"
+              f"{result['rows']:>7}{len(result['failed_spaces']):>8}")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Poll Google Chat spaces into delivery_intelligence')
+    parser.add_argument('--workers', type=int, default=POLL_WORKERS)
+    parser.add_argument('--dry-run', action='store_true', help='Fetch and classify without writing')
+    parser.add_argument('--bench', type=int, metavar='N', help='Benchmark with N spaces against the Chat stub')
+    parser.add_argument('--latency-ms', type=int, default=150, help='Stub latency per page (with --bench)')
+    parser.add_argument('--messages-per-space', type=int, default=40)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args.bench, args.latency_ms, args.messages_per_space)
+        return
+
+    print("=" * 50)
+    print("OneValue Chat Poller")
+    print("=" * 50)
+
+    spaces = get_active_spaces()
+    print(f"\nPolling {len(spaces)} active spaces with {args.workers} workers...")
+    result = run_poll(spaces, args.workers, args.dry_run)
+
+    for r in result['failed_spaces']:
+        print(f"  Failed {r['space']['space_id']}: {r['error']}")
+    ingested = result['ingested']
+    print(f"\nFetched {result['fetched']} messages in {result['fetch_s']:.1f}s, "
+          f"kept {result['rows']}, inserted {ingested['inserted']}, "
+          f"skipped {ingested['duplicates']} duplicates")
+
+    if not args.dry_run:
+        audit = AuditBuffer('daily_delivery_poller', str(uuid.uuid4()))
+        audit.add('run', result['total_s'] * 1000,
+                  processed=ingested['inserted'], failed=len(result['failed_spaces']),
+                  spaces_checked=len(spaces), messages_fetched=result['fetched'])
+        audit.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+OneValue Console - Offline unit checks
+Assertion checks for pure helpers (JSON extraction, request packing, retry
+classification, circuit breaker, risk-score slopes). Unlike run_tests.py they
+need no Supabase, n8n or network access.
+
+Usage: python3 scripts/check_units.py
+"""
+
+import io
+import json
+import socket
+import sys
+import time
+import urllib.error
+
+import numpy as np
+
+import ai_analyzer
+from json_extract import extract_json
+from resilience import CircuitBreaker, CircuitOpenError, is_retryable, is_unavailable
+from risk_scoring import _grouped_slope
+
+results = {"passed": 0, "failed": 0}
+
+CLEAN = {
+    "overall_sentiment": "neutral",
+    "sentiment_score": 0.55,
+    "blockers": ["Waiting on client VPN access for UAT"],
+    "action_items": [{"task": "Follow up with client IT on VPN", "owner": "Priya", "priority": "high"}],
+    "key_topics": ["UAT", "access"],
+    "project_health_indicators": {"positive_signals": ["Sprint 4 demo accepted"], "warning_signs": []},
+    "summary": "UAT is waiting on VPN access.",
+}
+
+
+def run_check(check_id, description, check_func):
+    """Run a single check; a failed assert marks it FAILED"""
+    try:
+        details = check_func() or ""
+        status = "PASSED"
+        results["passed"] += 1
+    except AssertionError as e:
+        status, details = "FAILED", str(e) or "assertion failed"
+        results["failed"] += 1
+    except Exception as e:
+        status, details = "ERROR", f"{type(e).__name__}: {e}"
+        results["failed"] += 1
+    icon = "✅" if status == "PASSED" else "❌"
+    print(f"  {icon} {check_id}: {description} - {status}" + (f" ({details})" if details else ""))
+
+
+def http_error(code):
+    return urllib.error.HTTPError("https://example.invalid", code, "status", {}, io.BytesIO(b""))
+
+
+# ============================================
+# JSON EXTRACTION
+# ============================================
+
+def check_json_001():
+    """Fenced and prose-wrapped replies parse to the same object"""
+    text = json.dumps(CLEAN, indent=2)
+    for wrapped in (text, f"```json\n{text}\n```", f"Here is the analysis:\n```json\n{text}\n```\nLet me know."):
+        assert extract_json(wrapped) == CLEAN, repr(wrapped[:40])
+
+
+def check_json_002():
+    """Truncated replies are closed, with or without a trailing fence and prose"""
+    text = json.dumps(CLEAN, indent=2)
+    cut = text[:text.index('"summary"')].rstrip()
+    expected = {k: v for k, v in CLEAN.items() if k != "summary"}
+    assert extract_json(cut) == expected
+    # Cut before the final brace, then the fence was closed
+    unclosed = text.rstrip()[:-1].rstrip()
+    assert extract_json(f"```json\n{unclosed}\n```") == CLEAN
+    assert extract_json(f"```json\n{unclosed}\n```\n\nLet me know if you need the rest.") == CLEAN
+    # Cut inside a string value: the value is kept up to the cut
+    partial = extract_json(text[:text.index("Sprint 4") + 6])
+    assert partial["project_health_indicators"]["positive_signals"] == ["Sprint"], partial
+
+
+def check_json_003():
+    """Replies without an object yield None"""
+    assert extract_json("I could not analyze these messages.") is None
+    assert extract_json("") is None
+    assert extract_json(None) is None
+
+
+# ============================================
+# PACKED ANALYSIS
+# ============================================
+
+def check_pack_001():
+    """First-fit decreasing packs within the message and project limits"""
+    sizes = [7, 5, 4, 3, 3, 2, 1, 1]
+    work = [({"id": f"p{i}"}, [None] * n) for i, n in enumerate(sizes)]
+    groups = ai_analyzer.pack_projects(work, capacity=10, max_projects=3)
+    loads = [sum(len(m) for _, m in g) for g in groups]
+    assert all(load <= 10 for load in loads), loads
+    assert all(len(g) <= 3 for g in groups), [len(g) for g in groups]
+    assert sorted(p["id"] for g in groups for p, _ in g) == sorted(p["id"] for p, _ in work)
+    # 26 messages fit in the minimum of 3 requests of 10
+    assert len(groups) == 3, loads
+    # Largest first: the 7-message project opens the first request
+    assert groups[0][0][0]["id"] == "p0"
+    return f"{len(sizes)} projects -> loads {loads}"
+
+
+def check_pack_002():
+    """A project larger than capacity still gets its own request"""
+    work = [({"id": "big"}, [None] * 12), ({"id": "small"}, [None] * 2)]
+    groups = ai_analyzer.pack_projects(work, capacity=10, max_projects=10)
+    assert [[p["id"] for p, _ in g] for g in groups] == [["big"], ["small"]]
+
+
+def check_pack_003():
+    """split_multi_analysis round-trips list and keyed replies, dropping unknown and repeated ids"""
+    expected, bad = ai_analyzer.ANALYSIS_SCHEMA.validate(dict(CLEAN))
+    assert not bad, bad
+    ids = ["a", "b"]
+    as_list = {"projects": [dict(CLEAN, project_id=pid) for pid in ids + ["zz", "a"]]}
+    as_dict = {"projects": {pid: dict(CLEAN) for pid in ids + ["zz"]}}
+    for response in (as_list, as_dict):
+        analyses = ai_analyzer.split_multi_analysis(response, ids)
+        assert sorted(analyses) == ids, sorted(analyses)
+        assert all(analyses[pid] == expected for pid in ids)
+    assert ai_analyzer.split_multi_analysis({"projects": "oops"}, ids) == {}
+
+
+# ============================================
+# RESILIENCE
+# ============================================
+
+def check_res_001():
+    """Throttles, 5xx and timeouts are retryable; client errors are not"""
+    for code in (408, 429, 500, 502, 503, 504, 529):
+        assert is_retryable(http_error(code)), code
+    for code in (400, 401, 403, 404, 409, 422):
+        assert not is_retryable(http_error(code)), code
+    assert is_retryable(socket.timeout())
+    assert is_retryable(urllib.error.URLError(ConnectionRefusedError()))
+    assert not is_retryable(ValueError("bad json"))
+
+
+def check_res_002():
+    """Non-idempotent calls are replayed only when the server rejected them"""
+    for code in (429, 503, 529):
+        assert is_retryable(http_error(code), idempotent=False), code
+    for code in (500, 502, 504):
+        assert not is_retryable(http_error(code), idempotent=False), code
+    assert not is_retryable(socket.timeout(), idempotent=False)
+    # The connection never reached the server, so replaying is safe
+    assert is_retryable(urllib.error.URLError(ConnectionRefusedError()), idempotent=False)
+
+
+def check_res_003():
+    """is_unavailable covers an open circuit and exhausted transient errors only"""
+    assert is_unavailable(CircuitOpenError("supabase", 30))
+    assert is_unavailable(http_error(503))
+    assert not is_unavailable(http_error(400))
+
+
+def check_res_004():
+    """Breaker opens after the threshold, half-opens after the timeout, closes on success"""
+    breaker = CircuitBreaker("check", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow() == 0
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.is_open
+    assert breaker.allow() > 0
+    time.sleep(0.06)
+    assert not breaker.is_open
+    assert breaker.allow() == 0 and breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def check_res_005():
+    """A failed half-open probe re-opens the breaker immediately"""
+    breaker = CircuitBreaker("check", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow() == 0 and breaker.state == "half_open"
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.allow() > 0
+
+
+# ============================================
+# RISK SCORING
+# ============================================
+
+def check_risk_001():
+    """Grouped slopes match np.polyfit per project, skipping NaN and short series"""
+    rng = np.random.default_rng(0)
+    pidx = np.repeat(np.arange(4), [10, 6, 2, 8])
+    x = np.concatenate([np.arange(n, dtype=np.float64) for n in (10, 6, 2, 8)])
+    y = rng.random(len(x))
+    y[[3, 12]] = np.nan
+    slopes = _grouped_slope(pidx, x, y, 4)
+    for p in (0, 1, 3):
+        mask = (pidx == p) & ~np.isnan(y)
+        assert np.isclose(slopes[p], np.polyfit(x[mask], y[mask], 1)[0]), p
+    assert slopes[2] == 0  # fewer than MIN_POINTS
+
+
+def main():
+    print("=" * 60)
+    print("ONEVALUE CONSOLE - OFFLINE UNIT CHECKS")
+    print("=" * 60)
+
+    print("\n🧩 JSON EXTRACTION")
+    print("-" * 40)
+    run_check("UC-JSON-001", "Fenced and prose-wrapped JSON", check_json_001)
+    run_check("UC-JSON-002", "Truncated JSON recovery", check_json_002)
+    run_check("UC-JSON-003", "No JSON in reply", check_json_003)
+
+    print("\n📦 PACKED ANALYSIS")
+    print("-" * 40)
+    run_check("UC-PACK-001", "First-fit decreasing packing", check_pack_001)
+    run_check("UC-PACK-002", "Oversized project packing", check_pack_002)
+    run_check("UC-PACK-003", "split_multi_analysis round-trip", check_pack_003)
+
+    print("\n🔁 RESILIENCE")
+    print("-" * 40)
+    run_check("UC-RES-001", "Retryable status codes", check_res_001)
+    run_check("UC-RES-002", "Non-idempotent retry rules", check_res_002)
+    run_check("UC-RES-003", "Unavailable vs rejected", check_res_003)
+    run_check("UC-RES-004", "Breaker open/half-open/close", check_res_004)
+    run_check("UC-RES-005", "Breaker re-opens on failed probe", check_res_005)
+
+    print("\n📉 RISK SCORING")
+    print("-" * 40)
+    run_check("UC-RISK-001", "Grouped slope vs polyfit", check_risk_001)
+
+    print("\n" + "=" * 60)
+    print(f"✅ Passed: {results['passed']}   ❌ Failed: {results['failed']}")
+    print("=" * 60)
+    return results["failed"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
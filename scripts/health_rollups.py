@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Incremental refresh of health_history_rollups (schema v6).
+
+Recomputes only the weekly/monthly buckets that contain snapshots written
+since the last refresh, then moves counter_state.rollups_refreshed_at
+forward. Trend charts read the rollups through get_health_trend(), so long
+ranges never ship raw daily history to the browser.
+
+Run after the nightly record_health_snapshot():
+    python3 scripts/health_rollups.py [--full]
+"""
+
+import argparse
+import time
+import uuid
+
+from audit_log import AuditBuffer
+from supabase_client import sql_literal, supabase_query
+
+# record_health_snapshot() upserts same-day rows without bumping created_at,
+# so re-read a day before the watermark to pick up those rewrites
+OVERLAP = '1 day'
+
+
+def get_watermark():
+    rows = supabase_query("SELECT rollups_refreshed_at FROM counter_state WHERE id = 1")
+    if not rows:
+        raise RuntimeError('counter_state is empty; apply supabase/schema_v4.sql first')
+    return rows[0]['rollups_refreshed_at']
+
+
+def refresh(since) -> int:
+    """Refresh buckets touched after since (None rebuilds everything); returns rows written"""
+    if since is None:
+        arg = 'NULL'
+    else:
+        arg = f"{sql_literal(str(since))}::timestamptz - INTERVAL {sql_literal(OVERLAP)}"
+    result = supabase_query(f"SELECT refresh_health_rollups({arg}) AS n")
+    return int(result[0]['n']) if result else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh weekly/monthly health history rollups')
+    parser.add_argument('--full', action='store_true', help='Rebuild every bucket instead of changed ones')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("OneValue Health Rollups")
+    print("=" * 50)
+
+    since = None if args.full else get_watermark()
+    # Taken before the refresh so snapshots written meanwhile are picked up next run
+    started_at = supabase_query("SELECT NOW() AS now")[0]['now']
+    print(f"\nRefreshing {'all buckets' if since is None else f'buckets changed since {since}'}")
+
+    start = time.perf_counter()
+    written = refresh(since)
+    supabase_query(f"UPDATE counter_state SET rollups_refreshed_at = {sql_literal(str(started_at))}::timestamptz "
+                   f"WHERE id = 1")
+    duration_ms = (time.perf_counter() - start) * 1000
+    print(f"Wrote {written} rollup rows in {duration_ms / 1000:.1f}s")
+
+    audit = AuditBuffer('health_rollups', str(uuid.uuid4()))
+    audit.add('run', duration_ms, processed=written, full=since is None)
+    audit.flush()
+
+
+if __name__ == '__main__':
+    main()
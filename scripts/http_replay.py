@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Record/replay layer for outbound HTTP (Supabase, Anthropic, n8n).
+
+supabase_query, the analyzer's Claude requests and run_tests.make_request go
+through urlopen() here. With HTTP_REPLAY unset it is plain urllib. In
+`record` mode every exchange is appended to a JSONL cassette with secrets
+scrubbed (auth headers are never stored; JWTs, API keys and the values of
+known secret env vars are redacted from URLs and bodies). In `replay` mode
+responses come from the cassette, with optional injected latency and
+transient errors, so runs are repeatable offline.
+
+Requests are matched on method, URL and normalised body (UUIDs and
+timestamps masked). Requests whose body never repeats (audit inserts with
+timings) fall back to the next recorded exchange whose body starts the same
+way. Repeated matches cycle through the recorded responses.
+
+Environment: HTTP_REPLAY=record|replay, HTTP_CASSETTE (default
+.cache/cassettes/http.jsonl), HTTP_REPLAY_LATENCY_MS, HTTP_REPLAY_LATENCY_SCALE
+(multiplier on recorded latency), HTTP_REPLAY_ERROR_RATE, HTTP_REPLAY_SEED.
+
+Usage: HTTP_REPLAY=record python3 scripts/ai_analyzer.py
+       python3 scripts/http_replay.py bench .cache/cassettes/http.jsonl [--runs 3] [--error-rate 0.05]
+       python3 scripts/http_replay.py inspect .cache/cassettes/http.jsonl
+"""
+
+import argparse
+import base64
+import contextlib
+import email.message
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_CASSETTE = Path(__file__).parent.parent / '.cache' / 'cassettes' / 'http.jsonl'
+
+SECRET_ENV_VARS = (
+    'SUPABASE_ACCESS_TOKEN', 'SUPABASE_SERVICE_ROLE', 'SUPABASE_ANON_KEY', 'ANTHROPIC_API_KEY',
+    'N8N_API_KEY', 'GOOGLE_CHAT_TOKEN', 'GOOGLE_DRIVE_TOKEN',
+)
+SECRET_PARAMS = {'key', 'apikey', 'api_key', 'access_token', 'token', 'sig', 'signature'}
+REQUEST_HEADERS_KEPT = {'content-type', 'anthropic-version'}
+RESPONSE_HEADERS_KEPT = {'content-type', 'retry-after', 'retry-after-ms'}
+REDACTED = '[REDACTED]'
+
+# (pattern, replacement) pairs applied to URLs and bodies
+SECRET_PATTERNS = [
+    (re.compile(r'eyJ[\w-]{8,}\.[\w-]{8,}\.[\w-]{8,}'), REDACTED),  # JWTs (Supabase, n8n keys)
+    (re.compile(r'sk-ant-[\w-]{8,}'), REDACTED),
+    (re.compile(r'sbp_[0-9a-f]{20,}'), REDACTED),
+    (re.compile(r'(?i)\b(bearer\s+)[\w.~+/-]{8,}=*'), rf'\g<1>{REDACTED}'),
+    (re.compile(r'(?i)("(?:api[_-]?key|apikey|password|secret|access_token|refresh_token|service_role)"\s*:\s*)'
+                r'"[^"]*"'), rf'\g<1>"{REDACTED}"'),
+]
+VOLATILE_PATTERNS = [
+    re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I),
+    re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?'),
+]
+# Body prefix length used for the fallback match
+SHAPE_CHARS = 160
+
+
+class CassetteMiss(LookupError):
+    """No recorded exchange matches a request in replay mode"""
+
+
+class _Response(io.BytesIO):
+    """Enough of http.client.HTTPResponse for the callers here"""
+
+    def __init__(self, url: str, status: int, headers: email.message.Message, body: bytes):
+        super().__init__(body)
+        self.url = url
+        self.status = status
+        self.headers = headers
+
+    def getcode(self):
+        return self.status
+
+
+def _headers(values: dict) -> email.message.Message:
+    msg = email.message.Message()
+    for k, v in values.items():
+        msg[k] = v
+    return msg
+
+
+def scrub(text: str) -> str:
+    for name in SECRET_ENV_VARS:
+        value = os.environ.get(name)
+        if value and len(value) >= 8:
+            text = text.replace(value, REDACTED)
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def scrub_url(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = [(k, REDACTED if k.lower() in SECRET_PARAMS else v) for k, v in query]
+    return scrub(urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query, safe='[]'))))
+
+
+def _encode_body(data: bytes) -> dict:
+    try:
+        return {'body': scrub(data.decode('utf-8'))}
+    except UnicodeDecodeError:
+        return {'body_b64': base64.b64encode(data).decode('ascii')}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if 'body_b64' in entry:
+        return base64.b64decode(entry['body_b64'])
+    return (entry.get('body') or '').encode('utf-8')
+
+
+def _normalise(body: str) -> str:
+    for pattern in VOLATILE_PATTERNS:
+        body = pattern.sub('~', body)
+    return body
+
+
+def _keys(method: str, url: str, body: str) -> tuple:
+    norm = _normalise(body)
+    exact = hashlib.sha1(f"{method} {url}\n{norm}".encode('utf-8')).hexdigest()
+    shape = f"{method} {url}\n{re.sub(r'[0-9.]+', '0', ' '.join(norm.split()))[:SHAPE_CHARS]}"
+    return exact, shape
+
+
+class Recorder:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def write(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class Player:
+    def __init__(self, path: Path, latency_ms: float = 0.0, latency_scale: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.exact, self.shape = {}, {}
+        self.cursors = Counter()
+        self.stats = Counter()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    exact, shape = _keys(entry['method'], entry['url'], entry['request'].get('body', ''))
+                    self.exact.setdefault(exact, []).append(entry)
+                    self.shape.setdefault(shape, []).append(entry)
+
+    def _next(self, table: dict, key: str, advance: bool):
+        entries = table.get(key)
+        if not entries:
+            return None
+        entry = entries[self.cursors[key] % len(entries)]
+        if advance:
+            self.cursors[key] += 1
+        return entry
+
+    def play(self, method: str, url: str, body: str):
+        exact, shape = _keys(method, url, body)
+        host = urllib.parse.urlsplit(url).hostname or ''
+        with self.lock:
+            # An injected error leaves the cursor alone so the retry gets the same response
+            inject = bool(self.error_rate) and self.rng.random() < self.error_rate
+            entry = self._next(self.exact, exact, not inject) or self._next(self.shape, shape, not inject)
+            self.stats[f'{host} requests'] += 1
+            if entry is None:
+                self.stats['misses'] += 1
+            elif inject:
+                self.stats['injected errors'] += 1
+        if entry is None:
+            raise CassetteMiss(f"no recorded exchange for {method} {url} ({body[:80]!r})")
+
+        delay = self.latency_ms + self.latency_scale * entry.get('elapsed_ms', 0)
+        if delay:
+            time.sleep(delay / 1000)
+        if inject:
+            status = 529 if 'anthropic' in host else 503
+            raise urllib.error.HTTPError(url, status, 'Injected by http_replay', _headers({}), io.BytesIO(b'{}'))
+
+        response = entry['response']
+        headers = _headers(response.get('headers', {}))
+        data = _decode_body(response)
+        if response['status'] >= 400:
+            raise urllib.error.HTTPError(url, response['status'], response.get('reason', ''), headers, io.BytesIO(data))
+        return _Response(url, response['status'], headers, data)
+
+
+_mode = None
+_recorder = None
+_player = None
+
+
+def configure(mode: str = None, cassette: Path = None, **player_kwargs):
+    """Switch between off/record/replay; defaults come from the environment"""
+    global _mode, _recorder, _player
+    mode = (mode if mode is not None else os.environ.get('HTTP_REPLAY', '')).lower() or 'off'
+    cassette = Path(cassette or os.environ.get('HTTP_CASSETTE') or DEFAULT_CASSETTE)
+    _mode, _recorder, _player = mode, None, None
+    if mode == 'record':
+        _recorder = Recorder(cassette)
+    elif mode == 'replay':
+        kwargs = {
+            'latency_ms': float(os.environ.get('HTTP_REPLAY_LATENCY_MS', 0)),
+            'latency_scale': float(os.environ.get('HTTP_REPLAY_LATENCY_SCALE', 0)),
+            'error_rate': float(os.environ.get('HTTP_REPLAY_ERROR_RATE', 0)),
+            'seed': int(os.environ.get('HTTP_REPLAY_SEED', 0)),
+        }
+        kwargs.update(player_kwargs)
+        _player = Player(cassette, **kwargs)
+    elif mode != 'off':
+        raise ValueError(f"HTTP_REPLAY must be record or replay, not {mode!r}")
+    return _player
+
+
+def stats() -> Counter:
+    return Counter(_player.stats) if _player else Counter()
+
+
+def urlopen(req: urllib.request.Request, context=None, timeout: float = None):
+    """Drop-in for urllib.request.urlopen(Request) honouring HTTP_REPLAY"""
+    if _mode is None:
+        configure()
+    if _mode == 'off':
+        return urllib.request.urlopen(req, context=context, timeout=timeout)
+
+    method = req.get_method()
+    url = scrub_url(req.full_url)
+    request = _encode_body(req.data or b'')
+    if _mode == 'replay':
+        return _player.play(method, url, request.get('body', ''))
+
+    request['headers'] = {k: v for k, v in req.header_items() if k.lower() in REQUEST_HEADERS_KEPT}
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, context=context, timeout=timeout) as response:
+            status, reason, headers, data = response.status, response.reason, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        status, reason, headers, data = e.code, e.reason, e.headers, e.read()
+        error = e
+    else:
+        error = None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    kept = {k: v for k, v in (headers or {}).items() if k.lower() in RESPONSE_HEADERS_KEPT}
+    _recorder.write({
+        'method': method,
+        'url': url,
+        'request': request,
+        'response': {'status': status, 'reason': reason, 'headers': kept, **_encode_body(data)},
+        'elapsed_ms': round(elapsed_ms, 1),
+    })
+    if error is not None:
+        raise urllib.error.HTTPError(req.full_url, status, reason, headers, io.BytesIO(data))
+    return _Response(req.full_url, status, headers, data)
+
+
+def inspect(path: Path):
+    """Summarise a cassette and check it for anything that looks like a secret"""
+    by_host, statuses, leaks = Counter(), Counter(), []
+    with open(path, encoding='utf-8') as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            by_host[urllib.parse.urlsplit(entry['url']).hostname] += 1
+            statuses[entry['response']['status']] += 1
+            for pattern, _ in SECRET_PATTERNS:
+                for m in pattern.finditer(line):
+                    if REDACTED not in m.group(0):
+                        leaks.append((n, m.group(0)[:24]))
+    print(f"{sum(by_host.values())} exchanges in {path}")
+    for host, n in by_host.most_common():
+        print(f"  {host}: {n}")
+    print("  statuses: " + ", ".join(f"{s}={n}" for s, n in sorted(statuses.items())))
+    print(f"  possible unscrubbed secrets: {len(leaks)}")
+    for n, prefix in leaks[:10]:
+        print(f"    line {n}: {prefix}...")
+    return not leaks
+
+
+def run_bench(path: Path, runs: int, latency_ms: float, latency_scale: float, error_rate: float, seed: int):
+    """Replay the analyzer end to end and report throughput per run"""
+    import ai_analyzer
+    import http_replay  # the instance supabase_client and ai_analyzer import, not __main__
+    import instrumentation
+    import resilience
+
+    ai_analyzer.ANTHROPIC_API_KEY = ai_analyzer.ANTHROPIC_API_KEY or 'replay'
+    print(f"Replaying {path} x{runs} (latency {latency_ms:g}ms + {latency_scale:g}x recorded, "
+          f"error rate {error_rate:.0%})")
+    results = []
+    for run in range(runs):
+        for endpoint in ('anthropic', 'supabase'):
+            resilience.configure(endpoint)
+        random.seed(seed)  # backoff jitter
+        player = http_replay.configure('replay', path, latency_ms=latency_ms, latency_scale=latency_scale,
+                           error_rate=error_rate, seed=seed)
+        processed_before = sum(c.get('messages_processed', 0) for c in instrumentation.project_counters().values())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ai_analyzer.main()
+        elapsed = time.perf_counter() - start
+        processed = sum(c.get('messages_processed', 0)
+                        for c in instrumentation.project_counters().values()) - processed_before
+        results.append((elapsed, processed, player.stats))
+        print(f"  run {run + 1}: {elapsed:.2f}s, {processed} messages ({processed / elapsed:.1f}/s), "
+              + ", ".join(f"{k} {v}" for k, v in sorted(player.stats.items())))
+    median = statistics.median(r[0] for r in results)
+    print(f"\nMedian {median:.2f}s, {results[0][1] / median:.1f} messages/s")
+    http_replay.configure('off')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect HTTP cassettes or replay the analyzer against one')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help='Replay ai_analyzer end to end and time it')
+    bench.add_argument('cassette', type=Path)
+    bench.add_argument('--runs', type=int, default=3)
+    bench.add_argument('--latency-ms', type=float, default=0.0, help='Fixed latency added to each response')
+    bench.add_argument('--latency-scale', type=float, default=0.0, help='Multiplier on recorded latency')
+    bench.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 503/529')
+    bench.add_argument('--seed', type=int, default=0)
+    check = sub.add_parser('inspect', help='Summarise a cassette and scan it for secrets')
+    check.add_argument('cassette', type=Path)
+    args = parser.parse_args()
+
+    if args.command == 'inspect':
+        raise SystemExit(0 if inspect(args.cassette) else 1)
+    run_bench(args.cassette, args.runs, args.latency_ms, args.latency_scale, args.error_rate, args.seed)
+
+
+if __name__ == '__main__':
+    main()
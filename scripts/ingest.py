@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Idempotent bulk ingestion of chat and email messages into delivery_intelligence.
+Batches are COPY'd into a temp staging table and merged with
+INSERT ... ON CONFLICT (source, message_id) DO NOTHING, so re-polls and
+re-runs of the historical dump never create duplicates.
+
+Uses a direct Postgres connection (DATABASE_URL + psycopg2) when available,
+else falls back to chunked multi-row inserts via the Management API.
+
+Usage: python3 scripts/ingest.py messages.jsonl
+       python3 scripts/ingest.py --bench 20000
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+import uuid
+
+from supabase_client import sql_literal, supabase_query
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+INGEST_COLUMNS = (
+    'project_id', 'source', 'event_type', 'title', 'content_raw', 'evidence_link',
+    'message_id', 'thread_id', 'space_id', 'ai_processed', 'created_at',
+)
+SOURCES = ('Gmail', 'GoogleChat', 'Teams', 'Slack', 'Manual')
+EVENT_TYPES = ('MOM', 'Communication', 'Alert', 'Blocker', 'Update')
+API_CHUNK_SIZE = 500
+
+
+def normalize_message(raw: dict) -> dict:
+    """Shape a workflow/poller item into a delivery_intelligence row"""
+    if raw.get('source') not in SOURCES:
+        raise ValueError(f"invalid source: {raw.get('source')!r}")
+    if raw.get('event_type') not in EVENT_TYPES:
+        raise ValueError(f"invalid event_type: {raw.get('event_type')!r}")
+    if not raw.get('evidence_link'):
+        raise ValueError('evidence_link is required')
+    row = {col: raw.get(col) for col in INGEST_COLUMNS}
+    row['content_raw'] = raw.get('content_raw') or {}
+    row['ai_processed'] = bool(raw.get('ai_processed', False))
+    return row
+
+
+def _dedupe(rows: list) -> tuple:
+    """Drop in-batch repeats of (source, message_id); returns (rows, repeats)"""
+    seen = set()
+    unique = []
+    for row in rows:
+        if row['message_id'] is not None:
+            key = (row['source'], row['message_id'])
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(row)
+    return unique, len(rows) - len(unique)
+
+
+def _copy_value(value) -> str:
+    """Encode a value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _ingest_copy(rows: list, conn) -> int:
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_value(row[c]) for c in INGEST_COLUMNS))
+        buf.write('\n')
+    buf.seek(0)
+    cols = ', '.join(INGEST_COLUMNS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE delivery_staging ON COMMIT DROP AS
+                SELECT {cols} FROM delivery_intelligence WITH NO DATA
+            """)
+            cur.copy_expert(f"COPY delivery_staging ({cols}) FROM STDIN", buf)
+            cur.execute(f"""
+                INSERT INTO delivery_intelligence ({cols})
+                SELECT {cols.replace('created_at', 'COALESCE(created_at, NOW())')}
+                FROM delivery_staging
+                ON CONFLICT (source, message_id) DO NOTHING
+            """)
+            inserted = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted
+
+
+def _ingest_api(rows: list) -> int:
+    inserted = 0
+    cols = ', '.join(INGEST_COLUMNS)
+    for i in range(0, len(rows), API_CHUNK_SIZE):
+        chunk = rows[i:i + API_CHUNK_SIZE]
+        values = ",\n".join(
+            "(" + ", ".join(
+                # NULL would override the column default, so spell it out
+                'NOW()' if c == 'created_at' and row[c] is None else sql_literal(row[c])
+                for c in INGEST_COLUMNS
+            ) + ")"
+            for row in chunk
+        )
+        # ON CONFLICT makes the statement idempotent, so it is safe to retry
+        result = supabase_query(f"""
+        WITH ins AS (
+            INSERT INTO delivery_intelligence ({cols})
+            VALUES
+            {values}
+            ON CONFLICT (source, message_id) DO NOTHING
+            RETURNING 1
+        )
+        SELECT COUNT(*) AS inserted FROM ins
+        """)
+        inserted += int(result[0]['inserted']) if result else 0
+    return inserted
+
+
+def connect():
+    """Open a direct Postgres connection, or None if unavailable"""
+    if psycopg2 is None or not DATABASE_URL:
+        return None
+    return psycopg2.connect(DATABASE_URL)
+
+
+def ingest_messages(messages: list, conn=None) -> dict:
+    """Insert a batch of messages exactly once. Returns counts."""
+    rows, repeats = _dedupe([normalize_message(m) for m in messages])
+    if not rows:
+        return {'received': len(messages), 'inserted': 0, 'duplicates': repeats}
+
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        inserted = _ingest_copy(rows, conn) if conn else _ingest_api(rows)
+    finally:
+        if own_conn and conn:
+            conn.close()
+    return {
+        'received': len(messages),
+        'inserted': inserted,
+        'duplicates': repeats + len(rows) - inserted,
+    }
+
+
+def _synthetic_messages(n: int, run_tag: str) -> list:
+    return [{
+        'source': 'GoogleChat',
+        'event_type': 'MOM' if i % 7 == 0 else 'Communication',
+        'title': 'Meeting Notes' if i % 7 == 0 else 'Chat Update',
+        'content_raw': {'text': f'bench message {i}\twith tab and\nnewline', 'sender': 'Bench'},
+        'evidence_link': f'https://chat.google.com/room/bench/{i}',
+        'message_id': f'spaces/bench-{run_tag}/messages/{i}',
+        'space_id': f'spaces/bench-{run_tag}',
+    } for i in range(n)]
+
+
+def run_bench(n: int, batch_size: int):
+    conn = connect()
+    mode = 'COPY via DATABASE_URL' if conn else 'Management API multi-row insert'
+    tag = uuid.uuid4().hex[:8]
+    messages = _synthetic_messages(n, tag)
+    print(f"\nIngesting {n} messages in batches of {batch_size} ({mode})")
+    try:
+        for label in ('first pass', 're-poll'):
+            start = time.perf_counter()
+            totals = {'inserted': 0, 'duplicates': 0}
+            for i in range(0, n, batch_size):
+                result = ingest_messages(messages[i:i + batch_size], conn)
+                totals['inserted'] += result['inserted']
+                totals['duplicates'] += result['duplicates']
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<10} {elapsed:7.2f}s  {n / elapsed:9.0f} rows/s  "
+                  f"inserted={totals['inserted']} duplicates={totals['duplicates']}")
+    finally:
+        cleanup = f"DELETE FROM delivery_intelligence WHERE space_id = 'spaces/bench-{tag}'"
+        if conn:
+            with conn.cursor() as cur:
+                cur.execute(cleanup)
+            conn.commit()
+            conn.close()
+        else:
+            supabase_query(cleanup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-ingest normalized messages')
+    parser.add_argument('file', nargs='?', help='JSONL file of normalized messages')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--bench', type=int, metavar='N', help='Benchmark with N synthetic messages')
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args.bench, args.batch_size)
+        return
+    if not args.file:
+        parser.error('a JSONL file or --bench is required')
+
+    with open(args.file) as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    totals = {'received': 0, 'inserted': 0, 'duplicates': 0}
+    conn = connect()
+    try:
+        for i in range(0, len(messages), args.batch_size):
+            result = ingest_messages(messages[i:i + args.batch_size], conn)
+            for k in totals:
+                totals[k] += result[k]
+    finally:
+        if conn:
+            conn.close()
+    print(f"Received {totals['received']}, inserted {totals['inserted']}, "
+          f"skipped {totals['duplicates']} duplicates")
+
+
+if __name__ == '__main__':
+    main()
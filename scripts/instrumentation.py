@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Lightweight stage instrumentation for the AI analyzer.
+Timing spans, Claude token usage and per-project counters, exported as
+JSONL traces (TRACE_FILE) and Prometheus metrics (METRICS_FILE / METRICS_PORT).
+"""
+
+import contextvars
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+import metrics
+
+RUN_ID = uuid.uuid4().hex[:12]
+
+TOKEN_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_creation_input_tokens',
+    'cache_read_input_tokens',
+)
+
+metrics.describe('onevalue_stage_duration_seconds', 'Wall time spent per analyzer stage')
+metrics.describe('onevalue_stage_errors_total', 'Stage spans that exited with an exception')
+metrics.describe('onevalue_claude_tokens_total', 'Claude token usage by type')
+metrics.describe('onevalue_project_events_total', 'Per-project analyzer counters')
+
+_project = contextvars.ContextVar('onevalue_project_id', default=None)
+_spans = []
+_project_counters = {}
+
+
+def current_project() -> Optional[str]:
+    return _project.get()
+
+
+@contextmanager
+def project_scope(project_id: str):
+    """Attribute spans, tokens and counters inside the block to a project"""
+    token = _project.set(project_id)
+    try:
+        yield
+    finally:
+        _project.reset(token)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a stage. Yields a dict the caller may add attributes to."""
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe('onevalue_stage_duration_seconds', duration, stage=stage)
+        record = {
+            'run_id': RUN_ID,
+            'stage': stage,
+            'project_id': _project.get(),
+            'ts': started_at,
+            'duration_ms': round(duration * 1000, 3),
+        }
+        if attrs:
+            record.update(attrs)
+        if error:
+            record['error'] = error
+            metrics.inc('onevalue_stage_errors_total', stage=stage)
+        _spans.append(record)
+
+
+def count(name: str, value: int = 1):
+    """Increment a per-project counter (messages_processed, api_calls, ...)"""
+    project = _project.get()
+    counters = _project_counters.setdefault(project, {})
+    counters[name] = counters.get(name, 0) + value
+    metrics.inc('onevalue_project_events_total', value, event=name, project_id=project or 'none')
+
+
+def record_usage(usage: Optional[dict]):
+    """Record token usage from an Anthropic API response's `usage` block"""
+    if not usage:
+        return
+    for field in TOKEN_FIELDS:
+        value = usage.get(field) or 0
+        if value:
+            metrics.inc('onevalue_claude_tokens_total', value, type=field)
+            count(field, value)
+
+
+def project_counters(project_id: Optional[str] = None) -> dict:
+    """Counters for one project, or all projects keyed by id"""
+    if project_id is not None:
+        return dict(_project_counters.get(project_id, {}))
+    return {k: dict(v) for k, v in _project_counters.items()}
+
+
+def stage_totals(project_id: Optional[str] = None) -> dict:
+    """Total milliseconds and span count per stage for the buffered spans"""
+    totals = {}
+    for record in _spans:
+        if project_id is not None and record['project_id'] != project_id:
+            continue
+        total_ms, n = totals.get(record['stage'], (0.0, 0))
+        totals[record['stage']] = (total_ms + record['duration_ms'], n + 1)
+    return totals
+
+
+def print_summary():
+    totals = stage_totals()
+    if not totals:
+        return
+    print("\nStage timings:")
+    for stage, (total_ms, n) in sorted(totals.items(), key=lambda kv: -kv[1][0]):
+        print(f"  {stage:<14} {total_ms / 1000:8.2f}s  ({n} spans)")
+    tokens = {}
+    for counters in _project_counters.values():
+        for field in TOKEN_FIELDS:
+            tokens[field] = tokens.get(field, 0) + counters.get(field, 0)
+    if any(tokens.values()):
+        print("  tokens: " + ", ".join(f"{k}={v}" for k, v in tokens.items() if v))
+
+
+def flush(path: Optional[str] = None):
+    """Append buffered spans to the JSONL trace file and clear the buffer"""
+    path = path or os.environ.get('TRACE_FILE')
+    if path and _spans:
+        with open(path, 'a') as f:
+            for record in _spans:
+                f.write(json.dumps(record, default=str) + '\n')
+    _spans.clear()
+
+
+def start_exporters():
+    """Start the /metrics endpoint when METRICS_PORT is set"""
+    port = os.environ.get('METRICS_PORT')
+    if port:
+        metrics.start_http_server(int(port))
+
+
+if __name__ == '__main__':
+    # Per-span overhead check: compare against a ~200ms Claude call
+    n = 100000
+    start = time.perf_counter()
+    with project_scope('overhead-check'):
+        for _ in range(n):
+            with span('noop'):
+                pass
+    per_span = (time.perf_counter() - start) / n
+    _spans.clear()
+    print(f"span overhead: {per_span * 1e6:.2f}us per span "
+          f"({per_span / 0.2 * 100:.4f}% of a 200ms call)")
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Tolerant JSON extraction and schema validation for Claude responses.
+Finds the JSON object in replies wrapped in ```json fences or prose, repairs
+common defects (trailing commas, truncation), and validates fields against a
+compiled schema so only the bad fields need repairing or re-requesting.
+"""
+
+import json
+import math
+import re
+from typing import Callable, Optional
+
+_decoder = json.JSONDecoder()
+
+
+_SPECIAL = re.compile(r'[{}\[\]"\\]')
+
+
+class IncrementalExtractor:
+    """Streaming scanner that yields top-level JSON objects as text arrives.
+
+    Tracks brace depth outside of strings, so braces inside string values,
+    markdown fences and surrounding prose do not confuse it. Only structural
+    characters are visited, via a regex, so long string values are cheap.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape_next = False
+        self._stack = []
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk; return any objects completed within it (as text)"""
+        done = []
+        start = 0 if self._depth else None
+        skip = 0 if self._escape_next else -1
+        self._escape_next = False
+        for m in _SPECIAL.finditer(chunk):
+            i = m.start()
+            if i == skip:
+                continue
+            ch = chunk[i]
+            if self._depth == 0:
+                if ch == '{':
+                    start = i
+                    self._parts = []
+                    self._stack = ['}']
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if ch == '\\':
+                    skip = i + 1
+                    if skip == len(chunk):
+                        self._escape_next = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._stack.append('}' if ch == '{' else ']')
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._stack:
+                    self._stack.pop()
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    done.append(''.join(self._parts))
+                    self._parts = []
+                    start = None
+        if self._depth and start is not None:
+            self._parts.append(chunk[start:])
+        return done
+
+    def pending(self) -> Optional[str]:
+        """Close an unterminated object (e.g. max_tokens truncation) best-effort"""
+        if self._depth == 0 or not self._parts:
+            return None
+        text = ''.join(self._parts)
+        if self._in_string:
+            text += '"'
+        return text.rstrip().rstrip(',') + ''.join(reversed(self._stack))
+
+
+# A closing fence, or a trailing line that cannot continue a JSON value.
+# JSON strings cannot hold raw newlines, so a line start is always outside one.
+_TRAILING_FENCE = re.compile(r'\n[ \t]*```.*', re.S)
+_JSON_LINE = re.compile(r'\s*(?:["{}\[\],:\-\d]|true|false|null)')
+
+
+def _strip_trailing_noise(text: str) -> str:
+    """Drop a closing ``` fence and any prose lines after a truncated object"""
+    text = _TRAILING_FENCE.sub('', text)
+    lines = text.split('\n')
+    while len(lines) > 1 and not _JSON_LINE.match(lines[-1]):
+        lines.pop()
+    return '\n'.join(lines)
+
+
+def _close_truncated(text: str, attempts: int = 4) -> Optional[dict]:
+    """Recover a truncated object by backing off to earlier commas and re-closing"""
+    text = _strip_trailing_noise(text)
+    for _ in range(attempts):
+        extractor = IncrementalExtractor()
+        if extractor.feed(text):
+            return None  # not truncated; nothing to recover
+        closed = extractor.pending()
+        if closed is None:
+            return None
+        try:
+            value = _loads(closed)
+            return value if isinstance(value, dict) else None
+        except json.JSONDecodeError:
+            cut = text.rfind(',')
+            if cut <= 0:
+                return None
+            text = text[:cut]
+    return None
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out = []
+    in_string = escape = False
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ',':
+            j = i + 1
+            while j < n and text[j] in ' \t\r\n':
+                j += 1
+            if j < n and text[j] in '}]':
+                i += 1
+                continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def _loads(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_strip_trailing_commas(text))
+
+
+def extract_json(text: Optional[str]) -> Optional[dict]:
+    """Return the first JSON object in text, or None"""
+    if not text:
+        return None
+    stripped = text.strip()
+    # Fast path: the reply is exactly a JSON object
+    if stripped.startswith('{'):
+        try:
+            value = json.loads(stripped)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+
+    # Fenced or prose-wrapped reply: raw_decode from the first brace (C speed).
+    # Later braces are left to the scanner so we never return a nested object.
+    start = text.find('{')
+    if start < 0:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+        if isinstance(value, dict):
+            return value
+    except json.JSONDecodeError:
+        pass
+
+    # Slow path: scan for balanced objects and repair them
+    extractor = IncrementalExtractor()
+    for candidate in extractor.feed(text):
+        try:
+            value = _loads(candidate)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            continue
+    tail = extractor.pending()
+    if tail:
+        # Truncated final object: re-scan from its opening brace
+        start = len(text) - len(''.join(extractor._parts))
+        return _close_truncated(text[start:])
+    return None
+
+
+# =====================================================
+# Schema compilation
+# =====================================================
+
+class _Invalid(Exception):
+    pass
+
+
+_MISSING = object()
+
+
+def _compile_field(spec) -> Callable:
+    if isinstance(spec, str):
+        spec = {'type': spec}
+    kind = spec['type']
+    nullable = spec.get('nullable', False)
+
+    if kind == 'string':
+        def check(v):
+            if isinstance(v, str):
+                return v.strip()
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                return str(v)
+            raise _Invalid('expected string')
+    elif kind == 'number':
+        lo, hi = spec.get('min'), spec.get('max')
+
+        def check(v):
+            if isinstance(v, bool):
+                raise _Invalid('expected number')
+            if isinstance(v, str):
+                try:
+                    v = float(v.strip())
+                except ValueError:
+                    raise _Invalid('expected number')
+            if not isinstance(v, (int, float)):
+                raise _Invalid('expected number')
+            if not math.isfinite(v):
+                # NaN slips past the clamps below (every comparison is False)
+                raise _Invalid('expected finite number')
+            if lo is not None and v < lo:
+                v = lo
+            if hi is not None and v > hi:
+                v = hi
+            return v
+    elif kind == 'boolean':
+        def check(v):
+            if isinstance(v, bool):
+                return v
+            if isinstance(v, str) and v.strip().lower() in ('true', 'false'):
+                return v.strip().lower() == 'true'
+            raise _Invalid('expected boolean')
+    elif kind == 'enum':
+        lookup = {str(value).lower(): value for value in spec['values']}
+
+        def check(v):
+            key = str(v).strip().lower() if v is not None else None
+            if key in lookup:
+                return lookup[key]
+            raise _Invalid(f"expected one of {spec['values']}")
+    elif kind == 'list':
+        item_check = _compile_field(spec.get('items', 'string'))
+
+        def check(v):
+            if isinstance(v, (str, dict)):
+                v = [v]
+            if not isinstance(v, list):
+                raise _Invalid('expected list')
+            items = []
+            for item in v:
+                try:
+                    items.append(item_check(item))
+                except _Invalid:
+                    continue  # drop malformed items rather than the whole list
+            return items
+    elif kind == 'object':
+        sub = CompiledSchema(spec['fields'])
+
+        def check(v):
+            if not isinstance(v, dict):
+                raise _Invalid('expected object')
+            clean, bad = sub.validate(v)
+            if bad:
+                raise _Invalid(f"invalid fields {bad}")
+            return clean
+    else:
+        raise ValueError(f"unknown schema type: {kind}")
+
+    if not nullable:
+        return check
+
+    def check_nullable(v):
+        if v is None or (isinstance(v, str) and v.strip().lower() in ('', 'null', 'none')):
+            return None
+        return check(v)
+    return check_nullable
+
+
+class CompiledSchema:
+    """Field validators built once from a schema spec dict.
+
+    Spec values are either a type name ('string', 'number', 'boolean') or a
+    dict with 'type' plus options: required, default, nullable, min/max,
+    values (enum), items (list), fields (object).
+    """
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self._fields = []
+        for name, field_spec in spec.items():
+            if isinstance(field_spec, str):
+                field_spec = {'type': field_spec}
+            self._fields.append((
+                name,
+                _compile_field(field_spec),
+                field_spec.get('required', False),
+                field_spec.get('default', _MISSING),
+            ))
+
+    @property
+    def required(self) -> list:
+        return [name for name, _, required, _ in self._fields if required]
+
+    def validate(self, obj: dict) -> tuple:
+        """Return (clean, bad_fields). Bad optional fields fall back to defaults."""
+        clean = {}
+        bad = []
+        for name, check, required, default in self._fields:
+            value = obj.get(name, _MISSING)
+            if value is not _MISSING:
+                try:
+                    clean[name] = check(value)
+                    continue
+                except _Invalid:
+                    pass
+            if required:
+                bad.append(name)
+            elif default is not _MISSING:
+                clean[name] = json.loads(json.dumps(default))
+        return clean, bad
+
+    def subset(self, names: list) -> 'CompiledSchema':
+        return CompiledSchema({n: self.spec[n] for n in names if n in self.spec})
+
+    def json_schema(self) -> dict:
+        """Equivalent JSON Schema (for tool input_schema / prompt examples)"""
+        return _to_json_schema({'type': 'object', 'fields': self.spec})
+
+
+def compile_schema(spec: dict) -> CompiledSchema:
+    return CompiledSchema(spec)
+
+
+def _to_json_schema(spec) -> dict:
+    if isinstance(spec, str):
+        spec = {'type': spec}
+    kind = spec['type']
+    if kind == 'enum':
+        out = {'type': 'string', 'enum': list(spec['values'])}
+    elif kind == 'list':
+        out = {'type': 'array', 'items': _to_json_schema(spec.get('items', 'string'))}
+    elif kind == 'object':
+        out = {
+            'type': 'object',
+            'properties': {k: _to_json_schema(v) for k, v in spec['fields'].items()},
+            'required': [k for k, v in spec['fields'].items()
+                         if isinstance(v, dict) and v.get('required')],
+        }
+    else:
+        out = {'type': kind}
+        if 'min' in spec:
+            out['minimum'] = spec['min']
+        if 'max' in spec:
+            out['maximum'] = spec['max']
+    if spec.get('nullable'):
+        out['type'] = [out['type'], 'null']
+    if spec.get('description'):
+        out['description'] = spec['description']
+    return out
+
+
+def parse_response(text: Optional[str], schema: CompiledSchema) -> tuple:
+    """Extract and validate. Returns (clean, bad_fields); clean is None if no JSON found."""
+    obj = extract_json(text)
+    if obj is None:
+        return None, list(schema.required)
+    return schema.validate(obj)
+
+
+def build_repair_prompt(schema: CompiledSchema, bad_fields: list, context: str) -> str:
+    """Prompt asking only for the fields that failed validation"""
+    sub = schema.subset(bad_fields)
+    return f"""{context}
+
+Your previous answer was missing or had invalid values for: {', '.join(bad_fields)}.
+Return ONLY a JSON object with exactly these fields, matching this JSON Schema:
+{json.dumps(sub.json_schema(), indent=2)}"""
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Scheduled maintenance for date-driven counters (schema v4).
+
+Action counters in project_health_metrics are kept current by triggers on
+action_queue; the only thing that changes without a row write is the date.
+This job moves the overdue watermark forward one day at a time (each step
+touches only actions due that day, via idx_action_due) and refreshes the
+stored aging_days of open actions in bounded created_at ranges.
+
+delivery_intelligence.aging_days is not refreshed: every message ages
+every day, so keeping it stored would rewrite the whole table nightly.
+Readers compute it as CURRENT_DATE - created_at::date instead.
+
+Run daily, shortly after midnight UTC:
+    python3 scripts/maintain_counters.py [--as-of 2026-10-19] [--chunk-days 30]
+"""
+
+import argparse
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from audit_log import AuditBuffer
+from supabase_client import sql_literal, supabase_query
+
+# Tables whose stored aging_days is kept current, and the rows that are read
+# (open actions only; closed ones keep their last value)
+AGING_TABLES = {
+    'action_queue': "status NOT IN ('Completed', 'Cancelled')",
+}
+
+
+def get_state() -> dict:
+    rows = supabase_query("SELECT overdue_as_of, aging_as_of FROM counter_state WHERE id = 1")
+    if not rows:
+        raise RuntimeError('counter_state is empty; apply supabase/schema_v4.sql first')
+    return rows[0]
+
+
+def roll_overdue(as_of: date) -> int:
+    """Advance the overdue watermark to as_of, one day per transaction"""
+    current = date.fromisoformat(str(get_state()['overdue_as_of'])[:10])
+    transitions = 0
+    while current < as_of:
+        current += timedelta(days=1)
+        result = supabase_query(f"SELECT roll_overdue_counters({sql_literal(current.isoformat())}::date) AS n")
+        n = int(result[0]['n']) if result else 0
+        transitions += n
+        print(f"  overdue as of {current}: {n} actions became overdue")
+    return transitions
+
+
+def refresh_aging(as_of: date, chunk_days: int) -> int:
+    """Rewrite aging_days where it is stale, in created_at windows of chunk_days"""
+    updated = 0
+    as_of_sql = f"{sql_literal(as_of.isoformat())}::date"
+    for table, condition in AGING_TABLES.items():
+        bounds = supabase_query(f"SELECT MIN(created_at) AS lo, MAX(created_at) AS hi FROM {table} WHERE {condition}")
+        if not bounds or not bounds[0]['lo']:
+            continue
+        lo = datetime.fromisoformat(str(bounds[0]['lo']).replace('Z', '+00:00'))
+        hi = datetime.fromisoformat(str(bounds[0]['hi']).replace('Z', '+00:00'))
+        start = lo.replace(hour=0, minute=0, second=0, microsecond=0)
+        table_updated = 0
+        while start <= hi:
+            end = start + timedelta(days=chunk_days)
+            result = supabase_query(f"""
+            WITH upd AS (
+                UPDATE {table}
+                SET aging_days = {as_of_sql} - created_at::date
+                WHERE created_at >= {sql_literal(start.isoformat())}::timestamptz
+                AND created_at < {sql_literal(end.isoformat())}::timestamptz
+                AND {condition}
+                AND aging_days IS DISTINCT FROM {as_of_sql} - created_at::date
+                RETURNING 1
+            )
+            SELECT COUNT(*) AS n FROM upd
+            """)
+            table_updated += int(result[0]['n']) if result else 0
+            start = end
+        print(f"  {table}: {table_updated} aging_days values refreshed")
+        updated += table_updated
+    supabase_query(f"UPDATE counter_state SET aging_as_of = {as_of_sql}, updated_at = NOW() WHERE id = 1")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Roll date-driven counters forward')
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(),
+                        help='Date to evaluate overdue/aging against (default: today)')
+    parser.add_argument('--chunk-days', type=int, default=30, help='created_at window per aging UPDATE')
+    parser.add_argument('--skip-aging', action='store_true')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("OneValue Counter Maintenance")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    transitions = roll_overdue(args.as_of)
+    aged = 0 if args.skip_aging else refresh_aging(args.as_of, args.chunk_days)
+    duration_ms = (time.perf_counter() - start) * 1000
+    print(f"\nDone in {duration_ms / 1000:.1f}s: {transitions} overdue transitions, {aged} aging updates")
+
+    audit = AuditBuffer('counter_maintenance', str(uuid.uuid4()))
+    audit.add('run', duration_ms, processed=transitions + aged,
+              as_of=args.as_of.isoformat(), overdue_transitions=transitions, aging_updates=aged)
+    audit.flush()
+
+
+if __name__ == '__main__':
+    main()
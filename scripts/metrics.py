@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+In-process metrics registry for OneValue scripts.
+Counters, gauges and summaries rendered in Prometheus text exposition format.
+"""
+
+import os
+import threading
+from typing import Optional
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_summaries = {}
+_help = {}
+
+
+def describe(name: str, help_text: str):
+    """Register a HELP line for a metric"""
+    _help[name] = help_text
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a gauge to an absolute value"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    """Record an observation into a summary (exported as _sum and _count)"""
+    key = _key(name, labels)
+    with _lock:
+        total, count = _summaries.get(key, (0.0, 0))
+        _summaries[key] = (total + value, count + 1)
+
+
+def get(name: str, **labels) -> float:
+    """Read the current value of a counter or gauge"""
+    key = _key(name, labels)
+    with _lock:
+        return _counters.get(key, _gauges.get(key, 0))
+
+
+def reset():
+    """Clear all recorded values (keeps HELP text)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for k, v in labels:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render() -> str:
+    """Render all metrics in Prometheus text format"""
+    lines = []
+    with _lock:
+        for kind, store in (('counter', _counters), ('gauge', _gauges)):
+            by_name = {}
+            for (name, labels), value in store.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(by_name[name]):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        by_name = {}
+        for (name, labels), value in _summaries.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} summary")
+            for labels, (total, count) in sorted(by_name[name]):
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path: Optional[str] = None):
+    """Atomically write metrics to a textfile (node_exporter textfile collector)"""
+    path = path or os.environ.get('METRICS_FILE')
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def start_http_server(port: int, host: str = '127.0.0.1'):
+    """Serve /metrics from a daemon thread for Prometheus scraping"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
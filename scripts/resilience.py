@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Resilience layer for outbound Claude and Supabase calls.
+Jittered exponential backoff honouring retry-after, per-endpoint circuit
+breakers, and metrics for retries, throttles and breaker state.
+"""
+
+import random
+import socket
+import threading
+import time
+import urllib.error
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import metrics
+
+# 529 is Anthropic's "overloaded" status
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUS = {429, 529}
+# Statuses where the server guarantees the request was not applied,
+# so even non-idempotent writes can be replayed safely
+REJECTED_STATUS = {429, 503, 529}
+
+BREAKER_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+metrics.describe('onevalue_call_attempts_total', 'Outbound call attempts by endpoint and outcome')
+metrics.describe('onevalue_call_retries_total', 'Retries scheduled by endpoint')
+metrics.describe('onevalue_call_throttles_total', 'Throttled responses (429/529) by endpoint')
+metrics.describe('onevalue_retry_wait_seconds_total', 'Time spent waiting on backoff and retry-after')
+metrics.describe('onevalue_breaker_state', 'Circuit breaker state (0=closed, 1=half_open, 2=open)')
+metrics.describe('onevalue_breaker_rejections_total', 'Calls short-circuited by an open breaker')
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"circuit open for {endpoint}, retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """Backoff configuration for one endpoint"""
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0,
+                 max_delay: float = 60.0, max_retry_after: float = 120.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, floored by the server's retry-after"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(min(retry_after, self.max_retry_after), backoff)
+        return backoff
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures, half-open after a cool-off"""
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge('onevalue_breaker_state', BREAKER_STATE_VALUES[self.state],
+                          endpoint=self.endpoint)
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == 'open' and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> float:
+        """Return 0 if a call may proceed, else seconds until the next probe"""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                return remaining
+            self.state = 'half_open'
+            self._publish()
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != 'closed':
+                self.state = 'closed'
+                self._publish()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._publish()
+
+
+class _Endpoint:
+    def __init__(self, name: str, policy: RetryPolicy, breaker: CircuitBreaker):
+        self.name = name
+        self.policy = policy
+        self.breaker = breaker
+        # Shared cool-down so every caller backs off when one sees a 429
+        self.not_before = 0.0
+        self.lock = threading.Lock()
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def configure(endpoint: str, policy: Optional[RetryPolicy] = None, **breaker_kwargs):
+    """Register (or replace) retry policy and breaker settings for an endpoint"""
+    with _endpoints_lock:
+        _endpoints[endpoint] = _Endpoint(
+            endpoint, policy or RetryPolicy(), CircuitBreaker(endpoint, **breaker_kwargs)
+        )
+        return _endpoints[endpoint]
+
+
+def _get(endpoint: str) -> _Endpoint:
+    with _endpoints_lock:
+        ep = _endpoints.get(endpoint)
+    return ep or configure(endpoint)
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    return _get(endpoint).breaker
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Parse retry-after / retry-after-ms from an HTTPError, if present"""
+    headers = getattr(error, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status(error: Exception) -> Optional[int]:
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    return None
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """Decide whether an error is transient and safe to replay"""
+    status = _status(error)
+    if status is not None:
+        if idempotent:
+            return status in RETRYABLE_STATUS
+        return status in REJECTED_STATUS
+    if isinstance(error, urllib.error.URLError):
+        reason = error.reason
+        if isinstance(reason, (ConnectionRefusedError, socket.gaierror)):
+            return True  # never reached the server
+        return idempotent and isinstance(reason, (OSError, socket.timeout))
+    if isinstance(error, (socket.timeout, TimeoutError, ConnectionError)):
+        return idempotent
+    return False
+
+
+def is_unavailable(error: Exception, idempotent: bool = True) -> bool:
+    """True if an error from call_with_retry means the endpoint is down.
+
+    That is an open breaker, or a transient failure that outlasted the
+    retries, as opposed to a request the server rejected on its merits.
+    """
+    return isinstance(error, CircuitOpenError) or is_retryable(error, idempotent)
+
+
+def _counts_against_breaker(error: Exception) -> bool:
+    # Throttles and client errors say nothing about endpoint health
+    status = _status(error)
+    if status is not None:
+        return status >= 500 and status not in THROTTLE_STATUS
+    return isinstance(error, (urllib.error.URLError, socket.timeout, TimeoutError, ConnectionError))
+
+
+def _sleep(ep: _Endpoint, seconds: float):
+    if seconds > 0:
+        metrics.inc('onevalue_retry_wait_seconds_total', seconds, endpoint=ep.name)
+        time.sleep(seconds)
+
+
+def call_with_retry(endpoint: str, fn: Callable, idempotent: bool = True):
+    """Run fn() with backoff, retry-after and circuit breaking for endpoint.
+
+    Non-idempotent calls are only replayed when the server explicitly
+    rejected the request (429/503/529) or the connection was refused.
+    """
+    ep = _get(endpoint)
+    attempt = 0
+    while True:
+        with ep.lock:
+            wait = ep.not_before - time.monotonic()
+        _sleep(ep, wait)
+
+        retry_in = ep.breaker.allow()
+        if retry_in:
+            metrics.inc('onevalue_breaker_rejections_total', endpoint=endpoint)
+            raise CircuitOpenError(endpoint, retry_in)
+
+        try:
+            result = fn()
+        except Exception as e:
+            status = _status(e)
+            metrics.inc('onevalue_call_attempts_total', endpoint=endpoint,
+                        outcome=str(status) if status else type(e).__name__)
+            if _counts_against_breaker(e):
+                ep.breaker.record_failure()
+
+            retry_after = retry_after_seconds(e)
+            if status in THROTTLE_STATUS:
+                metrics.inc('onevalue_call_throttles_total', endpoint=endpoint, status=status)
+                if retry_after is not None:
+                    with ep.lock:
+                        ep.not_before = max(ep.not_before, time.monotonic() + retry_after)
+
+            if attempt >= ep.policy.max_retries or not is_retryable(e, idempotent):
+                raise
+            if ep.breaker.is_open:
+                raise CircuitOpenError(endpoint, ep.breaker.reset_timeout)
+
+            delay = ep.policy.delay(attempt, retry_after)
+            metrics.inc('onevalue_call_retries_total', endpoint=endpoint)
+            print(f"  {endpoint}: {e} - retrying in {delay:.1f}s ({attempt + 1}/{ep.policy.max_retries})")
+            _sleep(ep, delay)
+            attempt += 1
+            continue
+
+        metrics.inc('onevalue_call_attempts_total', endpoint=endpoint, outcome='ok')
+        ep.breaker.record_success()
+        return result
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+RLS overhead harness: query latency as an allowlisted user vs the service role.
+
+Runs each dashboard-shaped query under EXPLAIN (ANALYZE) twice per round -
+once as service_role (bypasses RLS) and once as authenticated with a
+request.jwt.claims email on the allowlist - and reports median server-side
+time and the authenticated overhead. Everything runs inside one transaction
+(each query in its own savepoint) that is rolled back at the end.
+
+--compare FILE applies a migration after the baseline inside the same
+transaction, re-runs the queries and reports the change, then rolls the
+migration back too (--keep commits it).
+
+Needs psycopg2 and DATABASE_URL pointing at a local Supabase Postgres
+(`supabase start`; the service_role/authenticated roles must exist).
+
+Usage: python3 scripts/rls_bench.py --seed 500
+       python3 scripts/rls_bench.py [--runs 7] [--compare supabase/schema_v7.sql]
+       python3 scripts/rls_bench.py --cleanup
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+BENCH_PREFIX = 'rls-bench-'
+BENCH_EMAIL = 'rls-bench@onevalue.local'
+
+QUERIES = {
+    'delivery_by_project': """
+        SELECT project_id, COUNT(*), AVG(sentiment_score)
+        FROM delivery_intelligence GROUP BY project_id""",
+    'delivery_recent': """
+        SELECT * FROM delivery_intelligence ORDER BY created_at DESC LIMIT 200""",
+    'actions_open': """
+        SELECT * FROM action_queue
+        WHERE status NOT IN ('Completed', 'Cancelled') ORDER BY priority, due_date""",
+    'actions_mine': f"""
+        SELECT * FROM action_queue WHERE owner_email = '{BENCH_EMAIL}'""",
+    'health_history_scan': """
+        SELECT project_id, AVG(health_score) FROM health_history GROUP BY project_id""",
+    'portfolio_overview': """
+        SELECT * FROM portfolio_overview""",
+    'action_queue_full': """
+        SELECT * FROM action_queue_full""",
+}
+
+SEED_SQL = """
+INSERT INTO user_allowlist (email, display_name, role, is_active)
+VALUES ('{email}', 'RLS Bench', 'PM', TRUE)
+ON CONFLICT (email) DO UPDATE SET is_active = TRUE;
+
+INSERT INTO sow_contracts (project_name, client_name, start_date, end_date, status)
+SELECT '{prefix}' || g, 'Bench Client ' || (g % 50), CURRENT_DATE - 180, CURRENT_DATE + (g % 400), 'Active'
+FROM generate_series(1, {projects}) g;
+
+INSERT INTO delivery_intelligence (
+    project_id, source, event_type, title, content_raw, sentiment_score,
+    evidence_link, message_id, ai_processed, created_at
+)
+SELECT s.id, 'GoogleChat', (ARRAY['MOM', 'Communication', 'Blocker', 'Update'])[1 + g % 4],
+       'Bench message ' || g, jsonb_build_object('text', 'bench message ' || g),
+       ROUND((random() * 2 - 1)::numeric, 2),
+       'https://chat.google.com/bench/' || s.id || '/' || g, '{prefix}' || s.id || '-' || g,
+       TRUE, NOW() - (g % 90) * INTERVAL '1 day'
+FROM sow_contracts s CROSS JOIN generate_series(1, {messages}) g
+WHERE s.project_name LIKE '{prefix}%';
+
+INSERT INTO action_queue (project_id, title, owner_email, priority, status, due_date, source_type)
+SELECT s.id, 'Bench action ' || g,
+       CASE WHEN g % 10 = 0 THEN '{email}' ELSE 'owner' || (g % 25) || '@onevalue.local' END,
+       (ARRAY['Critical', 'High', 'Medium', 'Low'])[1 + g % 4],
+       (ARRAY['Open', 'In Progress', 'Blocked', 'Completed'])[1 + g % 4],
+       CURRENT_DATE + (g % 30) - 10, 'AI_Extracted'
+FROM sow_contracts s CROSS JOIN generate_series(1, {actions}) g
+WHERE s.project_name LIKE '{prefix}%';
+
+INSERT INTO project_health_metrics (project_id, overall_health, health_score)
+SELECT id, 'Healthy', 80 FROM sow_contracts WHERE project_name LIKE '{prefix}%';
+
+INSERT INTO health_history (project_id, snapshot_date, overall_health, health_score, sentiment_score)
+SELECT s.id, CURRENT_DATE - g, 'Healthy', 60 + g % 40, 0.5
+FROM sow_contracts s CROSS JOIN generate_series(0, {days} - 1) g
+WHERE s.project_name LIKE '{prefix}%';
+"""
+
+
+def connect():
+    if psycopg2 is None:
+        sys.exit('psycopg2 is not installed (pip install psycopg2-binary)')
+    if not DATABASE_URL:
+        sys.exit('Set DATABASE_URL to a local Supabase Postgres (supabase status shows it)')
+    conn = psycopg2.connect(DATABASE_URL)
+    host = conn.get_dsn_parameters().get('host', '')
+    if host not in LOCAL_HOSTS and not host.startswith('/'):
+        sys.exit(f'Refusing to run against non-local host {host!r}')
+    return conn
+
+
+def seed(conn, projects: int, messages: int, actions: int, days: int):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM sow_contracts WHERE project_name LIKE '{BENCH_PREFIX}%'")
+        if cur.fetchone()[0]:
+            print("Bench data already present; run --cleanup first to reseed")
+            return
+        cur.execute(SEED_SQL.format(email=BENCH_EMAIL, prefix=BENCH_PREFIX, projects=int(projects),
+                                    messages=int(messages), actions=int(actions), days=int(days)))
+        conn.commit()
+        for table in ('sow_contracts', 'delivery_intelligence', 'action_queue',
+                      'project_health_metrics', 'health_history', 'user_allowlist'):
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+    print(f"Seeded {projects} projects: {projects * messages} messages, "
+          f"{projects * actions} actions, {projects * days} history rows")
+
+
+def cleanup(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"DELETE FROM sow_contracts WHERE project_name LIKE '{BENCH_PREFIX}%'")
+        projects = cur.rowcount
+        cur.execute("DELETE FROM user_allowlist WHERE email = %s", (BENCH_EMAIL,))
+    conn.commit()
+    print(f"Removed {projects} bench projects (and their rows) and the bench user")
+
+
+def _count_initplans(plan: dict) -> int:
+    n = 1 if plan.get('Parent Relationship') == 'InitPlan' else 0
+    return n + sum(_count_initplans(p) for p in plan.get('Plans', []))
+
+
+def explain(cur, sql: str, role: str) -> tuple:
+    """Server-side ms and InitPlan count for one run of sql as role"""
+    cur.execute("SAVEPOINT rls_bench")
+    try:
+        cur.execute(f"SET LOCAL ROLE {role}")
+        if role == 'authenticated':
+            cur.execute("SELECT set_config('request.jwt.claims', %s, true)",
+                        (json.dumps({'email': BENCH_EMAIL, 'role': 'authenticated'}),))
+        cur.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {sql}")
+        result = cur.fetchone()[0]
+        result = result[0] if isinstance(result, list) else json.loads(result)[0]
+        ms = result['Planning Time'] + result['Execution Time']
+        return ms, _count_initplans(result['Plan'])
+    finally:
+        cur.execute("ROLLBACK TO SAVEPOINT rls_bench")
+
+
+def run_queries(conn, runs: int) -> dict:
+    results = {}
+    with conn.cursor() as cur:
+        for name, sql in QUERIES.items():
+            timings = {'service_role': [], 'authenticated': []}
+            initplans = 0
+            explain(cur, sql, 'authenticated')  # warm-up
+            for _ in range(runs):
+                for role in timings:
+                    ms, plans = explain(cur, sql, role)
+                    timings[role].append(ms)
+                    if role == 'authenticated':
+                        initplans = plans
+            service = statistics.median(timings['service_role'])
+            auth = statistics.median(timings['authenticated'])
+            results[name] = {'service': service, 'auth': auth, 'overhead': auth - service,
+                             'initplans': initplans}
+    return results
+
+
+def print_results(label: str, results: dict):
+    print(f"\n{label}")
+    print(f"  {'query':<22}{'service ms':>12}{'auth ms':>10}{'overhead':>10}{'initplans':>11}")
+    for name, r in results.items():
+        print(f"  {name:<22}{r['service']:>12.2f}{r['auth']:>10.2f}{r['overhead']:>+10.2f}{r['initplans']:>11}")
+
+
+def print_comparison(before: dict, after: dict):
+    print("\nAuthenticated overhead (auth ms - service ms)")
+    print(f"  {'query':<22}{'before':>10}{'after':>10}{'change':>10}")
+    for name in before:
+        b, a = before[name]['overhead'], after[name]['overhead']
+        change = f"{(a - b) / b * 100:+.0f}%" if b > 0.05 else 'n/a'
+        print(f"  {name:<22}{b:>+10.2f}{a:>+10.2f}{change:>10}")
+    total_b = sum(r['overhead'] for r in before.values())
+    total_a = sum(r['overhead'] for r in after.values())
+    print(f"\n  total overhead {total_b:.1f}ms -> {total_a:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure RLS overhead for an allowlisted user')
+    parser.add_argument('--seed', type=int, metavar='PROJECTS', help='Insert synthetic bench data')
+    parser.add_argument('--messages', type=int, default=400, help='Messages per seeded project')
+    parser.add_argument('--actions', type=int, default=40, help='Actions per seeded project')
+    parser.add_argument('--days', type=int, default=90, help='health_history days per seeded project')
+    parser.add_argument('--cleanup', action='store_true', help='Delete bench data and exit')
+    parser.add_argument('--runs', type=int, default=7, help='Timed runs per query and role')
+    parser.add_argument('--compare', type=Path, metavar='SQL_FILE',
+                        help='Apply this migration after the baseline and measure again')
+    parser.add_argument('--keep', action='store_true', help='Commit the --compare migration')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.cleanup:
+        cleanup(conn)
+        return
+    if args.seed:
+        seed(conn, args.seed, args.messages, args.actions, args.days)
+
+    print("=" * 50)
+    print("OneValue RLS Benchmark")
+    print("=" * 50)
+
+    try:
+        before = run_queries(conn, args.runs)
+        print_results('Baseline', before)
+        if args.compare:
+            with conn.cursor() as cur:
+                cur.execute(args.compare.read_text())
+            after = run_queries(conn, args.runs)
+            print_results(f'After {args.compare.name}', after)
+            print_comparison(before, after)
+    except Exception:
+        conn.rollback()
+        raise
+    if args.compare and args.keep:
+        conn.commit()
+        print(f"\nCommitted {args.compare.name}")
+    else:
+        conn.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+SOW PDF ingestion with a checksum-keyed extraction cache (Python counterpart
+of 02_sow_pdf_auto_ingestor).
+
+Each Drive PDF is keyed on (file id, md5Checksum, modifiedTime). Unchanged
+files are neither downloaded nor sent to Claude. Changed files are split into
+pages locally (pypdf) and only pages whose text hash moved are sent, together
+with the previously extracted terms. Parsed sow_contracts fields live in
+SOW_CACHE_DIR, one JSON file per Drive file.
+
+Usage: python3 scripts/sow_ingestor.py [--dry-run]
+       python3 scripts/sow_ingestor.py --bench 40
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+from ai_analyzer import call_claude_tool
+from audit_log import AuditBuffer
+from json_extract import compile_schema
+from resilience import call_with_retry, is_unavailable
+from supabase_client import sql_literal, ssl_context, supabase_query
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+DRIVE_API_URL = os.environ.get('DRIVE_API_URL', 'https://www.googleapis.com').rstrip('/')
+GOOGLE_DRIVE_TOKEN = os.environ.get('GOOGLE_DRIVE_TOKEN')
+GOOGLE_DRIVE_SOW_FOLDER_ID = os.environ.get('GOOGLE_DRIVE_SOW_FOLDER_ID')
+SOW_CACHE_DIR = Path(os.environ.get('SOW_CACHE_DIR',
+                                    Path(__file__).resolve().parent.parent / '.cache' / 'sow'))
+SOW_TOOL = 'record_sow_terms'
+RENEWAL_WINDOW_DAYS = 90
+# Above this share of changed pages a full re-extraction is cheaper to reason about
+PARTIAL_PAGE_RATIO = 0.5
+
+SOW_SCHEMA = compile_schema({
+    'project_name': {'type': 'string', 'required': True},
+    'client_name': {'type': 'string', 'nullable': True, 'default': None,
+                    'description': 'client organization name'},
+    'start_date': {'type': 'string', 'required': True, 'description': 'YYYY-MM-DD'},
+    'end_date': {'type': 'string', 'required': True, 'description': 'YYYY-MM-DD'},
+    'scope_anchors': {'type': 'list', 'items': 'string', 'default': [],
+                      'description': 'main deliverables, objectives or milestones (up to 10)'},
+    'contract_value': {'type': 'number', 'nullable': True, 'default': None},
+    'inferred_owner': {'type': 'string', 'nullable': True, 'default': None,
+                       'description': 'OneOrigin team member name if mentioned'},
+})
+
+SOW_COLUMNS = (
+    'project_name', 'client_name', 'start_date', 'end_date', 'scope_anchors',
+    'renewal_window_start', 'contract_value', 'pdf_link', 'google_drive_file_id',
+    'inferred_owner', 'status',
+)
+
+EXTRACT_INSTRUCTIONS = (
+    "Extract the contract terms from this Statement of Work (SOW) and record them "
+    f"with the {SOW_TOOL} tool. Scope anchors should be the main deliverables, "
+    "objectives, or milestones; extract up to 10 key items."
+)
+
+
+# =====================================================
+# Google Drive
+# =====================================================
+
+def _drive_get(path: str, params: dict, raw: bool = False):
+    url = f"{DRIVE_API_URL}{path}?{urllib.parse.urlencode(params)}"
+    headers = {'Authorization': f'Bearer {GOOGLE_DRIVE_TOKEN}'} if GOOGLE_DRIVE_TOKEN else {}
+    req = urllib.request.Request(url, headers=headers)
+
+    def send():
+        with urllib.request.urlopen(req, context=ssl_context, timeout=60) as response:
+            body = response.read()
+            return body if raw else json.loads(body.decode('utf-8'))
+
+    return call_with_retry('google_drive', send)
+
+
+def list_sow_files() -> list:
+    """PDFs in the SOW folder whose name contains 'sow', with checksum metadata"""
+    query = "mimeType = 'application/pdf' and trashed = false"
+    if GOOGLE_DRIVE_SOW_FOLDER_ID:
+        query = f"'{GOOGLE_DRIVE_SOW_FOLDER_ID}' in parents and {query}"
+    files = []
+    page_token = None
+    while True:
+        params = {
+            'q': query,
+            'fields': 'nextPageToken, files(id, name, md5Checksum, modifiedTime, webViewLink)',
+            'pageSize': 1000,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        page = _drive_get('/drive/v3/files', params)
+        files.extend(f for f in page.get('files', []) if 'sow' in f.get('name', '').lower())
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return files
+
+
+def download_file(file_id: str) -> bytes:
+    return _drive_get(f'/drive/v3/files/{file_id}', {'alt': 'media'}, raw=True)
+
+
+# =====================================================
+# Local text extraction
+# =====================================================
+
+def extract_pages(data: bytes) -> Optional[list]:
+    """Text of each page, or None if pypdf is missing or the PDF has no text layer"""
+    if PdfReader is None:
+        return None
+    try:
+        pages = [page.extract_text() or '' for page in PdfReader(io.BytesIO(data)).pages]
+    except Exception as e:
+        print(f"  PDF text extraction failed: {e}")
+        return None
+    # Scanned PDFs: let Claude read the document itself
+    return pages if any(p.strip() for p in pages) else None
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(re.sub(r'\s+', ' ', text).strip().encode('utf-8')).hexdigest()
+
+
+# =====================================================
+# Cache
+# =====================================================
+
+def _cache_path(file_id: str) -> Path:
+    return SOW_CACHE_DIR / f"{re.sub(r'[^A-Za-z0-9_-]', '_', file_id)}.json"
+
+
+def load_cache(file_id: str) -> Optional[dict]:
+    try:
+        with open(_cache_path(file_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cache(entry: dict):
+    SOW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(entry['file_id'])
+    # Write-then-rename so a crash never leaves a half-written entry
+    fd, tmp = tempfile.mkstemp(dir=SOW_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _is_current(entry: Optional[dict], meta: dict) -> bool:
+    return bool(
+        entry and entry.get('fields')
+        and entry.get('md5Checksum') == meta.get('md5Checksum')
+        and entry.get('modifiedTime') == meta.get('modifiedTime')
+    )
+
+
+# =====================================================
+# Claude extraction
+# =====================================================
+
+def _request_terms(content) -> Optional[dict]:
+    terms = call_claude_tool(content, SOW_TOOL, SOW_SCHEMA.json_schema(),
+                             description='Record the contract terms of a SOW')
+    if terms is None:
+        return None
+    clean, bad = SOW_SCHEMA.validate(terms)
+    if bad:
+        print(f"  Extraction missing fields: {', '.join(bad)}")
+        return None
+    return clean
+
+
+def extract_from_text(name: str, pages: list) -> Optional[dict]:
+    text = "\n\n".join(f"--- Page {i + 1} ---\n{p}" for i, p in enumerate(pages))
+    return _request_terms(f"{EXTRACT_INSTRUCTIONS}\n\nDOCUMENT: {name}\n\n{text}")
+
+
+def extract_from_changed_pages(name: str, previous: dict, pages: list, changed: list) -> Optional[dict]:
+    text = "\n\n".join(f"--- Page {i + 1} of {len(pages)} ---\n{pages[i]}" for i in changed)
+    return _request_terms(
+        f"{EXTRACT_INSTRUCTIONS}\n\nDOCUMENT: {name}\n\n"
+        f"The terms below were extracted from an earlier version of this document:\n"
+        f"{json.dumps(previous, indent=2)}\n\n"
+        f"Only the following pages have changed since then. Record the full, updated "
+        f"terms, keeping earlier values where these pages do not affect them.\n\n{text}"
+    )
+
+
+def extract_from_pdf(name: str, data: bytes) -> Optional[dict]:
+    """Fallback when no text layer is available: send the PDF as a document block"""
+    return _request_terms([
+        {'type': 'document', 'source': {'type': 'base64', 'media_type': 'application/pdf',
+                                        'data': base64.b64encode(data).decode('ascii')}},
+        {'type': 'text', 'text': f"{EXTRACT_INSTRUCTIONS}\n\nDOCUMENT: {name}"},
+    ])
+
+
+def process_file(meta: dict) -> dict:
+    """Bring one Drive file's cache entry up to date. Returns {'entry', 'status', 'model_calls'}."""
+    entry = load_cache(meta['id'])
+    if _is_current(entry, meta):
+        return {'entry': entry, 'status': 'unchanged', 'model_calls': 0}
+
+    data = download_file(meta['id'])
+    pages = extract_pages(data)
+    hashes = [page_hash(p) for p in pages] if pages else None
+    previous = entry.get('fields') if entry else None
+    old_hashes = entry.get('page_hashes') if entry else None
+
+    model_calls = 1
+    if previous and hashes and hashes == old_hashes:
+        # Re-uploaded or touched without content changes
+        fields, status, model_calls = previous, 'reused', 0
+    elif previous and hashes and old_hashes and len(hashes) == len(old_hashes):
+        changed = [i for i, (new, old) in enumerate(zip(hashes, old_hashes)) if new != old]
+        if len(changed) <= PARTIAL_PAGE_RATIO * len(hashes):
+            fields, status = extract_from_changed_pages(meta['name'], previous, pages, changed), 'partial'
+        else:
+            fields, status = extract_from_text(meta['name'], pages), 'full'
+    elif pages:
+        fields, status = extract_from_text(meta['name'], pages), 'full'
+    else:
+        fields, status = extract_from_pdf(meta['name'], data), 'full'
+
+    if fields is None:
+        return {'entry': entry, 'status': 'failed', 'model_calls': model_calls}
+
+    entry = {
+        'file_id': meta['id'],
+        'name': meta['name'],
+        'md5Checksum': meta.get('md5Checksum'),
+        'modifiedTime': meta.get('modifiedTime'),
+        'webViewLink': meta.get('webViewLink'),
+        'page_hashes': hashes,
+        'fields': fields,
+        'stored': False,
+    }
+    save_cache(entry)
+    return {'entry': entry, 'status': status, 'model_calls': model_calls}
+
+
+# =====================================================
+# sow_contracts
+# =====================================================
+
+def _iso_date(value) -> Optional[str]:
+    """value as YYYY-MM-DD, or None if it is not a calendar date ("Q3 2025", "TBD")"""
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def contract_row(entry: dict) -> Optional[dict]:
+    """sow_contracts row for a cache entry, or None if its dates do not parse"""
+    fields = entry['fields']
+    start_date, end_date = _iso_date(fields.get('start_date')), _iso_date(fields.get('end_date'))
+    if start_date is None or end_date is None:
+        return None
+    renewal = (date.fromisoformat(end_date) - timedelta(days=RENEWAL_WINDOW_DAYS)).isoformat()
+    return {
+        **{k: fields.get(k) for k in SOW_SCHEMA.spec},
+        'start_date': start_date,
+        'end_date': end_date,
+        'renewal_window_start': renewal,
+        'pdf_link': entry.get('webViewLink'),
+        'google_drive_file_id': entry['file_id'],
+        'status': 'Active',
+    }
+
+
+def _row_sql(row: dict) -> str:
+    values = []
+    for col in SOW_COLUMNS:
+        value = row.get(col)
+        if col == 'scope_anchors':
+            values.append(f"ARRAY(SELECT jsonb_array_elements_text({sql_literal(value or [])}))")
+        elif col in ('start_date', 'end_date', 'renewal_window_start') and value is not None:
+            values.append(f"{sql_literal(value)}::date")
+        else:
+            values.append(sql_literal(value))
+    return "(" + ", ".join(values) + ")"
+
+
+def _upsert_rows(rows: list):
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in SOW_COLUMNS if c != 'project_name')
+    values = ",\n".join(_row_sql(row) for row in rows)
+    supabase_query(f"""
+    INSERT INTO sow_contracts ({', '.join(SOW_COLUMNS)})
+    VALUES
+    {values}
+    ON CONFLICT (project_name) DO UPDATE SET {updates}
+    """)
+
+
+def upsert_contracts(entries: list) -> tuple:
+    """Upsert pending entries in one statement, then mark them stored in the cache.
+
+    Entries whose dates do not parse are skipped (they stay pending until the
+    file changes and is re-extracted). If the batch statement is rejected,
+    rows are retried one at a time so a single bad row cannot block the rest.
+    If Supabase itself is unavailable (circuit open or retries exhausted) the
+    remaining rows are deferred to the next run instead.
+    Returns (upserted, invalid, deferred).
+    """
+    # One row per project_name; ON CONFLICT cannot touch the same row twice
+    by_project = {}
+    invalid = 0
+    for entry in entries:
+        row = contract_row(entry)
+        if row is None:
+            fields = entry['fields']
+            print(f"  Skipping {entry['name']}: unparsable dates "
+                  f"(start {fields.get('start_date')!r}, end {fields.get('end_date')!r})")
+            invalid += 1
+            continue
+        group = by_project.setdefault(row['project_name'], {'row': row, 'entries': []})
+        group['row'] = row
+        group['entries'].append(entry)
+    if not by_project:
+        return 0, invalid, 0
+
+    groups = list(by_project.values())
+    deferred = 0
+    try:
+        _upsert_rows([g['row'] for g in groups])
+        stored = groups
+    except Exception as e:
+        stored = []
+        if is_unavailable(e):
+            print(f"  Supabase unavailable ({e}); deferring {len(groups)} contracts to next run")
+            deferred = len(groups)
+        else:
+            print(f"  Batch upsert failed ({e}); retrying row by row")
+            for i, group in enumerate(groups):
+                try:
+                    _upsert_rows([group['row']])
+                    stored.append(group)
+                except Exception as e:
+                    if is_unavailable(e):
+                        # Leave the rest pending rather than failing each one the same way
+                        deferred = len(groups) - i
+                        print(f"  Supabase unavailable ({e}); deferring {deferred} contracts to next run")
+                        break
+                    print(f"  Failed to store {group['row']['project_name']}: {e}")
+
+    for group in stored:
+        for entry in group['entries']:
+            entry['stored'] = True
+            save_cache(entry)
+    return len(stored), invalid, deferred
+
+
+def run_ingest(dry_run: bool = False) -> dict:
+    start = time.perf_counter()
+    stats = {'files': 0, 'unchanged': 0, 'reused': 0, 'partial': 0, 'full': 0,
+             'failed': 0, 'model_calls': 0, 'upserted': 0, 'invalid': 0, 'deferred': 0}
+    pending = []
+    for meta in list_sow_files():
+        stats['files'] += 1
+        try:
+            result = process_file(meta)
+        except Exception as e:
+            print(f"  Failed {meta.get('name')}: {e}")
+            result = {'entry': None, 'status': 'failed', 'model_calls': 0}
+        stats[result['status']] += 1
+        stats['model_calls'] += result['model_calls']
+        entry = result['entry']
+        if result['status'] != 'failed' and not entry.get('stored'):
+            pending.append(entry)
+    if pending and not dry_run:
+        stats['upserted'], stats['invalid'], stats['deferred'] = upsert_contracts(pending)
+    stats['duration_ms'] = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def _fake_pdf(text: str) -> bytes:
+    return f"%PDF-1.4\n% {text}\n%%EOF\n".encode('utf-8')
+
+
+def run_bench(n_files: int):
+    """Cold, unchanged and one-file-edited runs against the Drive and Anthropic stubs"""
+    global DRIVE_API_URL, SOW_CACHE_DIR
+    import ai_analyzer
+    from stub_servers import DriveStubHandler, start_anthropic_stub, start_drive_stub
+
+    drive = start_drive_stub()
+    anthropic = start_anthropic_stub()
+    DRIVE_API_URL = f'http://127.0.0.1:{drive.server_port}'
+    ai_analyzer.ANTHROPIC_API_URL = f'http://127.0.0.1:{anthropic.server_port}'
+    SOW_CACHE_DIR = Path(tempfile.mkdtemp(prefix='sow-bench-'))
+    for i in range(n_files):
+        DriveStubHandler.put(f'file{i:03d}', f'Project {i} SOW.pdf', _fake_pdf(f'project {i} v1'))
+
+    print(f"\n{n_files} SOW files, cache in {SOW_CACHE_DIR} (pypdf {'on' if PdfReader else 'off'})\n")
+    print(f"{'run':<16}{'model calls':>12}{'unchanged':>11}{'extracted':>11}{'ms':>9}")
+    for label in ('cold', 'unchanged', 'one file edited'):
+        if label == 'one file edited':
+            DriveStubHandler.put('file000', 'Project 0 SOW.pdf', _fake_pdf('project 0 v2'))
+        stats = run_ingest(dry_run=True)
+        print(f"{label:<16}{stats['model_calls']:>12}{stats['unchanged']:>11}"
+              f"{stats['full'] + stats['partial']:>11}{stats['duration_ms']:>9.0f}")
+    drive.shutdown()
+    anthropic.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest SOW PDFs from Google Drive into sow_contracts')
+    parser.add_argument('--dry-run', action='store_true', help='Extract and cache without writing sow_contracts')
+    parser.add_argument('--bench', type=int, metavar='N', help='Benchmark with N files against local stubs')
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args.bench)
+        return
+
+    print("=" * 50)
+    print("OneValue SOW Ingestor")
+    print("=" * 50)
+
+    stats = run_ingest(args.dry_run)
+    print(f"\n{stats['files']} SOW files: {stats['unchanged']} unchanged, {stats['reused']} reused, "
+          f"{stats['partial']} partial, {stats['full']} full, {stats['failed']} failed")
+    print(f"Model calls: {stats['model_calls']}, contracts upserted: {stats['upserted']}, "
+          f"skipped for invalid dates: {stats['invalid']}, deferred: {stats['deferred']}")
+
+    if not args.dry_run and (stats['files'] > stats['unchanged'] or stats['deferred']):
+        audit = AuditBuffer('sow_pdf_auto_ingestor', str(uuid.uuid4()))
+        audit.add('run', stats['duration_ms'],
+                  processed=stats['upserted'], failed=stats['failed'] + stats['invalid'],
+                  files=stats['files'], invalid_dates=stats['invalid'], deferred=stats['deferred'],
+                  unchanged=stats['unchanged'], model_calls=stats['model_calls'])
+        audit.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Local stub servers for offline benchmarking of OneValue scripts.
+
+anthropic: mimics POST /v1/messages. Free-text requests get a reply sampled
+from bench_data/analysis_responses.jsonl (clean and malformed), forced tool
+calls get a schema-shaped tool_use block, as the real API guarantees.
+
+chat: mimics Google Chat GET /v1/spaces/{space}/messages with createTime
+filters and pagination over deterministic synthetic messages.
+
+drive: mimics Google Drive v3 files.list and files.get?alt=media over an
+in-memory file table (DriveStubHandler.files) that benchmarks can mutate.
+
+webhook: accepts Google Chat incoming-webhook POSTs, records them in
+WebhookStubHandler.received, and answers 429 above --rate-limit per second
+like the real per-space quota.
+
+Usage: python3 scripts/stub_servers.py anthropic [--port 8788] [--latency-ms 0]
+       python3 scripts/stub_servers.py chat [--port 8789] [--latency-ms 150]
+       python3 scripts/stub_servers.py drive [--port 8790]
+       python3 scripts/stub_servers.py webhook [--port 8791] [--rate-limit 1]
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CORPUS = Path(__file__).parent / 'bench_data' / 'analysis_responses.jsonl'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status: int, body, headers: dict = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class AnthropicStubHandler(_StubHandler):
+    latency_ms = 0
+    # Extra latency per 1k input tokens that were not read from the prompt cache
+    prefill_ms_per_1k = 0
+    throttle_rate = 0.0
+    rng = random.Random(0)
+    lock = threading.Lock()
+    replies = []
+    clean = []
+
+    @classmethod
+    def load_corpus(cls, path: Path = CORPUS):
+        cases = [json.loads(line) for line in open(path) if line.strip()]
+        cls.replies = [c['text'] for c in cases]
+        cls.clean = [json.loads(c['text']) for c in cases if c['label'] == 'clean']
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/v1/messages':
+            self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+            return
+        body = self._read_json()
+        with self.lock:
+            throttled = self.rng.random() < self.throttle_rate
+            text_reply = self.rng.choice(self.replies)
+            clean = dict(self.rng.choice(self.clean))
+        if throttled:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            self._send_json(429, {'type': 'error', 'error': {'type': 'rate_limit_error'}},
+                            {'retry-after': '1'})
+            return
+
+        tool_choice = body.get('tool_choice') or {}
+        if tool_choice.get('type') == 'tool':
+            tool = next(t for t in body['tools'] if t['name'] == tool_choice['name'])
+            wanted = tool['input_schema'].get('properties', {})
+            tool_input = {k: v for k, v in clean.items() if k in wanted}
+            for name, prop in wanted.items():
+                if 'project_id' in prop.get('items', {}).get('properties', {}):
+                    tool_input[name] = self._project_entries(body, prop['items'])
+            for name in tool['input_schema'].get('required', []):
+                tool_input.setdefault(name, _placeholder(wanted.get(name, {})))
+            content = [{'type': 'tool_use', 'id': 'toolu_stub', 'name': tool['name'], 'input': tool_input}]
+            output = json.dumps(tool_input)
+            stop_reason = 'tool_use'
+        else:
+            content = [{'type': 'text', 'text': text_reply}]
+            output = text_reply
+            stop_reason = 'end_turn'
+
+        usage = _usage(body, output)
+        uncached = usage['input_tokens'] + usage['cache_creation_input_tokens']
+        delay_ms = self.latency_ms + self.prefill_ms_per_1k * uncached / 1000
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        self._send_json(200, {
+            'id': 'msg_stub',
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': content,
+            'stop_reason': stop_reason,
+            'usage': usage,
+        })
+
+    def _project_entries(self, body: dict, item_schema: dict) -> list:
+        """One clean analysis per <project id="..."> section of a packed prompt"""
+        content = body['messages'][-1]['content']
+        if isinstance(content, list):
+            content = '\n'.join(block.get('text', '') for block in content)
+        wanted = item_schema.get('properties', {})
+        entries = []
+        for project_id in re.findall(r'<project id="([^"]+)">', content):
+            with self.lock:
+                clean = self.rng.choice(self.clean)
+            entry = {k: v for k, v in clean.items() if k in wanted}
+            entry['project_id'] = project_id
+            entries.append(entry)
+        return entries
+
+
+def _placeholder(prop: dict):
+    """Schema-conforming value for a required property the corpus does not cover"""
+    kind = prop.get('type')
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != 'null'), 'string')
+    if 'enum' in prop:
+        return prop['enum'][0]
+    if kind == 'string':
+        return '2026-12-31' if 'YYYY-MM-DD' in prop.get('description', '') else 'stub'
+    return {'number': 0, 'integer': 0, 'boolean': False, 'array': [], 'object': {}}.get(kind)
+
+
+_cached_prefixes = set()
+_cache_lock = threading.Lock()
+# Shorter prefixes are processed uncached even when marked (Sonnet/Opus; Haiku is 2048)
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def _usage(body: dict, output: str) -> dict:
+    """Approximate token counts (4 chars/token) with prompt-cache accounting.
+
+    As with the real API the cacheable prefix is tools, then system blocks up
+    to a cache_control breakpoint: the longest previously seen prefix is a
+    cache read, the rest up to the last breakpoint a cache write. A
+    breakpoint whose prefix is under MIN_CACHEABLE_TOKENS is ignored.
+    """
+    tools = json.dumps(body.get('tools', []))
+    system = body.get('system')
+    blocks = system if isinstance(system, list) else []
+    prefix_chars = len(tools)
+    breakpoints = []
+    for i, block in enumerate(blocks):
+        prefix_chars += len(block.get('text', ''))
+        if block.get('cache_control') and prefix_chars // 4 >= MIN_CACHEABLE_TOKENS:
+            key = hashlib.sha256((tools + json.dumps(blocks[:i + 1])).encode()).hexdigest()
+            breakpoints.append((key, prefix_chars))
+
+    total = len(tools) + sum(len(b.get('text', '')) for b in blocks) + len(json.dumps(body.get('messages', [])))
+    if isinstance(system, str):
+        total += len(system)
+    read = written = 0
+    with _cache_lock:
+        for key, chars in breakpoints:
+            if key in _cached_prefixes:
+                read = chars
+        if breakpoints and breakpoints[-1][1] > read:
+            written = breakpoints[-1][1] - read
+        _cached_prefixes.update(key for key, _ in breakpoints)
+    return {
+        'input_tokens': (total - read - written) // 4,
+        'output_tokens': len(output) // 4,
+        'cache_creation_input_tokens': written // 4,
+        'cache_read_input_tokens': read // 4,
+    }
+
+
+class ChatStubHandler(_StubHandler):
+    latency_ms = 0
+    messages_per_space = 40
+    page_size_max = 100
+    # Messages are spread evenly over the 48h before the server started
+    epoch = datetime.now(timezone.utc)
+
+    def _messages(self, space: str) -> list:
+        out = []
+        n = self.messages_per_space
+        for i in range(n):
+            created = self.epoch - timedelta(hours=48) + timedelta(hours=48 * (i + 1) / n)
+            if i % 5 == 0:
+                text = f'MOM: weekly sync {i}\nAttendees: team\nAction items: follow up'
+            elif i % 9 == 0:
+                text = 'Status update. ' + 'Long form detail. ' * 40
+            else:
+                text = f'quick note {i}'
+            out.append({
+                'name': f'{space}/messages/m{i}',
+                'text': text,
+                'createTime': created.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                'sender': {'displayName': 'Stub User', 'email': 'stub@example.edu'},
+                'space': {'name': space},
+                'thread': {'name': f'{space}/threads/t{i // 3}'},
+            })
+        return out
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 4 or parts[0] != 'v1' or parts[1] != 'spaces' or parts[3] != 'messages':
+            self._send_json(404, {'error': {'code': 404, 'message': 'not found'}})
+            return
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        query = urllib.parse.parse_qs(url.query)
+        space = f'spaces/{parts[2]}'
+        messages = self._messages(space)
+        filt = (query.get('filter') or [''])[0]
+        if 'createTime >' in filt:
+            since = filt.split('"')[1]
+            messages = [m for m in messages if m['createTime'] > since]
+        page_size = min(int((query.get('pageSize') or ['25'])[0]), self.page_size_max)
+        offset = int((query.get('pageToken') or ['0'])[0])
+        page = messages[offset:offset + page_size]
+        body = {'messages': page}
+        if offset + page_size < len(messages):
+            body['nextPageToken'] = str(offset + page_size)
+        self._send_json(200, body)
+
+
+def start_chat_stub(port: int = 0, latency_ms: int = 0, messages_per_space: int = 40) -> ThreadingHTTPServer:
+    """Start the Google Chat stub on a daemon thread; returns the server"""
+    ChatStubHandler.latency_ms = latency_ms
+    ChatStubHandler.messages_per_space = messages_per_space
+    ChatStubHandler.epoch = datetime.now(timezone.utc)
+    server = ThreadingHTTPServer(('127.0.0.1', port), ChatStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class DriveStubHandler(_StubHandler):
+    latency_ms = 0
+    # file id -> {'name', 'data' (bytes), 'modifiedTime'}
+    files = {}
+
+    @classmethod
+    def put(cls, file_id: str, name: str, data: bytes):
+        cls.files[file_id] = {
+            'name': name,
+            'data': data,
+            'modifiedTime': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        }
+
+    def _meta(self, file_id: str) -> dict:
+        f = self.files[file_id]
+        return {
+            'id': file_id,
+            'name': f['name'],
+            'mimeType': 'application/pdf',
+            'md5Checksum': hashlib.md5(f['data']).hexdigest(),
+            'modifiedTime': f['modifiedTime'],
+            'webViewLink': f'https://drive.google.com/file/d/{file_id}/view',
+        }
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if url.path == '/drive/v3/files':
+            self._send_json(200, {'files': [self._meta(i) for i in sorted(self.files)]})
+            return
+        file_id = url.path.rsplit('/', 1)[-1]
+        if not url.path.startswith('/drive/v3/files/') or file_id not in self.files:
+            self._send_json(404, {'error': {'code': 404, 'message': 'File not found'}})
+            return
+        if (query.get('alt') or [''])[0] != 'media':
+            self._send_json(200, self._meta(file_id))
+            return
+        data = self.files[file_id]['data']
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_drive_stub(port: int = 0, latency_ms: int = 0) -> ThreadingHTTPServer:
+    """Start the Google Drive stub on a daemon thread; returns the server"""
+    DriveStubHandler.latency_ms = latency_ms
+    server = ThreadingHTTPServer(('127.0.0.1', port), DriveStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class WebhookStubHandler(_StubHandler):
+    latency_ms = 0
+    # Accepted posts per second before answering 429 (0 = unlimited)
+    rate_limit = 0.0
+    lock = threading.Lock()
+    received = []
+    rejected = 0
+    _recent = []
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        now = time.monotonic()
+        with self.lock:
+            cls = type(self)
+            cls._recent = [t for t in cls._recent if now - t < 1.0]
+            if self.rate_limit and len(cls._recent) >= self.rate_limit:
+                cls.rejected += 1
+                throttled = True
+            else:
+                cls._recent.append(now)
+                cls.received.append({'time': now, 'path': self.path, 'body': body})
+                throttled = False
+        if throttled:
+            self._send_json(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}},
+                            {'retry-after': '1'})
+            return
+        self._send_json(200, {'name': f'spaces/stub/messages/{len(self.received)}'})
+
+
+def start_webhook_stub(port: int = 0, latency_ms: int = 0, rate_limit: float = 0.0) -> ThreadingHTTPServer:
+    """Start the chat webhook receiver on a daemon thread; returns the server"""
+    WebhookStubHandler.latency_ms = latency_ms
+    WebhookStubHandler.rate_limit = rate_limit
+    WebhookStubHandler.received = []
+    WebhookStubHandler.rejected = 0
+    WebhookStubHandler._recent = []
+    server = ThreadingHTTPServer(('127.0.0.1', port), WebhookStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_anthropic_stub(port: int = 0, latency_ms: int = 0, throttle_rate: float = 0.0,
+                         seed: int = 0, prefill_ms_per_1k: float = 0) -> ThreadingHTTPServer:
+    """Start the Anthropic stub on a daemon thread; returns the server"""
+    AnthropicStubHandler.load_corpus()
+    AnthropicStubHandler.latency_ms = latency_ms
+    AnthropicStubHandler.prefill_ms_per_1k = prefill_ms_per_1k
+    AnthropicStubHandler.throttle_rate = throttle_rate
+    AnthropicStubHandler.rng = random.Random(seed)
+    server = ThreadingHTTPServer(('127.0.0.1', port), AnthropicStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stub API server')
+    parser.add_argument('service', choices=['anthropic', 'chat', 'drive', 'webhook'])
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Webhook posts accepted per second')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.service == 'webhook':
+        server = start_webhook_stub(args.port or 8791, args.latency_ms, args.rate_limit)
+        print(f"Chat webhook stub listening on http://127.0.0.1:{server.server_port}/ "
+              f"(set ALERT_WEBHOOK_URL to this)")
+    elif args.service == 'drive':
+        server = start_drive_stub(args.port or 8790, args.latency_ms)
+        print(f"Google Drive stub listening on http://127.0.0.1:{server.server_port} "
+              f"(set DRIVE_API_URL to this)")
+    elif args.service == 'chat':
+        server = start_chat_stub(args.port or 8789, args.latency_ms)
+        print(f"Google Chat stub listening on http://127.0.0.1:{server.server_port} "
+              f"(set CHAT_API_URL to this)")
+    else:
+        server = start_anthropic_stub(args.port or 8788, args.latency_ms, args.throttle_rate, args.seed)
+        print(f"Anthropic stub listening on http://127.0.0.1:{server.server_port} "
+              f"(set ANTHROPIC_API_URL to this)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
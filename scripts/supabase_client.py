@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Shared Supabase access for OneValue scripts.
+Loads .env, executes SQL through the Supabase Management API and quotes literals.
+"""
+
+import os
+import json
+import ssl
+import urllib.request
+from datetime import date, datetime
+from pathlib import Path
+
+import http_replay
+from resilience import call_with_retry
+
+# Load environment variables
+env_file = Path(__file__).parent.parent / '.env'
+if env_file.exists():
+    with open(env_file) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Configuration
+SUPABASE_URL = os.environ.get('SUPABASE_URL')
+SUPABASE_SERVICE_ROLE = os.environ.get('SUPABASE_SERVICE_ROLE')
+SUPABASE_ACCESS_TOKEN = os.environ.get('SUPABASE_ACCESS_TOKEN')
+SUPABASE_PROJECT_REF = os.environ.get('SUPABASE_PROJECT_REF', 'osmdiezkqgfrhhsgtomo')
+SUPABASE_API_URL = os.environ.get('SUPABASE_API_URL', 'https://api.supabase.com')
+
+# SSL context for macOS
+ssl_context = ssl.create_default_context()
+
+
+def supabase_query(sql: str, idempotent: bool = True):
+    """Execute SQL query via Supabase Management API.
+
+    Transient failures are retried with backoff; pass idempotent=False for
+    writes that must not be replayed once the server may have applied them.
+    """
+    payload = json.dumps({'query': sql})
+    req = urllib.request.Request(
+        f'{SUPABASE_API_URL}/v1/projects/{SUPABASE_PROJECT_REF}/database/query',
+        data=payload.encode('utf-8'),
+        headers={
+            'Authorization': f'Bearer {SUPABASE_ACCESS_TOKEN}',
+            'Content-Type': 'application/json'
+        },
+        method='POST'
+    )
+
+    def send():
+        with http_replay.urlopen(req, context=ssl_context, timeout=60) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    return call_with_retry('supabase', send, idempotent=idempotent)
+
+
+def sql_literal(value) -> str:
+    """Render a Python value as a SQL literal for inline queries"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        return "'" + json.dumps(value, default=str).replace("'", "''") + "'::jsonb"
+    return "'" + str(value).replace("'", "''") + "'"
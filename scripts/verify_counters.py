@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Verify trigger-maintained counters against a full recount.
+
+Compares open/overdue/blocker counts on each project's latest
+project_health_metrics row with a recount of action_queue at the current
+overdue watermark, and checks watermark lag and stale aging_days on open
+actions.
+Exits non-zero on any drift.
+
+Usage: python3 scripts/verify_counters.py [--fix]
+"""
+
+import argparse
+import sys
+from datetime import date
+
+from supabase_client import supabase_query
+
+COUNTERS = ('open_action_count', 'overdue_action_count', 'blocker_count')
+
+RECOUNT_SQL = """
+WITH state AS (
+    SELECT overdue_as_of FROM counter_state WHERE id = 1
+),
+latest AS (
+    SELECT DISTINCT ON (project_id) project_id, metric_date,
+           open_action_count, overdue_action_count, blocker_count
+    FROM project_health_metrics
+    ORDER BY project_id, metric_date DESC
+),
+actual AS (
+    SELECT project_id, SUM(f[1]) AS open_n, SUM(f[2]) AS overdue_n, SUM(f[3]) AS blocker_n
+    FROM (
+        SELECT project_id,
+               action_counter_flags(status, due_date, source_type, (SELECT overdue_as_of FROM state)) AS f
+        FROM action_queue
+        WHERE project_id IS NOT NULL
+    ) a
+    GROUP BY project_id
+)
+SELECT l.project_id, s.project_name, l.metric_date,
+       l.open_action_count, COALESCE(a.open_n, 0) AS expected_open_action_count,
+       l.overdue_action_count, COALESCE(a.overdue_n, 0) AS expected_overdue_action_count,
+       l.blocker_count, COALESCE(a.blocker_n, 0) AS expected_blocker_count
+FROM latest l
+LEFT JOIN actual a ON a.project_id = l.project_id
+LEFT JOIN sow_contracts s ON s.id = l.project_id
+ORDER BY s.project_name
+"""
+
+AGING_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM action_queue, counter_state c
+     WHERE c.id = 1 AND status NOT IN ('Completed', 'Cancelled')
+     AND aging_days IS DISTINCT FROM c.aging_as_of - created_at::date) AS action_stale
+"""
+
+
+def find_mismatches() -> tuple:
+    rows = supabase_query(RECOUNT_SQL) or []
+    mismatches = [
+        r for r in rows
+        if any(int(r[c] or 0) != int(r[f'expected_{c}']) for c in COUNTERS)
+    ]
+    return rows, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check action counters against a full recount')
+    parser.add_argument('--fix', action='store_true', help='Overwrite drifted counters with the recount')
+    args = parser.parse_args()
+
+    state = supabase_query("SELECT overdue_as_of, aging_as_of FROM counter_state WHERE id = 1")
+    if not state:
+        print("counter_state is empty; apply supabase/schema_v4.sql first")
+        sys.exit(2)
+    state = state[0]
+
+    lag = (date.today() - date.fromisoformat(str(state['overdue_as_of'])[:10])).days
+    print(f"Overdue watermark: {state['overdue_as_of']} ({lag} day(s) behind)")
+    if lag > 1:
+        print("  Watermark is stale - is maintain_counters.py scheduled?")
+
+    rows, mismatches = find_mismatches()
+    print(f"\nChecked {len(rows)} projects: {len(mismatches)} with drifted counters")
+    for r in mismatches:
+        diffs = ", ".join(
+            f"{c} {r[c]} != {r[f'expected_{c}']}"
+            for c in COUNTERS if int(r[c] or 0) != int(r[f'expected_{c}'])
+        )
+        print(f"  {r['project_name'] or r['project_id']}: {diffs}")
+
+    aging = (supabase_query(AGING_SQL) or [{}])[0]
+    stale = int(aging.get('action_stale') or 0)
+    print(f"\nStale aging_days at {state['aging_as_of']}: {stale} open actions")
+
+    if args.fix and mismatches:
+        fixed = supabase_query("SELECT recount_action_counters() AS n")
+        print(f"\nRecounted {fixed[0]['n'] if fixed else 0} project rows")
+        _, mismatches = find_mismatches()
+        print(f"Remaining drift: {len(mismatches)} projects")
+
+    sys.exit(1 if mismatches or stale or lag > 1 else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@
 -- EXTENSIONS
 -- =====================================================
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- =====================================================
 -- TABLE: user_allowlist
@@ -100,7 +101,7 @@ CREATE INDEX IF NOT EXISTS idx_delivery_type ON delivery_intelligence(event_type
 CREATE INDEX IF NOT EXISTS idx_delivery_aging ON delivery_intelligence(aging_days);
 CREATE INDEX IF NOT EXISTS idx_delivery_unprocessed ON delivery_intelligence(ai_processed) WHERE NOT ai_processed;
 CREATE INDEX IF NOT EXISTS idx_delivery_created ON delivery_intelligence(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_delivery_message ON delivery_intelligence(message_id) WHERE message_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_delivery_source_message ON delivery_intelligence(source, message_id);
 CREATE INDEX IF NOT EXISTS idx_delivery_content_gin ON delivery_intelligence USING GIN(content_raw jsonb_path_ops);
 
 -- =====================================================
@@ -134,6 +135,21 @@ CREATE INDEX IF NOT EXISTS idx_health_date ON project_health_metrics(metric_date
 CREATE INDEX IF NOT EXISTS idx_health_status ON project_health_metrics(overall_health);
 CREATE INDEX IF NOT EXISTS idx_health_renewal_risk ON project_health_metrics(renewal_risk_score DESC) WHERE renewal_risk_score > 0.5;
 
+-- =====================================================
+-- FUNCTION: normalize_action_title
+-- Lowercase, punctuation and filler words stripped, so
+-- "Follow up with IT on VPN access!" and "follow-up IT
+-- VPN access" compare equal.
+-- =====================================================
+CREATE OR REPLACE FUNCTION normalize_action_title(p_title TEXT)
+RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(
+        regexp_replace(
+            regexp_replace(lower(COALESCE(p_title, '')), '[^[:alnum:]]+', ' ', 'g'),
+            '\m(a|an|the|to|for|of|on|in|at|by|and|with|please|pls)\M', ' ', 'g'),
+        '\s+', ' ', 'g'));
+$$ LANGUAGE sql IMMUTABLE;
+
 -- =====================================================
 -- TABLE: action_queue
 -- "What we do next" - prioritized action items
@@ -143,6 +159,7 @@ CREATE TABLE IF NOT EXISTS action_queue (
     project_id UUID REFERENCES sow_contracts(id) ON DELETE CASCADE,
     delivery_intelligence_id UUID REFERENCES delivery_intelligence(id) ON DELETE SET NULL,
     title TEXT NOT NULL,
+    title_normalized TEXT GENERATED ALWAYS AS (normalize_action_title(title)) STORED,
     description TEXT,
     owner TEXT,
     owner_email TEXT,
@@ -150,6 +167,10 @@ CREATE TABLE IF NOT EXISTS action_queue (
     status TEXT DEFAULT 'Open' CHECK (status IN ('Open', 'In Progress', 'Blocked', 'Completed', 'Cancelled')),
     due_date DATE,
     evidence_link TEXT,
+    -- Merged repeats append their evidence here (upsert_action_items)
+    evidence_links TEXT[] NOT NULL DEFAULT '{}',
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    last_seen_at TIMESTAMPTZ DEFAULT NOW(),
     source_type TEXT CHECK (source_type IN ('AI_Extracted', 'Manual', 'MOM', 'Blocker')),
     aging_days INTEGER DEFAULT 0,
     completed_at TIMESTAMPTZ,
@@ -163,6 +184,12 @@ CREATE INDEX IF NOT EXISTS idx_action_priority ON action_queue(priority);
 CREATE INDEX IF NOT EXISTS idx_action_owner ON action_queue(owner_email) WHERE owner_email IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_action_due ON action_queue(due_date) WHERE status NOT IN ('Completed', 'Cancelled');
 CREATE INDEX IF NOT EXISTS idx_action_overdue ON action_queue(due_date) WHERE status NOT IN ('Completed', 'Cancelled');
+CREATE INDEX IF NOT EXISTS idx_action_created ON action_queue(created_at) WHERE status NOT IN ('Completed', 'Cancelled');
+-- Exact repeats resolve through the btree, near matches through trigrams
+CREATE INDEX IF NOT EXISTS idx_action_title_norm ON action_queue(project_id, title_normalized)
+    WHERE status NOT IN ('Completed', 'Cancelled');
+CREATE INDEX IF NOT EXISTS idx_action_title_trgm ON action_queue USING gin (title_normalized gin_trgm_ops)
+    WHERE status NOT IN ('Completed', 'Cancelled');
 
 DROP TRIGGER IF EXISTS action_queue_updated_at ON action_queue;
 CREATE TRIGGER action_queue_updated_at
@@ -234,6 +261,29 @@ CREATE TABLE IF NOT EXISTS health_history (
 
 CREATE INDEX IF NOT EXISTS idx_health_history_project ON health_history(project_id);
 CREATE INDEX IF NOT EXISTS idx_health_history_date ON health_history(snapshot_date DESC);
+CREATE INDEX IF NOT EXISTS idx_health_history_project_date ON health_history(project_id, snapshot_date);
+
+-- =====================================================
+-- TABLE: health_history_rollups
+-- Weekly and monthly aggregates of health_history,
+-- maintained by refresh_health_rollups() (health_rollups.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS health_history_rollups (
+    project_id UUID NOT NULL REFERENCES sow_contracts(id) ON DELETE CASCADE,
+    grain TEXT NOT NULL CHECK (grain IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    snapshot_count INTEGER NOT NULL,
+    avg_health_score NUMERIC(5, 2),
+    min_health_score INTEGER,
+    worst_health TEXT CHECK (worst_health IN ('Healthy', 'At Risk', 'Critical', 'Unknown')),
+    last_health TEXT CHECK (last_health IN ('Healthy', 'At Risk', 'Critical', 'Unknown')),
+    avg_sentiment NUMERIC(4, 3),
+    min_sentiment NUMERIC(3, 2),
+    max_blocker_count INTEGER,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (project_id, grain, period_start)
+);
 
 -- =====================================================
 -- TABLE: alert_rules
@@ -273,7 +323,9 @@ CREATE TABLE IF NOT EXISTS alert_notifications (
     triggered_at TIMESTAMPTZ DEFAULT NOW(),
     read_at TIMESTAMPTZ,
     dismissed_at TIMESTAMPTZ,
-    dismissed_by TEXT
+    dismissed_by TEXT,
+    delivered_at TIMESTAMPTZ,
+    claimed_at TIMESTAMPTZ
 );
 
 CREATE INDEX IF NOT EXISTS idx_alerts_project ON alert_notifications(project_id);
@@ -281,6 +333,24 @@ CREATE INDEX IF NOT EXISTS idx_alerts_status ON alert_notifications(status);
 CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alert_notifications(severity);
 CREATE INDEX IF NOT EXISTS idx_alerts_triggered ON alert_notifications(triggered_at DESC);
 CREATE INDEX IF NOT EXISTS idx_alerts_unread ON alert_notifications(triggered_at DESC) WHERE status = 'unread';
+CREATE INDEX IF NOT EXISTS idx_alerts_undelivered ON alert_notifications(triggered_at)
+    WHERE delivered_at IS NULL;
+
+-- =====================================================
+-- TABLE: counter_state
+-- Watermarks for date-driven counters. overdue_as_of is
+-- the date "overdue" is evaluated against; it only moves
+-- forward via roll_overdue_counters() (maintain_counters.py).
+-- =====================================================
+CREATE TABLE IF NOT EXISTS counter_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    overdue_as_of DATE NOT NULL DEFAULT CURRENT_DATE,
+    aging_as_of DATE NOT NULL DEFAULT CURRENT_DATE,
+    rollups_refreshed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO counter_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
 
 -- =====================================================
 -- ROW LEVEL SECURITY (RLS)
@@ -293,8 +363,10 @@ ALTER TABLE action_queue ENABLE ROW LEVEL SECURITY;
 ALTER TABLE system_audit_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_spaces ENABLE ROW LEVEL SECURITY;
 ALTER TABLE health_history ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_history_rollups ENABLE ROW LEVEL SECURITY;
 ALTER TABLE alert_rules ENABLE ROW LEVEL SECURITY;
 ALTER TABLE alert_notifications ENABLE ROW LEVEL SECURITY;
+ALTER TABLE counter_state ENABLE ROW LEVEL SECURITY;
 
 -- Helper functions
 CREATE OR REPLACE FUNCTION public.get_user_email()
@@ -327,25 +399,27 @@ $$ LANGUAGE sql STABLE SECURITY DEFINER;
 
 -- =====================================================
 -- RLS POLICIES
+-- Helpers are wrapped in (SELECT ...) so they run once per
+-- statement as an InitPlan rather than once per row.
 -- =====================================================
 
 -- user_allowlist
 DROP POLICY IF EXISTS "Admins can manage allowlist" ON user_allowlist;
 CREATE POLICY "Admins can manage allowlist"
     ON user_allowlist FOR ALL
-    USING (public.is_admin())
-    WITH CHECK (public.is_admin());
+    USING ((SELECT public.is_admin()))
+    WITH CHECK ((SELECT public.is_admin()));
 
 DROP POLICY IF EXISTS "Users can view own entry" ON user_allowlist;
 CREATE POLICY "Users can view own entry"
     ON user_allowlist FOR SELECT
-    USING (email = public.get_user_email());
+    USING (email = (SELECT public.get_user_email()));
 
 -- sow_contracts
 DROP POLICY IF EXISTS "Allowlisted users can view SOWs" ON sow_contracts;
 CREATE POLICY "Allowlisted users can view SOWs"
     ON sow_contracts FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Admins and PMs can modify SOWs" ON sow_contracts;
 CREATE POLICY "Admins and PMs can modify SOWs"
@@ -353,7 +427,7 @@ CREATE POLICY "Admins and PMs can modify SOWs"
     USING (
         EXISTS (
             SELECT 1 FROM user_allowlist
-            WHERE email = public.get_user_email()
+            WHERE email = (SELECT public.get_user_email())
             AND role IN ('Admin', 'PM')
             AND is_active = TRUE
         )
@@ -363,7 +437,7 @@ CREATE POLICY "Admins and PMs can modify SOWs"
 DROP POLICY IF EXISTS "Allowlisted users can view delivery data" ON delivery_intelligence;
 CREATE POLICY "Allowlisted users can view delivery data"
     ON delivery_intelligence FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Service role can insert delivery data" ON delivery_intelligence;
 CREATE POLICY "Service role can insert delivery data"
@@ -373,13 +447,13 @@ CREATE POLICY "Service role can insert delivery data"
 DROP POLICY IF EXISTS "Admins can modify delivery data" ON delivery_intelligence;
 CREATE POLICY "Admins can modify delivery data"
     ON delivery_intelligence FOR UPDATE
-    USING (public.is_admin());
+    USING ((SELECT public.is_admin()));
 
 -- project_health_metrics
 DROP POLICY IF EXISTS "Allowlisted users can view metrics" ON project_health_metrics;
 CREATE POLICY "Allowlisted users can view metrics"
     ON project_health_metrics FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Service role can manage metrics" ON project_health_metrics;
 CREATE POLICY "Service role can manage metrics"
@@ -390,15 +464,15 @@ CREATE POLICY "Service role can manage metrics"
 DROP POLICY IF EXISTS "Allowlisted users can view actions" ON action_queue;
 CREATE POLICY "Allowlisted users can view actions"
     ON action_queue FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Allowlisted users can manage own actions" ON action_queue;
 CREATE POLICY "Allowlisted users can manage own actions"
     ON action_queue FOR ALL
     USING (
-        public.is_allowlisted() AND (
-            owner_email = public.get_user_email() OR
-            public.is_admin()
+        (SELECT public.is_allowlisted()) AND (
+            owner_email = (SELECT public.get_user_email()) OR
+            (SELECT public.is_admin())
         )
     );
 
@@ -406,7 +480,7 @@ CREATE POLICY "Allowlisted users can manage own actions"
 DROP POLICY IF EXISTS "Admins can view audit logs" ON system_audit_logs;
 CREATE POLICY "Admins can view audit logs"
     ON system_audit_logs FOR SELECT
-    USING (public.is_admin());
+    USING ((SELECT public.is_admin()));
 
 DROP POLICY IF EXISTS "Service role can insert audit logs" ON system_audit_logs;
 CREATE POLICY "Service role can insert audit logs"
@@ -417,45 +491,51 @@ CREATE POLICY "Service role can insert audit logs"
 DROP POLICY IF EXISTS "Allowlisted users can view spaces" ON chat_spaces;
 CREATE POLICY "Allowlisted users can view spaces"
     ON chat_spaces FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Admins can manage spaces" ON chat_spaces;
 CREATE POLICY "Admins can manage spaces"
     ON chat_spaces FOR ALL
-    USING (public.is_admin());
+    USING ((SELECT public.is_admin()));
 
 -- health_history
 DROP POLICY IF EXISTS "Allowlisted users can view health history" ON health_history;
 CREATE POLICY "Allowlisted users can view health history"
     ON health_history FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Service role can manage health history" ON health_history;
 CREATE POLICY "Service role can manage health history"
     ON health_history FOR ALL
     WITH CHECK (TRUE);
 
+-- health_history_rollups
+DROP POLICY IF EXISTS "Allowlisted users can view health rollups" ON health_history_rollups;
+CREATE POLICY "Allowlisted users can view health rollups"
+    ON health_history_rollups FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
 -- alert_rules
 DROP POLICY IF EXISTS "Allowlisted users can view alert rules" ON alert_rules;
 CREATE POLICY "Allowlisted users can view alert rules"
     ON alert_rules FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Admins can manage alert rules" ON alert_rules;
 CREATE POLICY "Admins can manage alert rules"
     ON alert_rules FOR ALL
-    USING (public.is_admin());
+    USING ((SELECT public.is_admin()));
 
 -- alert_notifications
 DROP POLICY IF EXISTS "Allowlisted users can view their alerts" ON alert_notifications;
 CREATE POLICY "Allowlisted users can view their alerts"
     ON alert_notifications FOR SELECT
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Allowlisted users can update alert status" ON alert_notifications;
 CREATE POLICY "Allowlisted users can update alert status"
     ON alert_notifications FOR UPDATE
-    USING (public.is_allowlisted());
+    USING ((SELECT public.is_allowlisted()));
 
 DROP POLICY IF EXISTS "Service role can create alerts" ON alert_notifications;
 CREATE POLICY "Service role can create alerts"
@@ -591,13 +671,22 @@ BEGIN
         CURRENT_DATE,
         m.overall_health,
         m.health_score,
-        m.sentiment_trend,
+        (SELECT ROUND(AVG(d.sentiment_score), 2)
+         FROM delivery_intelligence d
+         WHERE d.project_id = p.id
+         AND d.ai_processed = TRUE
+         AND d.created_at >= CURRENT_DATE - INTERVAL '7 days'),
         m.blocker_count,
         m.open_action_count,
         (SELECT COUNT(*) FROM delivery_intelligence WHERE project_id = p.id),
         m.ai_summary
     FROM sow_contracts p
-    LEFT JOIN project_health_metrics m ON m.project_id = p.id
+    LEFT JOIN LATERAL (
+        SELECT * FROM project_health_metrics
+        WHERE project_id = p.id
+        ORDER BY metric_date DESC
+        LIMIT 1
+    ) m ON TRUE
     WHERE p.id = p_project_id
     ON CONFLICT (project_id, snapshot_date)
     DO UPDATE SET
@@ -681,6 +770,528 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- =====================================================
+-- Counter helpers
+-- An action contributes [open, overdue, blocker]:
+--   open    = status not Completed/Cancelled
+--   overdue = open and due_date before the watermark
+--   blocker = open and (status Blocked or source_type Blocker)
+-- =====================================================
+CREATE OR REPLACE FUNCTION action_counter_flags(
+    p_status TEXT, p_due_date DATE, p_source_type TEXT, p_as_of DATE
+)
+RETURNS INT[] AS $$
+    SELECT CASE
+        WHEN p_status IN ('Completed', 'Cancelled') THEN ARRAY[0, 0, 0]
+        ELSE ARRAY[
+            1,
+            CASE WHEN p_due_date < p_as_of THEN 1 ELSE 0 END,
+            CASE WHEN p_status = 'Blocked' OR p_source_type = 'Blocker' THEN 1 ELSE 0 END
+        ]
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Counters live on each project's latest project_health_metrics row.
+-- Only these functions may change them (see project_health_guard_counters).
+-- The counter functions are SECURITY DEFINER: the triggers fire for
+-- authenticated frontend edits, which can neither read counter_state nor
+-- update project_health_metrics under RLS.
+CREATE OR REPLACE FUNCTION apply_action_counter_delta(
+    p_project_id UUID, p_open INT, p_overdue INT, p_blocker INT
+)
+RETURNS void AS $$
+BEGIN
+    PERFORM set_config('onevalue.counters_write', 'on', true);
+    UPDATE project_health_metrics
+    SET open_action_count = GREATEST(COALESCE(open_action_count, 0) + p_open, 0),
+        overdue_action_count = GREATEST(COALESCE(overdue_action_count, 0) + p_overdue, 0),
+        blocker_count = GREATEST(COALESCE(blocker_count, 0) + p_blocker, 0)
+    WHERE id = (
+        SELECT id FROM project_health_metrics
+        WHERE project_id = p_project_id
+        ORDER BY metric_date DESC
+        LIMIT 1
+    );
+    PERFORM set_config('onevalue.counters_write', 'off', true);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Only reachable through the triggers and counter jobs, not as an RPC
+REVOKE EXECUTE ON FUNCTION apply_action_counter_delta(UUID, INT, INT, INT) FROM PUBLIC, anon, authenticated;
+
+-- =====================================================
+-- TRIGGER: action_queue -> latest health row counters
+-- =====================================================
+CREATE OR REPLACE FUNCTION action_queue_maintain_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_old INT[] := ARRAY[0, 0, 0];
+    v_new INT[] := ARRAY[0, 0, 0];
+BEGIN
+    -- FOR SHARE: wait for an in-flight watermark roll so the delta uses its date
+    SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1 FOR SHARE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'counter_state watermark row (id = 1) is missing';
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        v_old := action_counter_flags(OLD.status, OLD.due_date, OLD.source_type, v_as_of);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        v_new := action_counter_flags(NEW.status, NEW.due_date, NEW.source_type, v_as_of);
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.project_id IS NOT DISTINCT FROM NEW.project_id THEN
+        IF v_new <> v_old AND NEW.project_id IS NOT NULL THEN
+            PERFORM apply_action_counter_delta(NEW.project_id,
+                v_new[1] - v_old[1], v_new[2] - v_old[2], v_new[3] - v_old[3]);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP <> 'INSERT' AND OLD.project_id IS NOT NULL AND v_old <> ARRAY[0, 0, 0] THEN
+        PERFORM apply_action_counter_delta(OLD.project_id, -v_old[1], -v_old[2], -v_old[3]);
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.project_id IS NOT NULL AND v_new <> ARRAY[0, 0, 0] THEN
+        PERFORM apply_action_counter_delta(NEW.project_id, v_new[1], v_new[2], v_new[3]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS action_queue_counters ON action_queue;
+CREATE TRIGGER action_queue_counters
+    AFTER INSERT OR DELETE OR UPDATE OF status, due_date, source_type, project_id ON action_queue
+    FOR EACH ROW
+    EXECUTE FUNCTION action_queue_maintain_counters();
+
+-- =====================================================
+-- TRIGGERS: project_health_metrics counter ownership
+-- A new day's row carries the counters forward (or seeds
+-- them with a one-project count); other writers cannot
+-- overwrite them.
+-- =====================================================
+CREATE OR REPLACE FUNCTION project_health_carry_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_prev RECORD;
+BEGIN
+    SELECT open_action_count, overdue_action_count, blocker_count INTO v_prev
+    FROM project_health_metrics
+    WHERE project_id = NEW.project_id
+    ORDER BY metric_date DESC
+    LIMIT 1;
+
+    IF FOUND THEN
+        NEW.open_action_count := v_prev.open_action_count;
+        NEW.overdue_action_count := v_prev.overdue_action_count;
+        NEW.blocker_count := v_prev.blocker_count;
+    ELSE
+        SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'counter_state watermark row (id = 1) is missing';
+        END IF;
+        SELECT COALESCE(SUM(f[1]), 0), COALESCE(SUM(f[2]), 0), COALESCE(SUM(f[3]), 0)
+        INTO NEW.open_action_count, NEW.overdue_action_count, NEW.blocker_count
+        FROM (
+            SELECT action_counter_flags(status, due_date, source_type, v_as_of) AS f
+            FROM action_queue
+            WHERE project_id = NEW.project_id
+        ) a;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS project_health_counters_insert ON project_health_metrics;
+CREATE TRIGGER project_health_counters_insert
+    BEFORE INSERT ON project_health_metrics
+    FOR EACH ROW
+    EXECUTE FUNCTION project_health_carry_counters();
+
+CREATE OR REPLACE FUNCTION project_health_guard_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('onevalue.counters_write', true) IS DISTINCT FROM 'on' THEN
+        NEW.open_action_count := OLD.open_action_count;
+        NEW.overdue_action_count := OLD.overdue_action_count;
+        NEW.blocker_count := OLD.blocker_count;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS project_health_counters_guard ON project_health_metrics;
+CREATE TRIGGER project_health_counters_guard
+    BEFORE UPDATE OF open_action_count, overdue_action_count, blocker_count ON project_health_metrics
+    FOR EACH ROW
+    EXECUTE FUNCTION project_health_guard_counters();
+
+-- =====================================================
+-- FUNCTION: roll_overdue_counters
+-- Moves the overdue watermark to p_as_of. Only open actions
+-- with due_date in [old watermark, p_as_of) change state,
+-- found by a range scan on idx_action_due.
+-- =====================================================
+CREATE OR REPLACE FUNCTION roll_overdue_counters(p_as_of DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_from DATE;
+    v_rows INTEGER := 0;
+    d RECORD;
+BEGIN
+    SELECT overdue_as_of INTO v_from FROM counter_state WHERE id = 1 FOR UPDATE;
+    IF v_from IS NULL OR p_as_of <= v_from THEN
+        RETURN 0;
+    END IF;
+
+    FOR d IN
+        SELECT project_id, COUNT(*)::int AS n
+        FROM action_queue
+        WHERE due_date >= v_from AND due_date < p_as_of
+        AND status NOT IN ('Completed', 'Cancelled')
+        AND project_id IS NOT NULL
+        GROUP BY project_id
+    LOOP
+        PERFORM apply_action_counter_delta(d.project_id, 0, d.n, 0);
+        v_rows := v_rows + d.n;
+    END LOOP;
+
+    UPDATE counter_state SET overdue_as_of = p_as_of, updated_at = NOW() WHERE id = 1;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- FUNCTION: recount_action_counters
+-- Full recount for one project (or all) against the
+-- current watermark. Used by verify_counters.py --fix and
+-- to initialise counters after this migration.
+-- =====================================================
+CREATE OR REPLACE FUNCTION recount_action_counters(p_project_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_rows INTEGER;
+BEGIN
+    SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1 FOR UPDATE;
+    PERFORM set_config('onevalue.counters_write', 'on', true);
+
+    WITH latest AS (
+        SELECT DISTINCT ON (project_id) id, project_id
+        FROM project_health_metrics
+        WHERE p_project_id IS NULL OR project_id = p_project_id
+        ORDER BY project_id, metric_date DESC
+    ),
+    actual AS (
+        SELECT project_id, SUM(f[1]) AS open_n, SUM(f[2]) AS overdue_n, SUM(f[3]) AS blocker_n
+        FROM (
+            SELECT project_id, action_counter_flags(status, due_date, source_type, v_as_of) AS f
+            FROM action_queue
+            WHERE project_id IS NOT NULL
+            AND (p_project_id IS NULL OR project_id = p_project_id)
+        ) a
+        GROUP BY project_id
+    )
+    UPDATE project_health_metrics m
+    SET open_action_count = COALESCE(a.open_n, 0),
+        overdue_action_count = COALESCE(a.overdue_n, 0),
+        blocker_count = COALESCE(a.blocker_n, 0)
+    FROM latest l
+    LEFT JOIN actual a ON a.project_id = l.project_id
+    WHERE m.id = l.id;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    PERFORM set_config('onevalue.counters_write', 'off', true);
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Same fallback the chart uses when health_score is missing
+CREATE OR REPLACE FUNCTION health_status_score(p_health TEXT, p_score INTEGER)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(p_score, CASE p_health
+        WHEN 'Healthy' THEN 100
+        WHEN 'At Risk' THEN 60
+        WHEN 'Critical' THEN 20
+        ELSE 50
+    END);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- =====================================================
+-- FUNCTION: refresh_health_rollups
+-- Recomputes only the (project, grain, period) buckets
+-- containing snapshots created after p_changed_since;
+-- NULL rebuilds everything.
+-- =====================================================
+CREATE OR REPLACE FUNCTION refresh_health_rollups(p_changed_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    WITH touched AS (
+        SELECT DISTINCT h.project_id, g.grain,
+               date_trunc(g.grain, h.snapshot_date::timestamp)::date AS period_start
+        FROM health_history h
+        CROSS JOIN (VALUES ('week'), ('month')) AS g(grain)
+        WHERE h.project_id IS NOT NULL
+        AND (p_changed_since IS NULL OR h.created_at > p_changed_since)
+    ),
+    buckets AS (
+        SELECT t.project_id, t.grain, t.period_start,
+               (t.period_start + CASE t.grain WHEN 'week' THEN INTERVAL '7 days'
+                                               ELSE INTERVAL '1 month' END)::date AS next_start
+        FROM touched t
+    )
+    INSERT INTO health_history_rollups (
+        project_id, grain, period_start, period_end, snapshot_count,
+        avg_health_score, min_health_score, worst_health, last_health,
+        avg_sentiment, min_sentiment, max_blocker_count, updated_at
+    )
+    SELECT
+        b.project_id, b.grain, b.period_start,
+        MAX(h.snapshot_date),
+        COUNT(*),
+        ROUND(AVG(health_status_score(h.overall_health, h.health_score)), 2),
+        MIN(health_status_score(h.overall_health, h.health_score)),
+        (ARRAY_AGG(h.overall_health ORDER BY health_status_score(h.overall_health, h.health_score), h.snapshot_date))[1],
+        (ARRAY_AGG(h.overall_health ORDER BY h.snapshot_date DESC))[1],
+        ROUND(AVG(h.sentiment_score), 3),
+        MIN(h.sentiment_score),
+        MAX(h.blocker_count),
+        NOW()
+    FROM buckets b
+    JOIN health_history h
+        ON h.project_id = b.project_id
+        AND h.snapshot_date >= b.period_start
+        AND h.snapshot_date < b.next_start
+    GROUP BY b.project_id, b.grain, b.period_start
+    ON CONFLICT (project_id, grain, period_start) DO UPDATE SET
+        period_end = EXCLUDED.period_end,
+        snapshot_count = EXCLUDED.snapshot_count,
+        avg_health_score = EXCLUDED.avg_health_score,
+        min_health_score = EXCLUDED.min_health_score,
+        worst_health = EXCLUDED.worst_health,
+        last_health = EXCLUDED.last_health,
+        avg_sentiment = EXCLUDED.avg_sentiment,
+        min_sentiment = EXCLUDED.min_sentiment,
+        max_blocker_count = EXCLUDED.max_blocker_count,
+        updated_at = NOW();
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- RPC: get_health_trend
+-- Chart-ready trend for one project. The grain is the
+-- finest of day/week/month that covers [p_start, p_end] in
+-- at most p_max_points points; older points are dropped
+-- if even monthly exceeds it, so the payload is bounded.
+-- Columns match health_history so HealthTrendChart can
+-- render either. Runs as the caller, so RLS applies.
+-- =====================================================
+CREATE OR REPLACE FUNCTION get_health_trend(
+    p_project_id UUID,
+    p_start DATE DEFAULT NULL,
+    p_end DATE DEFAULT CURRENT_DATE,
+    p_max_points INTEGER DEFAULT 60
+)
+RETURNS TABLE (
+    snapshot_date DATE,
+    grain TEXT,
+    overall_health TEXT,
+    health_score INTEGER,
+    min_health_score INTEGER,
+    sentiment_score NUMERIC,
+    blocker_count INTEGER,
+    snapshot_count INTEGER
+) AS $$
+DECLARE
+    v_start DATE := p_start;
+    v_grain TEXT;
+BEGIN
+    IF v_start IS NULL THEN
+        SELECT MIN(h.snapshot_date) INTO v_start
+        FROM health_history h
+        WHERE h.project_id = p_project_id;
+    END IF;
+    v_start := COALESCE(v_start, p_end);
+
+    v_grain := CASE
+        WHEN p_end - v_start < p_max_points THEN 'day'
+        WHEN p_end - v_start < p_max_points * 7 THEN 'week'
+        ELSE 'month'
+    END;
+
+    IF v_grain = 'day' THEN
+        RETURN QUERY
+        SELECT h.snapshot_date, 'day'::text, h.overall_health,
+               health_status_score(h.overall_health, h.health_score),
+               health_status_score(h.overall_health, h.health_score),
+               h.sentiment_score::numeric, h.blocker_count, 1
+        FROM health_history h
+        WHERE h.project_id = p_project_id
+        AND h.snapshot_date BETWEEN v_start AND p_end
+        ORDER BY h.snapshot_date;
+    ELSE
+        RETURN QUERY
+        SELECT r.period_start, r.grain, r.worst_health,
+               ROUND(r.avg_health_score)::int, r.min_health_score,
+               r.avg_sentiment, r.max_blocker_count, r.snapshot_count
+        FROM (
+            SELECT * FROM health_history_rollups hr
+            WHERE hr.project_id = p_project_id
+            AND hr.grain = v_grain
+            AND hr.period_end >= v_start
+            AND hr.period_start <= p_end
+            ORDER BY hr.period_start DESC
+            LIMIT p_max_points
+        ) r
+        ORDER BY r.period_start;
+    END IF;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- =====================================================
+-- TRIGGER: alert_notifications insert -> NOTIFY
+-- One notification per statement (payload: row count);
+-- the dispatcher treats it as a wake-up and reads the
+-- undelivered rows itself, so nothing is lost if it was
+-- not listening.
+-- =====================================================
+CREATE OR REPLACE FUNCTION notify_alert_inserted()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_rows FROM inserted WHERE delivered_at IS NULL;
+    IF v_rows > 0 THEN
+        PERFORM pg_notify('alert_notifications', v_rows::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS alert_notifications_notify ON alert_notifications;
+CREATE TRIGGER alert_notifications_notify
+    AFTER INSERT ON alert_notifications
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_alert_inserted();
+
+-- =====================================================
+-- RPC: upsert_action_items
+-- Bulk entry point for extracted action items (analyzer
+-- and workflow 04). p_items is a JSON array of
+-- {project_id, title, owner, priority, description,
+--  delivery_intelligence_id, evidence_link(s), source_type}.
+-- An item matching an open action of the same project
+-- (same normalized title, else trigram similarity >=
+-- p_threshold) is merged into it; otherwise inserted.
+-- Re-sending an item with the same evidence is a no-op.
+-- =====================================================
+CREATE OR REPLACE FUNCTION upsert_action_items(p_items JSONB, p_threshold REAL DEFAULT 0.6)
+RETURNS TABLE (action_id UUID, merged BOOLEAN) AS $$
+DECLARE
+    v_item JSONB;
+    v_project UUID;
+    v_title TEXT;
+    v_norm TEXT;
+    v_priority TEXT;
+    v_links TEXT[];
+    v_match UUID;
+BEGIN
+    -- The % operator (and so the trigram index) uses this threshold
+    PERFORM set_config('pg_trgm.similarity_threshold', p_threshold::text, true);
+
+    FOR v_item IN SELECT * FROM jsonb_array_elements(COALESCE(p_items, '[]'::jsonb)) LOOP
+        v_title := btrim(v_item->>'title');
+        v_norm := normalize_action_title(v_title);
+        CONTINUE WHEN v_title IS NULL OR v_title = '';
+
+        v_project := NULLIF(v_item->>'project_id', '')::uuid;
+        v_priority := initcap(COALESCE(v_item->>'priority', 'Medium'));
+        IF v_priority NOT IN ('Critical', 'High', 'Medium', 'Low') THEN
+            v_priority := 'Medium';
+        END IF;
+        v_links := ARRAY(
+            SELECT DISTINCT l FROM (
+                SELECT v_item->>'evidence_link' AS l
+                UNION ALL
+                SELECT jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(v_item->'evidence_links') = 'array'
+                         THEN v_item->'evidence_links' ELSE '[]'::jsonb END)
+            ) s
+            WHERE l IS NOT NULL AND l <> ''
+        );
+
+        v_match := NULL;
+        IF v_project IS NOT NULL AND v_norm <> '' THEN
+            -- Serialize per project so concurrent runs cannot both insert a new action
+            PERFORM pg_advisory_xact_lock(hashtext('action_queue:' || v_project::text));
+
+            SELECT a.id INTO v_match
+            FROM action_queue a
+            WHERE a.project_id = v_project
+              AND a.status NOT IN ('Completed', 'Cancelled')
+              AND a.title_normalized = v_norm
+            ORDER BY a.created_at
+            LIMIT 1;
+
+            IF v_match IS NULL THEN
+                SELECT a.id INTO v_match
+                FROM action_queue a
+                WHERE a.project_id = v_project
+                  AND a.status NOT IN ('Completed', 'Cancelled')
+                  AND a.title_normalized % v_norm
+                ORDER BY similarity(a.title_normalized, v_norm) DESC, a.created_at
+                LIMIT 1;
+            END IF;
+        END IF;
+
+        IF v_match IS NOT NULL THEN
+            UPDATE action_queue a SET
+                occurrences = a.occurrences + CASE
+                    WHEN cardinality(v_links) > 0 AND v_links <@ a.evidence_links THEN 0 ELSE 1 END,
+                evidence_links = a.evidence_links
+                    || ARRAY(SELECT l FROM unnest(v_links) l WHERE l <> ALL(a.evidence_links)),
+                evidence_link = COALESCE(a.evidence_link, v_links[1]),
+                priority = CASE
+                    WHEN array_position(ARRAY['Critical', 'High', 'Medium', 'Low'], v_priority)
+                       < array_position(ARRAY['Critical', 'High', 'Medium', 'Low'], a.priority)
+                    THEN v_priority ELSE a.priority END,
+                owner = COALESCE(a.owner, NULLIF(v_item->>'owner', '')),
+                last_seen_at = NOW()
+            WHERE a.id = v_match;
+            action_id := v_match;
+            merged := TRUE;
+        ELSE
+            INSERT INTO action_queue (
+                project_id, delivery_intelligence_id, title, description, owner,
+                priority, status, evidence_link, evidence_links, source_type
+            ) VALUES (
+                v_project,
+                NULLIF(v_item->>'delivery_intelligence_id', '')::uuid,
+                v_title,
+                NULLIF(v_item->>'description', ''),
+                NULLIF(v_item->>'owner', ''),
+                v_priority,
+                'Open',
+                v_links[1],
+                v_links,
+                COALESCE(NULLIF(v_item->>'source_type', ''), 'AI_Extracted')
+            )
+            RETURNING id INTO action_id;
+            merged := FALSE;
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
 -- =====================================================
 -- INITIAL DATA
 -- =====================================================
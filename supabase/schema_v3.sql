@@ -0,0 +1,37 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V3: Idempotent message ingestion
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- Collapse existing duplicates (keep the earliest row)
+-- Re-polls and the historical dump inserted the same
+-- (source, message_id) more than once.
+-- =====================================================
+WITH ranked AS (
+    SELECT id,
+           FIRST_VALUE(id) OVER (PARTITION BY source, message_id ORDER BY created_at, id) AS keeper_id
+    FROM delivery_intelligence
+    WHERE message_id IS NOT NULL
+),
+dupes AS (
+    SELECT id, keeper_id FROM ranked WHERE id <> keeper_id
+),
+repointed AS (
+    UPDATE action_queue a
+    SET delivery_intelligence_id = d.keeper_id
+    FROM dupes d
+    WHERE a.delivery_intelligence_id = d.id
+    RETURNING a.id
+)
+DELETE FROM delivery_intelligence di
+USING dupes d
+WHERE di.id = d.id;
+
+-- =====================================================
+-- Unique key for ON CONFLICT (source, message_id)
+-- Replaces the partial non-unique idx_delivery_message.
+-- NULL message_ids (manual entries) remain unconstrained.
+-- =====================================================
+DROP INDEX IF EXISTS idx_delivery_message;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_delivery_source_message
+    ON delivery_intelligence(source, message_id);
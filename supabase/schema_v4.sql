@@ -0,0 +1,267 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V4: Trigger-maintained action counters
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- TABLE: counter_state
+-- Watermarks for date-driven counters. overdue_as_of is
+-- the date "overdue" is evaluated against; it only moves
+-- forward via roll_overdue_counters() (maintain_counters.py).
+-- =====================================================
+CREATE TABLE IF NOT EXISTS counter_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    overdue_as_of DATE NOT NULL DEFAULT CURRENT_DATE,
+    aging_as_of DATE NOT NULL DEFAULT CURRENT_DATE,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO counter_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE counter_state ENABLE ROW LEVEL SECURITY;
+
+-- =====================================================
+-- Counter helpers
+-- An action contributes [open, overdue, blocker]:
+--   open    = status not Completed/Cancelled
+--   overdue = open and due_date before the watermark
+--   blocker = open and (status Blocked or source_type Blocker)
+-- =====================================================
+CREATE OR REPLACE FUNCTION action_counter_flags(
+    p_status TEXT, p_due_date DATE, p_source_type TEXT, p_as_of DATE
+)
+RETURNS INT[] AS $$
+    SELECT CASE
+        WHEN p_status IN ('Completed', 'Cancelled') THEN ARRAY[0, 0, 0]
+        ELSE ARRAY[
+            1,
+            CASE WHEN p_due_date < p_as_of THEN 1 ELSE 0 END,
+            CASE WHEN p_status = 'Blocked' OR p_source_type = 'Blocker' THEN 1 ELSE 0 END
+        ]
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Counters live on each project's latest project_health_metrics row.
+-- Only these functions may change them (see project_health_guard_counters).
+-- The counter functions are SECURITY DEFINER: the triggers fire for
+-- authenticated frontend edits, which can neither read counter_state nor
+-- update project_health_metrics under RLS.
+CREATE OR REPLACE FUNCTION apply_action_counter_delta(
+    p_project_id UUID, p_open INT, p_overdue INT, p_blocker INT
+)
+RETURNS void AS $$
+BEGIN
+    PERFORM set_config('onevalue.counters_write', 'on', true);
+    UPDATE project_health_metrics
+    SET open_action_count = GREATEST(COALESCE(open_action_count, 0) + p_open, 0),
+        overdue_action_count = GREATEST(COALESCE(overdue_action_count, 0) + p_overdue, 0),
+        blocker_count = GREATEST(COALESCE(blocker_count, 0) + p_blocker, 0)
+    WHERE id = (
+        SELECT id FROM project_health_metrics
+        WHERE project_id = p_project_id
+        ORDER BY metric_date DESC
+        LIMIT 1
+    );
+    PERFORM set_config('onevalue.counters_write', 'off', true);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Only reachable through the triggers and counter jobs, not as an RPC
+REVOKE EXECUTE ON FUNCTION apply_action_counter_delta(UUID, INT, INT, INT) FROM PUBLIC, anon, authenticated;
+
+-- =====================================================
+-- TRIGGER: action_queue -> latest health row counters
+-- =====================================================
+CREATE OR REPLACE FUNCTION action_queue_maintain_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_old INT[] := ARRAY[0, 0, 0];
+    v_new INT[] := ARRAY[0, 0, 0];
+BEGIN
+    -- FOR SHARE: wait for an in-flight watermark roll so the delta uses its date
+    SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1 FOR SHARE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'counter_state watermark row (id = 1) is missing';
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        v_old := action_counter_flags(OLD.status, OLD.due_date, OLD.source_type, v_as_of);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        v_new := action_counter_flags(NEW.status, NEW.due_date, NEW.source_type, v_as_of);
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.project_id IS NOT DISTINCT FROM NEW.project_id THEN
+        IF v_new <> v_old AND NEW.project_id IS NOT NULL THEN
+            PERFORM apply_action_counter_delta(NEW.project_id,
+                v_new[1] - v_old[1], v_new[2] - v_old[2], v_new[3] - v_old[3]);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP <> 'INSERT' AND OLD.project_id IS NOT NULL AND v_old <> ARRAY[0, 0, 0] THEN
+        PERFORM apply_action_counter_delta(OLD.project_id, -v_old[1], -v_old[2], -v_old[3]);
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.project_id IS NOT NULL AND v_new <> ARRAY[0, 0, 0] THEN
+        PERFORM apply_action_counter_delta(NEW.project_id, v_new[1], v_new[2], v_new[3]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS action_queue_counters ON action_queue;
+CREATE TRIGGER action_queue_counters
+    AFTER INSERT OR DELETE OR UPDATE OF status, due_date, source_type, project_id ON action_queue
+    FOR EACH ROW
+    EXECUTE FUNCTION action_queue_maintain_counters();
+
+-- =====================================================
+-- TRIGGERS: project_health_metrics counter ownership
+-- A new day's row carries the counters forward (or seeds
+-- them with a one-project count); other writers cannot
+-- overwrite them.
+-- =====================================================
+CREATE OR REPLACE FUNCTION project_health_carry_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_prev RECORD;
+BEGIN
+    SELECT open_action_count, overdue_action_count, blocker_count INTO v_prev
+    FROM project_health_metrics
+    WHERE project_id = NEW.project_id
+    ORDER BY metric_date DESC
+    LIMIT 1;
+
+    IF FOUND THEN
+        NEW.open_action_count := v_prev.open_action_count;
+        NEW.overdue_action_count := v_prev.overdue_action_count;
+        NEW.blocker_count := v_prev.blocker_count;
+    ELSE
+        SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'counter_state watermark row (id = 1) is missing';
+        END IF;
+        SELECT COALESCE(SUM(f[1]), 0), COALESCE(SUM(f[2]), 0), COALESCE(SUM(f[3]), 0)
+        INTO NEW.open_action_count, NEW.overdue_action_count, NEW.blocker_count
+        FROM (
+            SELECT action_counter_flags(status, due_date, source_type, v_as_of) AS f
+            FROM action_queue
+            WHERE project_id = NEW.project_id
+        ) a;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS project_health_counters_insert ON project_health_metrics;
+CREATE TRIGGER project_health_counters_insert
+    BEFORE INSERT ON project_health_metrics
+    FOR EACH ROW
+    EXECUTE FUNCTION project_health_carry_counters();
+
+CREATE OR REPLACE FUNCTION project_health_guard_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('onevalue.counters_write', true) IS DISTINCT FROM 'on' THEN
+        NEW.open_action_count := OLD.open_action_count;
+        NEW.overdue_action_count := OLD.overdue_action_count;
+        NEW.blocker_count := OLD.blocker_count;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS project_health_counters_guard ON project_health_metrics;
+CREATE TRIGGER project_health_counters_guard
+    BEFORE UPDATE OF open_action_count, overdue_action_count, blocker_count ON project_health_metrics
+    FOR EACH ROW
+    EXECUTE FUNCTION project_health_guard_counters();
+
+-- =====================================================
+-- FUNCTION: roll_overdue_counters
+-- Moves the overdue watermark to p_as_of. Only open actions
+-- with due_date in [old watermark, p_as_of) change state,
+-- found by a range scan on idx_action_due.
+-- =====================================================
+CREATE OR REPLACE FUNCTION roll_overdue_counters(p_as_of DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_from DATE;
+    v_rows INTEGER := 0;
+    d RECORD;
+BEGIN
+    SELECT overdue_as_of INTO v_from FROM counter_state WHERE id = 1 FOR UPDATE;
+    IF v_from IS NULL OR p_as_of <= v_from THEN
+        RETURN 0;
+    END IF;
+
+    FOR d IN
+        SELECT project_id, COUNT(*)::int AS n
+        FROM action_queue
+        WHERE due_date >= v_from AND due_date < p_as_of
+        AND status NOT IN ('Completed', 'Cancelled')
+        AND project_id IS NOT NULL
+        GROUP BY project_id
+    LOOP
+        PERFORM apply_action_counter_delta(d.project_id, 0, d.n, 0);
+        v_rows := v_rows + d.n;
+    END LOOP;
+
+    UPDATE counter_state SET overdue_as_of = p_as_of, updated_at = NOW() WHERE id = 1;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- FUNCTION: recount_action_counters
+-- Full recount for one project (or all) against the
+-- current watermark. Used by verify_counters.py --fix and
+-- to initialise counters after this migration.
+-- =====================================================
+CREATE OR REPLACE FUNCTION recount_action_counters(p_project_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_as_of DATE;
+    v_rows INTEGER;
+BEGIN
+    SELECT overdue_as_of INTO v_as_of FROM counter_state WHERE id = 1 FOR UPDATE;
+    PERFORM set_config('onevalue.counters_write', 'on', true);
+
+    WITH latest AS (
+        SELECT DISTINCT ON (project_id) id, project_id
+        FROM project_health_metrics
+        WHERE p_project_id IS NULL OR project_id = p_project_id
+        ORDER BY project_id, metric_date DESC
+    ),
+    actual AS (
+        SELECT project_id, SUM(f[1]) AS open_n, SUM(f[2]) AS overdue_n, SUM(f[3]) AS blocker_n
+        FROM (
+            SELECT project_id, action_counter_flags(status, due_date, source_type, v_as_of) AS f
+            FROM action_queue
+            WHERE project_id IS NOT NULL
+            AND (p_project_id IS NULL OR project_id = p_project_id)
+        ) a
+        GROUP BY project_id
+    )
+    UPDATE project_health_metrics m
+    SET open_action_count = COALESCE(a.open_n, 0),
+        overdue_action_count = COALESCE(a.overdue_n, 0),
+        blocker_count = COALESCE(a.blocker_n, 0)
+    FROM latest l
+    LEFT JOIN actual a ON a.project_id = l.project_id
+    WHERE m.id = l.id;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    PERFORM set_config('onevalue.counters_write', 'off', true);
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Initialise counters from the current action_queue
+UPDATE counter_state SET overdue_as_of = CURRENT_DATE, aging_as_of = CURRENT_DATE WHERE id = 1;
+SELECT recount_action_counters();
+
+-- Range scans for the aging job
+CREATE INDEX IF NOT EXISTS idx_action_created ON action_queue(created_at)
+    WHERE status NOT IN ('Completed', 'Cancelled');
@@ -0,0 +1,57 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V5: Computed sentiment trend and renewal risk
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- FUNCTION: record_health_snapshot
+-- project_health_metrics.sentiment_trend is now the weekly
+-- sentiment slope written by risk_scoring.py, so the daily
+-- snapshot takes its sentiment level from the last 7 days
+-- of analysed messages instead. Reads only the latest
+-- metrics row so a project with several metric dates
+-- produces one snapshot row.
+-- =====================================================
+CREATE OR REPLACE FUNCTION record_health_snapshot(p_project_id UUID)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO health_history (
+        project_id, snapshot_date, overall_health, health_score,
+        sentiment_score, blocker_count, action_count, message_count, ai_summary
+    )
+    SELECT
+        p.id,
+        CURRENT_DATE,
+        m.overall_health,
+        m.health_score,
+        (SELECT ROUND(AVG(d.sentiment_score), 2)
+         FROM delivery_intelligence d
+         WHERE d.project_id = p.id
+         AND d.ai_processed = TRUE
+         AND d.created_at >= CURRENT_DATE - INTERVAL '7 days'),
+        m.blocker_count,
+        m.open_action_count,
+        (SELECT COUNT(*) FROM delivery_intelligence WHERE project_id = p.id),
+        m.ai_summary
+    FROM sow_contracts p
+    LEFT JOIN LATERAL (
+        SELECT * FROM project_health_metrics
+        WHERE project_id = p.id
+        ORDER BY metric_date DESC
+        LIMIT 1
+    ) m ON TRUE
+    WHERE p.id = p_project_id
+    ON CONFLICT (project_id, snapshot_date)
+    DO UPDATE SET
+        overall_health = EXCLUDED.overall_health,
+        health_score = EXCLUDED.health_score,
+        sentiment_score = EXCLUDED.sentiment_score,
+        blocker_count = EXCLUDED.blocker_count,
+        action_count = EXCLUDED.action_count,
+        message_count = EXCLUDED.message_count,
+        ai_summary = EXCLUDED.ai_summary;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Scoring window scan: health_history by date for all projects
+CREATE INDEX IF NOT EXISTS idx_health_history_project_date
+    ON health_history(project_id, snapshot_date);
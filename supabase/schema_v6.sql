@@ -0,0 +1,184 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V6: Health history rollups for trend charts
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- TABLE: health_history_rollups
+-- Weekly and monthly aggregates of health_history,
+-- maintained by refresh_health_rollups() (health_rollups.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS health_history_rollups (
+    project_id UUID NOT NULL REFERENCES sow_contracts(id) ON DELETE CASCADE,
+    grain TEXT NOT NULL CHECK (grain IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    snapshot_count INTEGER NOT NULL,
+    avg_health_score NUMERIC(5, 2),
+    min_health_score INTEGER,
+    worst_health TEXT CHECK (worst_health IN ('Healthy', 'At Risk', 'Critical', 'Unknown')),
+    last_health TEXT CHECK (last_health IN ('Healthy', 'At Risk', 'Critical', 'Unknown')),
+    avg_sentiment NUMERIC(4, 3),
+    min_sentiment NUMERIC(3, 2),
+    max_blocker_count INTEGER,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (project_id, grain, period_start)
+);
+
+ALTER TABLE counter_state ADD COLUMN IF NOT EXISTS rollups_refreshed_at TIMESTAMPTZ;
+
+ALTER TABLE health_history_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allowlisted users can view health rollups" ON health_history_rollups;
+CREATE POLICY "Allowlisted users can view health rollups"
+    ON health_history_rollups FOR SELECT
+    USING (public.is_allowlisted());
+
+-- Same fallback the chart uses when health_score is missing
+CREATE OR REPLACE FUNCTION health_status_score(p_health TEXT, p_score INTEGER)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(p_score, CASE p_health
+        WHEN 'Healthy' THEN 100
+        WHEN 'At Risk' THEN 60
+        WHEN 'Critical' THEN 20
+        ELSE 50
+    END);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- =====================================================
+-- FUNCTION: refresh_health_rollups
+-- Recomputes only the (project, grain, period) buckets
+-- containing snapshots created after p_changed_since;
+-- NULL rebuilds everything.
+-- =====================================================
+CREATE OR REPLACE FUNCTION refresh_health_rollups(p_changed_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    WITH touched AS (
+        SELECT DISTINCT h.project_id, g.grain,
+               date_trunc(g.grain, h.snapshot_date::timestamp)::date AS period_start
+        FROM health_history h
+        CROSS JOIN (VALUES ('week'), ('month')) AS g(grain)
+        WHERE h.project_id IS NOT NULL
+        AND (p_changed_since IS NULL OR h.created_at > p_changed_since)
+    ),
+    buckets AS (
+        SELECT t.project_id, t.grain, t.period_start,
+               (t.period_start + CASE t.grain WHEN 'week' THEN INTERVAL '7 days'
+                                               ELSE INTERVAL '1 month' END)::date AS next_start
+        FROM touched t
+    )
+    INSERT INTO health_history_rollups (
+        project_id, grain, period_start, period_end, snapshot_count,
+        avg_health_score, min_health_score, worst_health, last_health,
+        avg_sentiment, min_sentiment, max_blocker_count, updated_at
+    )
+    SELECT
+        b.project_id, b.grain, b.period_start,
+        MAX(h.snapshot_date),
+        COUNT(*),
+        ROUND(AVG(health_status_score(h.overall_health, h.health_score)), 2),
+        MIN(health_status_score(h.overall_health, h.health_score)),
+        (ARRAY_AGG(h.overall_health ORDER BY health_status_score(h.overall_health, h.health_score), h.snapshot_date))[1],
+        (ARRAY_AGG(h.overall_health ORDER BY h.snapshot_date DESC))[1],
+        ROUND(AVG(h.sentiment_score), 3),
+        MIN(h.sentiment_score),
+        MAX(h.blocker_count),
+        NOW()
+    FROM buckets b
+    JOIN health_history h
+        ON h.project_id = b.project_id
+        AND h.snapshot_date >= b.period_start
+        AND h.snapshot_date < b.next_start
+    GROUP BY b.project_id, b.grain, b.period_start
+    ON CONFLICT (project_id, grain, period_start) DO UPDATE SET
+        period_end = EXCLUDED.period_end,
+        snapshot_count = EXCLUDED.snapshot_count,
+        avg_health_score = EXCLUDED.avg_health_score,
+        min_health_score = EXCLUDED.min_health_score,
+        worst_health = EXCLUDED.worst_health,
+        last_health = EXCLUDED.last_health,
+        avg_sentiment = EXCLUDED.avg_sentiment,
+        min_sentiment = EXCLUDED.min_sentiment,
+        max_blocker_count = EXCLUDED.max_blocker_count,
+        updated_at = NOW();
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- RPC: get_health_trend
+-- Chart-ready trend for one project. The grain is the
+-- finest of day/week/month that covers [p_start, p_end] in
+-- at most p_max_points points; older points are dropped
+-- if even monthly exceeds it, so the payload is bounded.
+-- Columns match health_history so HealthTrendChart can
+-- render either. Runs as the caller, so RLS applies.
+-- =====================================================
+CREATE OR REPLACE FUNCTION get_health_trend(
+    p_project_id UUID,
+    p_start DATE DEFAULT NULL,
+    p_end DATE DEFAULT CURRENT_DATE,
+    p_max_points INTEGER DEFAULT 60
+)
+RETURNS TABLE (
+    snapshot_date DATE,
+    grain TEXT,
+    overall_health TEXT,
+    health_score INTEGER,
+    min_health_score INTEGER,
+    sentiment_score NUMERIC,
+    blocker_count INTEGER,
+    snapshot_count INTEGER
+) AS $$
+DECLARE
+    v_start DATE := p_start;
+    v_grain TEXT;
+BEGIN
+    IF v_start IS NULL THEN
+        SELECT MIN(h.snapshot_date) INTO v_start
+        FROM health_history h
+        WHERE h.project_id = p_project_id;
+    END IF;
+    v_start := COALESCE(v_start, p_end);
+
+    v_grain := CASE
+        WHEN p_end - v_start < p_max_points THEN 'day'
+        WHEN p_end - v_start < p_max_points * 7 THEN 'week'
+        ELSE 'month'
+    END;
+
+    IF v_grain = 'day' THEN
+        RETURN QUERY
+        SELECT h.snapshot_date, 'day'::text, h.overall_health,
+               health_status_score(h.overall_health, h.health_score),
+               health_status_score(h.overall_health, h.health_score),
+               h.sentiment_score::numeric, h.blocker_count, 1
+        FROM health_history h
+        WHERE h.project_id = p_project_id
+        AND h.snapshot_date BETWEEN v_start AND p_end
+        ORDER BY h.snapshot_date;
+    ELSE
+        RETURN QUERY
+        SELECT r.period_start, r.grain, r.worst_health,
+               ROUND(r.avg_health_score)::int, r.min_health_score,
+               r.avg_sentiment, r.max_blocker_count, r.snapshot_count
+        FROM (
+            SELECT * FROM health_history_rollups hr
+            WHERE hr.project_id = p_project_id
+            AND hr.grain = v_grain
+            AND hr.period_end >= v_start
+            AND hr.period_start <= p_end
+            ORDER BY hr.period_start DESC
+            LIMIT p_max_points
+        ) r
+        ORDER BY r.period_start;
+    END IF;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Build rollups for existing history
+SELECT refresh_health_rollups(NULL);
+UPDATE counter_state SET rollups_refreshed_at = NOW() WHERE id = 1;
@@ -0,0 +1,128 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V7: Per-statement evaluation of RLS helper functions
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- is_allowlisted() / is_admin() are SECURITY DEFINER, so
+-- the planner cannot inline them, and called bare in a
+-- policy they run once per candidate row (each call also
+-- re-parses request.jwt.claims). Wrapped as a scalar
+-- sub-select they become an InitPlan, evaluated once per
+-- statement. The results are the same: none of the
+-- helpers reference the row being checked.
+-- Measure with: python3 scripts/rls_bench.py --compare supabase/schema_v7.sql
+-- =====================================================
+
+-- user_allowlist
+DROP POLICY IF EXISTS "Admins can manage allowlist" ON user_allowlist;
+CREATE POLICY "Admins can manage allowlist"
+    ON user_allowlist FOR ALL
+    USING ((SELECT public.is_admin()))
+    WITH CHECK ((SELECT public.is_admin()));
+
+DROP POLICY IF EXISTS "Users can view own entry" ON user_allowlist;
+CREATE POLICY "Users can view own entry"
+    ON user_allowlist FOR SELECT
+    USING (email = (SELECT public.get_user_email()));
+
+-- sow_contracts
+DROP POLICY IF EXISTS "Allowlisted users can view SOWs" ON sow_contracts;
+CREATE POLICY "Allowlisted users can view SOWs"
+    ON sow_contracts FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Admins and PMs can modify SOWs" ON sow_contracts;
+CREATE POLICY "Admins and PMs can modify SOWs"
+    ON sow_contracts FOR ALL
+    USING (
+        EXISTS (
+            SELECT 1 FROM user_allowlist
+            WHERE email = (SELECT public.get_user_email())
+            AND role IN ('Admin', 'PM')
+            AND is_active = TRUE
+        )
+    );
+
+-- delivery_intelligence
+DROP POLICY IF EXISTS "Allowlisted users can view delivery data" ON delivery_intelligence;
+CREATE POLICY "Allowlisted users can view delivery data"
+    ON delivery_intelligence FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Admins can modify delivery data" ON delivery_intelligence;
+CREATE POLICY "Admins can modify delivery data"
+    ON delivery_intelligence FOR UPDATE
+    USING ((SELECT public.is_admin()));
+
+-- project_health_metrics
+DROP POLICY IF EXISTS "Allowlisted users can view metrics" ON project_health_metrics;
+CREATE POLICY "Allowlisted users can view metrics"
+    ON project_health_metrics FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+-- action_queue
+DROP POLICY IF EXISTS "Allowlisted users can view actions" ON action_queue;
+CREATE POLICY "Allowlisted users can view actions"
+    ON action_queue FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Allowlisted users can manage own actions" ON action_queue;
+CREATE POLICY "Allowlisted users can manage own actions"
+    ON action_queue FOR ALL
+    USING (
+        (SELECT public.is_allowlisted()) AND (
+            owner_email = (SELECT public.get_user_email()) OR
+            (SELECT public.is_admin())
+        )
+    );
+
+-- system_audit_logs
+DROP POLICY IF EXISTS "Admins can view audit logs" ON system_audit_logs;
+CREATE POLICY "Admins can view audit logs"
+    ON system_audit_logs FOR SELECT
+    USING ((SELECT public.is_admin()));
+
+-- chat_spaces
+DROP POLICY IF EXISTS "Allowlisted users can view spaces" ON chat_spaces;
+CREATE POLICY "Allowlisted users can view spaces"
+    ON chat_spaces FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Admins can manage spaces" ON chat_spaces;
+CREATE POLICY "Admins can manage spaces"
+    ON chat_spaces FOR ALL
+    USING ((SELECT public.is_admin()));
+
+-- health_history
+DROP POLICY IF EXISTS "Allowlisted users can view health history" ON health_history;
+CREATE POLICY "Allowlisted users can view health history"
+    ON health_history FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+-- health_history_rollups
+DROP POLICY IF EXISTS "Allowlisted users can view health rollups" ON health_history_rollups;
+CREATE POLICY "Allowlisted users can view health rollups"
+    ON health_history_rollups FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+-- alert_rules
+DROP POLICY IF EXISTS "Allowlisted users can view alert rules" ON alert_rules;
+CREATE POLICY "Allowlisted users can view alert rules"
+    ON alert_rules FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Admins can manage alert rules" ON alert_rules;
+CREATE POLICY "Admins can manage alert rules"
+    ON alert_rules FOR ALL
+    USING ((SELECT public.is_admin()));
+
+-- alert_notifications
+DROP POLICY IF EXISTS "Allowlisted users can view their alerts" ON alert_notifications;
+CREATE POLICY "Allowlisted users can view their alerts"
+    ON alert_notifications FOR SELECT
+    USING ((SELECT public.is_allowlisted()));
+
+DROP POLICY IF EXISTS "Allowlisted users can update alert status" ON alert_notifications;
+CREATE POLICY "Allowlisted users can update alert status"
+    ON alert_notifications FOR UPDATE
+    USING ((SELECT public.is_allowlisted()));
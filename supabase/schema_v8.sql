@@ -0,0 +1,48 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V8: Alert delivery tracking and insert notifications
+-- Generated: 2026-10-19
+
+-- =====================================================
+-- alert_notifications delivery state
+-- Outbound chat posts are made by alert_dispatcher.py,
+-- which coalesces undelivered rows per project and
+-- severity and stamps delivered_at in bulk. claimed_at
+-- marks rows a dispatcher is posting; a claim older
+-- than the dispatcher's timeout is taken over.
+-- =====================================================
+ALTER TABLE alert_notifications
+    ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
+-- Alerts raised before the dispatcher existed were already posted (or never will be)
+UPDATE alert_notifications SET delivered_at = triggered_at WHERE delivered_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_alerts_undelivered ON alert_notifications(triggered_at)
+    WHERE delivered_at IS NULL;
+
+-- =====================================================
+-- TRIGGER: alert_notifications insert -> NOTIFY
+-- One notification per statement (payload: row count);
+-- the dispatcher treats it as a wake-up and reads the
+-- undelivered rows itself, so nothing is lost if it was
+-- not listening.
+-- =====================================================
+CREATE OR REPLACE FUNCTION notify_alert_inserted()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_rows FROM inserted WHERE delivered_at IS NULL;
+    IF v_rows > 0 THEN
+        PERFORM pg_notify('alert_notifications', v_rows::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS alert_notifications_notify ON alert_notifications;
+CREATE TRIGGER alert_notifications_notify
+    AFTER INSERT ON alert_notifications
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_alert_inserted();
@@ -0,0 +1,200 @@
+-- OneValue Delivery Intelligence Console
+-- Schema V9: Fuzzy action item deduplication
+-- Generated: 2026-10-19
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- =====================================================
+-- FUNCTION: normalize_action_title
+-- Lowercase, punctuation and filler words stripped, so
+-- "Follow up with IT on VPN access!" and "follow-up IT
+-- VPN access" compare equal.
+-- =====================================================
+CREATE OR REPLACE FUNCTION normalize_action_title(p_title TEXT)
+RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(
+        regexp_replace(
+            regexp_replace(lower(COALESCE(p_title, '')), '[^[:alnum:]]+', ' ', 'g'),
+            '\m(a|an|the|to|for|of|on|in|at|by|and|with|please|pls)\M', ' ', 'g'),
+        '\s+', ' ', 'g'));
+$$ LANGUAGE sql IMMUTABLE;
+
+-- =====================================================
+-- action_queue dedup columns
+-- Repeats of an open action are merged into it: their
+-- evidence links are appended and occurrences counted.
+-- =====================================================
+ALTER TABLE action_queue
+    ADD COLUMN IF NOT EXISTS title_normalized TEXT GENERATED ALWAYS AS (normalize_action_title(title)) STORED,
+    ADD COLUMN IF NOT EXISTS evidence_links TEXT[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ DEFAULT NOW();
+
+UPDATE action_queue SET evidence_links = ARRAY[evidence_link]
+WHERE evidence_link IS NOT NULL AND evidence_links = '{}';
+
+-- action_queue_full selects a.*, which was expanded when the view was
+-- created, so it has to be rebuilt to expose the new columns. CREATE OR
+-- REPLACE cannot be used: they land before project_name/client_name and
+-- a replaced view may only append columns.
+DROP VIEW IF EXISTS action_queue_full;
+CREATE VIEW action_queue_full AS
+SELECT
+    a.*,
+    s.project_name,
+    s.client_name,
+    s.inferred_owner as project_owner
+FROM action_queue a
+LEFT JOIN sow_contracts s ON a.project_id = s.id
+WHERE a.status NOT IN ('Completed', 'Cancelled')
+ORDER BY
+    CASE a.priority
+        WHEN 'Critical' THEN 1
+        WHEN 'High' THEN 2
+        WHEN 'Medium' THEN 3
+        WHEN 'Low' THEN 4
+    END,
+    a.due_date NULLS LAST;
+
+-- Exact repeats resolve through the btree, near matches through trigrams
+CREATE INDEX IF NOT EXISTS idx_action_title_norm ON action_queue(project_id, title_normalized)
+    WHERE status NOT IN ('Completed', 'Cancelled');
+CREATE INDEX IF NOT EXISTS idx_action_title_trgm ON action_queue USING gin (title_normalized gin_trgm_ops)
+    WHERE status NOT IN ('Completed', 'Cancelled');
+
+-- Fold existing exact duplicates among untouched AI-extracted actions into the oldest
+WITH dup AS (
+    SELECT id, evidence_links,
+           first_value(id) OVER w AS keeper_id,
+           COUNT(*) OVER (PARTITION BY project_id, title_normalized) AS n
+    FROM action_queue
+    WHERE source_type = 'AI_Extracted' AND status = 'Open'
+      AND project_id IS NOT NULL AND title_normalized <> ''
+    WINDOW w AS (PARTITION BY project_id, title_normalized ORDER BY created_at, id)
+), folded AS (
+    SELECT d.keeper_id, MAX(d.n) AS n,
+           array_agg(DISTINCT link) FILTER (WHERE link IS NOT NULL) AS links
+    FROM dup d
+    LEFT JOIN LATERAL unnest(d.evidence_links) AS link ON TRUE
+    WHERE d.n > 1
+    GROUP BY d.keeper_id
+), kept AS (
+    UPDATE action_queue a
+    SET evidence_links = COALESCE(f.links, '{}'), occurrences = f.n
+    FROM folded f
+    WHERE a.id = f.keeper_id
+    RETURNING a.id
+)
+DELETE FROM action_queue a
+USING dup d
+WHERE a.id = d.id AND d.n > 1 AND d.id <> d.keeper_id;
+
+-- =====================================================
+-- RPC: upsert_action_items
+-- Bulk entry point for extracted action items (analyzer
+-- and workflow 04). p_items is a JSON array of
+-- {project_id, title, owner, priority, description,
+--  delivery_intelligence_id, evidence_link(s), source_type}.
+-- An item matching an open action of the same project
+-- (same normalized title, else trigram similarity >=
+-- p_threshold) is merged into it; otherwise inserted.
+-- Re-sending an item with the same evidence is a no-op.
+-- =====================================================
+CREATE OR REPLACE FUNCTION upsert_action_items(p_items JSONB, p_threshold REAL DEFAULT 0.6)
+RETURNS TABLE (action_id UUID, merged BOOLEAN) AS $$
+DECLARE
+    v_item JSONB;
+    v_project UUID;
+    v_title TEXT;
+    v_norm TEXT;
+    v_priority TEXT;
+    v_links TEXT[];
+    v_match UUID;
+BEGIN
+    -- The % operator (and so the trigram index) uses this threshold
+    PERFORM set_config('pg_trgm.similarity_threshold', p_threshold::text, true);
+
+    FOR v_item IN SELECT * FROM jsonb_array_elements(COALESCE(p_items, '[]'::jsonb)) LOOP
+        v_title := btrim(v_item->>'title');
+        v_norm := normalize_action_title(v_title);
+        CONTINUE WHEN v_title IS NULL OR v_title = '';
+
+        v_project := NULLIF(v_item->>'project_id', '')::uuid;
+        v_priority := initcap(COALESCE(v_item->>'priority', 'Medium'));
+        IF v_priority NOT IN ('Critical', 'High', 'Medium', 'Low') THEN
+            v_priority := 'Medium';
+        END IF;
+        v_links := ARRAY(
+            SELECT DISTINCT l FROM (
+                SELECT v_item->>'evidence_link' AS l
+                UNION ALL
+                SELECT jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(v_item->'evidence_links') = 'array'
+                         THEN v_item->'evidence_links' ELSE '[]'::jsonb END)
+            ) s
+            WHERE l IS NOT NULL AND l <> ''
+        );
+
+        v_match := NULL;
+        IF v_project IS NOT NULL AND v_norm <> '' THEN
+            -- Serialize per project so concurrent runs cannot both insert a new action
+            PERFORM pg_advisory_xact_lock(hashtext('action_queue:' || v_project::text));
+
+            SELECT a.id INTO v_match
+            FROM action_queue a
+            WHERE a.project_id = v_project
+              AND a.status NOT IN ('Completed', 'Cancelled')
+              AND a.title_normalized = v_norm
+            ORDER BY a.created_at
+            LIMIT 1;
+
+            IF v_match IS NULL THEN
+                SELECT a.id INTO v_match
+                FROM action_queue a
+                WHERE a.project_id = v_project
+                  AND a.status NOT IN ('Completed', 'Cancelled')
+                  AND a.title_normalized % v_norm
+                ORDER BY similarity(a.title_normalized, v_norm) DESC, a.created_at
+                LIMIT 1;
+            END IF;
+        END IF;
+
+        IF v_match IS NOT NULL THEN
+            UPDATE action_queue a SET
+                occurrences = a.occurrences + CASE
+                    WHEN cardinality(v_links) > 0 AND v_links <@ a.evidence_links THEN 0 ELSE 1 END,
+                evidence_links = a.evidence_links
+                    || ARRAY(SELECT l FROM unnest(v_links) l WHERE l <> ALL(a.evidence_links)),
+                evidence_link = COALESCE(a.evidence_link, v_links[1]),
+                priority = CASE
+                    WHEN array_position(ARRAY['Critical', 'High', 'Medium', 'Low'], v_priority)
+                       < array_position(ARRAY['Critical', 'High', 'Medium', 'Low'], a.priority)
+                    THEN v_priority ELSE a.priority END,
+                owner = COALESCE(a.owner, NULLIF(v_item->>'owner', '')),
+                last_seen_at = NOW()
+            WHERE a.id = v_match;
+            action_id := v_match;
+            merged := TRUE;
+        ELSE
+            INSERT INTO action_queue (
+                project_id, delivery_intelligence_id, title, description, owner,
+                priority, status, evidence_link, evidence_links, source_type
+            ) VALUES (
+                v_project,
+                NULLIF(v_item->>'delivery_intelligence_id', '')::uuid,
+                v_title,
+                NULLIF(v_item->>'description', ''),
+                NULLIF(v_item->>'owner', ''),
+                v_priority,
+                'Open',
+                v_links[1],
+                v_links,
+                COALESCE(NULLIF(v_item->>'source_type', ''), 'AI_Extracted')
+            )
+            RETURNING id INTO action_id;
+            merged := FALSE;
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;